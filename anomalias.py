@@ -0,0 +1,134 @@
+import threading
+import warnings
+import numpy as np
+import pandas as pd
+from config import LISTA_MESES_LARGA
+from db import db_connection, versiones_movimientos, base_actual
+from cache_disco import obtener, guardar, clave_de
+from utils import formato_moneda_visual, tasas_asof
+
+# --- GASTOS INUSUALES (MEDIANA Y MAD MOVILES) ---
+# Serie mensual de gasto en ARS (USD a la cotizacion de su fecha de pago) por grupo y por concepto.
+# Cada mes se compara con los VENTANA meses anteriores en que la serie tuvo gasto: z robusto =
+# 0.6745 * (x - mediana) / MAD. Es inusual si z > UMBRAL_Z y ademas x pasa FACTOR_MIN veces la
+# mediana; con historial constante (MAD 0) la escala es PISO_MAD de la mediana, asi una factura que
+# se duplica igual salta. Las ventanas se arman con shifts por serie: todo vectorizado.
+# El estado (totales y resultado) va a la cache en disco con la version de cada mes: la corrida
+# siguiente solo reagrega los meses con otra version y recalcula las series con gasto en ellos.
+VENTANA = 6
+MIN_HISTORIA = 3
+UMBRAL_Z = 3.5
+FACTOR_MIN = 1.5
+PISO_MAD = 0.05
+NIVELES = {"grupo": "grupo", "concepto": "tipo_gasto"}
+TTL_ESTADO = 30 * 86400
+COLUMNAS = ["nivel", "clave", "mes", "monto", "mediana", "mad", "z", "historia", "anomalia"]
+_memoria = {"clave": None, "resultado": None}
+_lock_memoria = threading.Lock()
+
+
+def _factorizar(s):
+    """(codigos, valores distintos); el libro compacto ya trae los codigos de sus categorias. Nulos: -1."""
+    if isinstance(s.dtype, pd.CategoricalDtype): return s.cat.codes.to_numpy(), s.cat.categories
+    return pd.factorize(s)
+
+
+def totales(df, dolar_val, cot=None):
+    """Gasto por (nivel, clave, mes) con el mes como indice en LISTA_MESES_LARGA."""
+    g = df[(df["tipo"] == "GASTO") & df["mes"].isin(LISTA_MESES_LARGA)]
+    if g.empty: return pd.DataFrame({"nivel": [], "clave": [], "mes_idx": np.array([], dtype=int), "monto": []})
+    monto = g["monto"].to_numpy(dtype=float)
+    usd = (g["moneda"] == "USD").to_numpy()
+    if usd.any(): monto = np.where(usd, monto * tasas_asof(g["fecha_pago"], cot, dolar_val), monto)
+    # Se agrupa por codigos enteros; el texto se normaliza una vez por valor distinto
+    cod, unicos = _factorizar(g["mes"])
+    mes_idx = np.array([LISTA_MESES_LARGA.index(m) if m in LISTA_MESES_LARGA else -1 for m in unicos.astype(str)], dtype=int)[cod]
+    partes = []
+    for nivel, col in NIVELES.items():
+        cod, unicos = _factorizar(g[col])
+        limpio = pd.Index(unicos, dtype=object).astype(str).str.strip()
+        k, claves = pd.factorize(limpio if nivel == "grupo" else limpio.str.upper())
+        t = pd.DataFrame({"k": np.append(k, -1)[cod], "mes_idx": mes_idx, "monto": monto})
+        t = t[t["k"] >= 0].groupby(["k", "mes_idx"], as_index=False, sort=False)["monto"].sum()
+        partes.append(pd.DataFrame({"nivel": nivel, "clave": np.asarray(claves, dtype=object)[t["k"].to_numpy()], "mes_idx": t["mes_idx"].to_numpy(), "monto": t["monto"].to_numpy()}))
+    t = pd.concat(partes, ignore_index=True)
+    return t[t["clave"] != ""].reset_index(drop=True)
+
+
+def puntuar(tot):
+    """Mediana, MAD y z robusto de cada mes contra los VENTANA meses anteriores con gasto de su serie."""
+    if tot.empty: return pd.DataFrame(columns=COLUMNAS)
+    t = tot.sort_values(["nivel", "clave", "mes_idx"], ignore_index=True)
+    por_serie = t.groupby(["nivel", "clave"], sort=False)["monto"]
+    previos = np.column_stack([por_serie.shift(k).to_numpy(dtype=float) for k in range(1, VENTANA + 1)])
+    historia = (~np.isnan(previos)).sum(axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # series sin historia: mediana NaN
+        mediana = np.nanmedian(previos, axis=1)
+        mad = np.nanmedian(np.abs(previos - mediana[:, None]), axis=1)
+    x = t["monto"].to_numpy()
+    escala = np.fmax(mad, PISO_MAD * np.abs(mediana))
+    z = np.divide(0.6745 * (x - mediana), escala, out=np.zeros(len(t)), where=escala > 0)
+    anomalia = (historia >= MIN_HISTORIA) & (z > UMBRAL_Z) & (x > FACTOR_MIN * mediana)
+    return pd.DataFrame({"nivel": t["nivel"], "clave": t["clave"], "mes": np.array(LISTA_MESES_LARGA, dtype=object)[t["mes_idx"].to_numpy()],
+                         "monto": x, "mediana": mediana, "mad": mad, "z": np.round(z, 2), "historia": historia, "anomalia": anomalia})
+
+
+def _series(df):
+    return pd.MultiIndex.from_frame(df[["nivel", "clave"]])
+
+
+def _leer(meses=None):
+    sql = "SELECT mes, tipo, grupo, tipo_gasto, monto, moneda, fecha_pago FROM movimientos WHERE tipo = 'GASTO'"
+    with db_connection() as conn:
+        return pd.read_sql(sql + (" AND mes = ANY(%s)" if meses is not None else ""), conn, params=(meses,) if meses is not None else None)
+
+
+def _huella(cot, dolar_val):
+    # Sin historial de cotizaciones los USD van al dolar del dia: si cambia, se recalcula todo
+    return ("sin cotizaciones", float(dolar_val)) if cot is None or cot.empty else (len(cot), str(cot["fecha"].iloc[-1]), float(cot["valor"].iloc[-1]))
+
+
+def actualizar_anomalias(dolar_val, cot=None):
+    """(resultado, series recalculadas). Reagrega solo los meses cambiados desde la corrida anterior."""
+    clave = clave_de("anomalias", *base_actual())
+    hay, estado = obtener("anomalias", clave)
+    versiones = {m: v for m, v in versiones_movimientos().items() if m in LISTA_MESES_LARGA}
+    huella = _huella(cot, dolar_val)
+    if not hay or estado["huella"] != huella:
+        tot = totales(_leer(), dolar_val, cot)
+        res, n = puntuar(tot), len(tot[["nivel", "clave"]].drop_duplicates())
+    else:
+        cambiados = sorted({m for m in versiones if estado["versiones"].get(m) != versiones[m]} | (set(estado["versiones"]) - set(versiones)))
+        if not cambiados: return estado["resultado"], 0
+        idx = [LISTA_MESES_LARGA.index(m) for m in cambiados]
+        viejos, nuevos = estado["totales"], totales(_leer(cambiados), dolar_val, cot)
+        quedan = ~viejos["mes_idx"].isin(idx)
+        tocadas = _series(viejos[~quedan]).union(_series(nuevos))
+        tot = pd.concat([viejos[quedan], nuevos], ignore_index=True)
+        anterior = estado["resultado"]
+        res = pd.concat([anterior[~_series(anterior).isin(tocadas)], puntuar(tot[_series(tot).isin(tocadas)])], ignore_index=True)
+        n = len(tocadas)
+    guardar("anomalias", clave, {"versiones": versiones, "huella": huella, "totales": tot, "resultado": res}, TTL_ESTADO)
+    return res, n
+
+
+def anomalias_al_dia(dolar_val, cot=None, version=None):
+    """actualizar_anomalias() memorizado por proceso con la base y la version del log de cambios (None: siempre consulta)."""
+    clave = None if version is None else (base_actual(), version, _huella(cot, dolar_val))
+    with _lock_memoria:
+        if clave is not None and _memoria["clave"] == clave: return _memoria["resultado"]
+    res, _ = actualizar_anomalias(dolar_val, cot)
+    with _lock_memoria: _memoria.update(clave=clave, resultado=res)
+    return res
+
+
+def del_mes(res, mes):
+    """Gastos inusuales de `mes`, de mayor a menor z."""
+    return res[res["anomalia"] & (res["mes"] == mes)].sort_values("z", ascending=False)
+
+
+def alertas_anomalias(res, mes):
+    return [f"🚨 **Gasto inusual:** {r['clave'].title() if r['nivel'] == 'concepto' else r['clave']} ({r['nivel']}) "
+            f"{formato_moneda_visual(r['monto'], 'ARS')}, {r['monto'] / r['mediana']:.1f}× lo habitual ({formato_moneda_visual(r['mediana'], 'ARS')})"
+            for r in del_mes(res, mes).to_dict("records")]
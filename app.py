@@ -2,32 +2,37 @@ import streamlit as st
 import pandas as pd
 import os
 import datetime
-import plotly.express as px
-import plotly.graph_objects as go
 import logging
-import numpy as np
 from dotenv import load_dotenv
 from streamlit_lottie import st_lottie
 
 from config import (
     LISTA_MESES_LARGA, MESES_NOMBRES, INDICE_MES_ACTUAL,
-    OPCIONES_PAGO, LOTTIE_FINANCE
+    OPCIONES_PAGO, LOTTIE_FINANCE, GRUPO_AUTO
 )
-from db import db_connection, init_db
+from db import db_connection, init_db_una_vez
+from pagina import prefetch
+from cambios import iniciar_escucha, ultima_version_notificada
+from cache_disco import obtener, guardar, clave_de
+from perfil import iniciar_corrida, cerrar_corrida, tramo, panel_perfil
 from auth import login_screen
 from utils import (
     load_lottieurl, formato_moneda_visual, procesar_monto_input,
     enviar_notificacion
 )
-from logic import automatizaciones, actualizar_saldos, get_dolar, calcular_monto_salario_mes
-from tabs import dashboard, inversiones, predicciones, configuracion, deudas
-
-# --- IMPORTACION SEGURA DE IA ---
-try:
-    import google.generativeai as genai
-    HAS_AI = True
-except ImportError:
-    HAS_AI = False
+from logic import automatizaciones, actualizar_saldos, calcular_monto_salario_mes
+from categorizador import sugerir, aprender, precargar
+from cuotas import crear_plan, planes_al_dia
+
+# --- IMPORTACION DIFERIDA ---
+# Las secciones (plotly, openpyxl) y la IA se importan recien cuando se abren o se activan,
+# asi el dashboard aparece sin esperar dependencias que la sesion quizas no use.
+def cargar_genai():
+    try:
+        import google.generativeai as genai
+        return genai
+    except ImportError:
+        return None
 
 # --- CONFIGURACION DE LOGGING ---
 logging.basicConfig(
@@ -41,27 +46,50 @@ load_dotenv()
 
 # --- CONFIGURACION DE PAGINA ---
 st.set_page_config(page_title="CONTABILIDAD PERSONAL V5 (IA)", layout="wide")
+iniciar_corrida()
 
 # --- INIT DB ---
-init_db()
+with tramo("init_db", "db"): init_db_una_vez()
 
 # --- LOGIN ---
-login_screen()
+with tramo("login"): login_screen()
 
 # ==========================================
 # APP
 # ==========================================
-dolar_val, dolar_info = get_dolar()
-automatizaciones()
-with db_connection() as conn:
-    grupos_db = pd.read_sql("SELECT nombre FROM grupos ORDER BY nombre ASC", conn)['nombre'].tolist()
-    df_all = pd.read_sql("SELECT * FROM movimientos", conn)
-
-with st.sidebar:
+with tramo("automatizaciones", "db"): automatizaciones()
+with tramo("cuotas", "db"): planes_al_dia()
+
+# --- NAVEGACION ---
+# Solo corre la seccion elegida; con st.tabs se ejecutaban las seis (consultas, modelos, exports) en cada rerun
+SECCIONES = ["📊 DASHBOARD", "💰 INVERSIONES", "🔮 PREDICCIONES", "⚙️ CONFIGURACIÓN", "📉 DEUDAS", "🔎 BUSCADOR"]
+LECTURAS_SECCION = {
+    "📊 DASHBOARD": ["cotizaciones", "resumen", "presupuestos"],
+    "💰 INVERSIONES": ["inversiones"],
+    "🔮 PREDICCIONES": ["resumen"],
+    "⚙️ CONFIGURACIÓN": ["presupuestos", "recurrentes", "cotizaciones"],
+    "📉 DEUDAS": ["deudas", "pagos_deudas"],
+    "🔎 BUSCADOR": [],
+}
+
+# --- PREFETCH ---
+# Dolar, grupos, movimientos y lo que lee la seccion visible, en paralelo (ver pagina.py)
+with tramo("prefetch", "db"): datos = prefetch(LECTURAS_SECCION[st.session_state.get("seccion") or SECCIONES[0]])
+dolar_val, dolar_info, grupos_db, df_all = datos.dolar_val, datos.dolar_info, datos.grupos, datos.movimientos
+st.session_state["version_cambios"] = datos.version_cambios
+
+# --- CAMBIOS DE OTRAS SESIONES ---
+# Compara en memoria la version cargada con la ultima avisada por NOTIFY; no consulta la base.
+@st.fragment(run_every=3)
+def aviso_cambios():
+    if ultima_version_notificada() > st.session_state.get("version_cambios", 0): st.rerun()
+
+with st.sidebar, tramo("sidebar"):
     lottie = load_lottieurl(LOTTIE_FINANCE)
     if lottie: st_lottie(lottie, height=100)
     st.write(f"👤 **{st.session_state['username']}**")
     if st.button("Salir"): st.session_state['logged_in'] = False; st.rerun()
+    if iniciar_escucha(): aviso_cambios()
     st.divider()
 
     st.header("📅 Configuración")
@@ -86,7 +114,7 @@ with st.sidebar:
     with st.form("alta_movimiento"):
         mes_carga = st.selectbox("📅 MES:", LISTA_MESES_LARGA, index=LISTA_MESES_LARGA.index(mes_global))
         t_sel = st.selectbox("TIPO", ["GASTO", "GANANCIA"])
-        g_sel = st.selectbox("GRUPO", grupos_db)
+        g_sel = st.selectbox("GRUPO", [GRUPO_AUTO] + grupos_db); precargar()  # el modelo se carga fuera del rerun
         c_con, c_cont = st.columns(2)
         con = c_con.text_input("CONCEPTO"); cont = c_cont.text_input("CUENTA O CONTRATO")
         c1, c2 = st.columns(2); c_act = c1.number_input("Cuota", 1, 300, 1); c_tot = c2.number_input("Total", 1, 300, 1)
@@ -94,8 +122,16 @@ with st.sidebar:
         pag = st.selectbox("PAGO", OPCIONES_PAGO); fec = st.date_input("FECHA", fecha_default)
         ya = st.checkbox("¿Pagado?")
 
-        if st.form_submit_button("GRABAR"):
-            mf = procesar_monto_input(m_inp); idx = LISTA_MESES_LARGA.index(mes_carga)
+        grabar = st.form_submit_button("GRABAR")
+        if grabar and mes_carga in set(datos.cierres["mes"]):
+            st.error(f"🔒 {mes_carga} está cerrado: reabrilo en Configuración para cargar."); grabar = False
+        if grabar and c_act > c_tot:
+            st.error(f"La cuota {c_act} pasa el total de {c_tot}: no se grabó nada."); grabar = False
+        if grabar and g_sel == GRUPO_AUTO:
+            g_sel, _ = sugerir(con, cont, esperar=False)
+            if g_sel is None: st.error("Sin sugerencia para ese concepto (o el modelo todavía se está cargando): elegí el GRUPO."); grabar = False
+        if grabar:
+            mf = procesar_monto_input(m_inp)
             with db_connection() as conn:
                 c = conn.cursor()
                 if c_tot == 1:
@@ -103,44 +139,53 @@ with st.sidebar:
                     mg = vc if (con.strip().upper() == "SALARIO CHICOS" and vc) else mf
                     c.execute("INSERT INTO movimientos (fecha, mes, tipo, grupo, tipo_gasto, contrato, cuota, monto, moneda, forma_pago, fecha_pago, pagado) VALUES (%s,%s,%s,%s,%s,%s,'',%s,%s,%s,%s,%s)", (str(datetime.date.today()), mes_carga, t_sel, g_sel, con, cont, mg, mon, pag, str(fec), ya))
                 else:
-                    for i in range(int(c_act), int(c_tot)+1):
-                        off = i - int(c_act)
-                        if idx + off < len(LISTA_MESES_LARGA):
-                            mt = LISTA_MESES_LARGA[idx + off]; vc = calcular_monto_salario_mes(mt)
-                            mg = vc if (con.strip().upper() == "SALARIO CHICOS" and vc) else mf
-                            c.execute("INSERT INTO movimientos (fecha, mes, tipo, grupo, tipo_gasto, contrato, cuota, monto, moneda, forma_pago, fecha_pago, pagado) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)", (str(datetime.date.today()), mt, t_sel, g_sel, con, cont, f"{i}/{c_tot}", mg, mon, pag, (fec + datetime.timedelta(days=30*off)).strftime('%Y-%m-%d'), ya if off==0 else False))
+                    # Plan en cuotas: la cuota cargada y las siguientes hasta el horizonte (ver cuotas.py)
+                    crear_plan(c, mes_carga, t_sel, g_sel, con, cont, mf, mon, pag, str(fec), ya, int(c_act), int(c_tot))
                 conn.commit()
-            actualizar_saldos(mes_carga)
-            enviar_notificacion("Nuevo", f"{con} ({mf})"); st.success("Guardado"); st.rerun()
+            actualizar_saldos(mes_carga); aprender(esperar=False)
+            enviar_notificacion("Nuevo", f"{con} ({mf})"); st.success(f"Guardado en {g_sel}"); st.rerun()
 
     st.divider()
 
     with st.expander("🤖 Asistente IA (Chat)", expanded=False):
         api_key = os.environ.get("GOOGLE_API_KEY")
+        genai = cargar_genai() if api_key and st.toggle("Activar asistente", key="ia_activa") else None
         if not api_key: st.warning("Falta API Key")
-        elif not HAS_AI: st.error("Falta librería IA")
+        elif not st.session_state.get("ia_activa"): st.caption("El asistente se carga al activarlo.")
+        elif genai is None: st.error("Falta librería IA")
         else:
             try:
                 genai.configure(api_key=api_key)
-                models_list = []
-                try:
-                    for m in genai.list_models():
-                        if 'generateContent' in m.supported_generation_methods: models_list.append(m.name)
-                except: pass
-                if not models_list: model_name = 'models/gemini-1.5-flash'
-                else: model_name = next((m for m in ['models/gemini-1.5-flash', 'models/gemini-pro'] if m in models_list), models_list[0])
+                if "ia_modelo" not in st.session_state:
+                    models_list = []
+                    try:
+                        with tramo("gemini.list_models", "red"): modelos = list(genai.list_models())
+                        for m in modelos:
+                            if 'generateContent' in m.supported_generation_methods: models_list.append(m.name)
+                    except: pass
+                    if not models_list: st.session_state["ia_modelo"] = 'models/gemini-1.5-flash'
+                    else: st.session_state["ia_modelo"] = next((m for m in ['models/gemini-1.5-flash', 'models/gemini-pro'] if m in models_list), models_list[0])
+                model_name = st.session_state["ia_modelo"]
                 st.caption(f"🧠 {model_name.split('/')[-1]}")
                 model = genai.GenerativeModel(model_name)
                 with st.form(key="chat_ia_form"):
                     pregunta = st.text_input("Pregunta:", key="q_ia_sb")
                     if st.form_submit_button("Enviar") and pregunta:
                         with st.spinner("..."):
+                            import numpy as np
+                            import plotly.express as px
+                            import plotly.graph_objects as go
                             try:
-                                df_chat = df_all.copy()
+                                df_chat = df_all.copy(deep=False)  # CoW: el codigo generado no toca el libro compartido
                                 info = ", ".join([f"{c} ({t})" for c, t in zip(df_chat.columns, df_chat.dtypes)])
                                 prompt = f"""Contexto: Finanzas Arg ($). DF: {info}. User: "{pregunta}".
                                 Instrucciones: 1. Python code only. 2. Búsqueda Regex (ej: 'poll' -> 'pollo/s'). 3. Suma montos. 4. Output: `resultado_texto`(str), `figura_plotly`(px). 5. No print."""
-                                resp = model.generate_content(prompt).text.replace("```python", "").replace("```", "").strip()
+                                # El codigo generado depende solo del modelo y del prompt: se comparte entre procesos un dia
+                                clave_ia = clave_de(model_name, prompt)
+                                hay, resp = obtener("ia", clave_ia)
+                                if not hay:
+                                    with tramo("gemini.generate_content", "red"): resp = model.generate_content(prompt).text.replace("```python", "").replace("```", "").strip()
+                                    guardar("ia", clave_ia, resp, 86400)
                                 safe_builtins = {k: __builtins__[k] if isinstance(__builtins__, dict) else getattr(__builtins__, k) for k in
                                     ['abs', 'all', 'any', 'bool', 'dict', 'enumerate', 'filter', 'float', 'format',
                                      'int', 'isinstance', 'len', 'list', 'map', 'max', 'min', 'print', 'range',
@@ -154,21 +199,35 @@ with st.sidebar:
             except Exception as e: st.error(f"Error IA: {e}")
 
 st.title("CONTABILIDAD PERSONAL V5")
-df_filtrado = df_all[df_all['mes'] == mes_global].copy()
 
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 DASHBOARD", "💰 INVERSIONES", "🔮 PREDICCIONES", "⚙️ CONFIGURACIÓN", "📉 DEUDAS"])
+seccion = st.segmented_control("Sección", SECCIONES, default=SECCIONES[0], required=True, key="seccion", label_visibility="collapsed")
+
+with tramo(seccion, "seccion"):
+    if seccion == "📊 DASHBOARD":
+        from tabs import dashboard
+        df_filtrado = df_all[df_all['mes'] == mes_global]
+        dashboard.render(datos, df_filtrado, mes_global)
+
+    elif seccion == "💰 INVERSIONES":
+        from tabs import inversiones
+        inversiones.render(datos)
 
-with tab1:
-    dashboard.render(df_all, df_filtrado, dolar_val, dolar_info, mes_global, grupos_db)
+    elif seccion == "🔮 PREDICCIONES":
+        from tabs import predicciones
+        predicciones.render(datos)
 
-with tab2:
-    inversiones.render(dolar_val)
+    elif seccion == "⚙️ CONFIGURACIÓN":
+        from tabs import configuracion
+        configuracion.render(datos)
 
-with tab3:
-    predicciones.render(df_all)
+    elif seccion == "📉 DEUDAS":
+        from tabs import deudas
+        deudas.render(datos, mes_global)
 
-with tab4:
-    configuracion.render(grupos_db)
+    elif seccion == "🔎 BUSCADOR":
+        from tabs import buscador
+        buscador.render(dolar_val)
 
-with tab5:
-    deudas.render(mes_global)
+# --- PERFIL (admin) ---
+cerrar_corrida()
+with st.sidebar: panel_perfil(df_all)
@@ -1,8 +1,6 @@
 import hashlib
-import streamlit as st
-from utils import load_lottieurl
-from streamlit_lottie import st_lottie
 from config import LOTTIE_FINANCE
+from perfil import medido
 
 try:
     import bcrypt
@@ -10,11 +8,13 @@ try:
 except ImportError:
     HAS_BCRYPT = False
 
+@medido("bcrypt", "cpu")
 def make_hashes(p):
     if HAS_BCRYPT:
         return bcrypt.hashpw(p.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
     return hashlib.sha256(str.encode(p)).hexdigest()
 
+@medido("bcrypt", "cpu")
 def check_hashes(p, h):
     if HAS_BCRYPT and h.startswith('$2b$'):
         return bcrypt.checkpw(p.encode('utf-8'), h.encode('utf-8'))
@@ -31,6 +31,10 @@ def _upgrade_hash_if_needed(username, password):
         conn.commit()
 
 def login_screen():
+    # Streamlit solo hace falta para la pantalla: los hashes se usan tambien desde db.py y cli.py
+    import streamlit as st
+    from streamlit_lottie import st_lottie
+    from utils import load_lottieurl
     if 'logged_in' not in st.session_state: st.session_state['logged_in'] = False
     if 'username' not in st.session_state: st.session_state['username'] = ''
 
@@ -0,0 +1,228 @@
+"""Benchmark de los caminos calientes sobre un libro sintetico de movimientos.
+
+Por defecto usa una base SQLite descartable (DB_BACKEND embebido); con --database-url corre contra
+Postgres (la tabla movimientos se VACIA: usar solo una base de prueba). Uso:
+    python benchmark.py [--tamanos 10000,100000] [--json resultados.json]
+                        [--comparar base.json --tolerancia 0.25] [--omitir excel,backup]
+"""
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import datetime
+import tempfile
+import numpy as np
+import pandas as pd
+from config import LISTA_MESES_LARGA, OPCIONES_PAGO
+
+DOLAR_BENCH = 1480.0
+GRUPOS_BENCH = ["CASA", "AUTO", "VARIOS", "DEUDAS", "AHORRO MANUEL", "SALUD", "EDUCACION", "OCIO"]
+CONCEPTOS_GASTO = ["Supermercado", "Expensas", "Luz", "Gas", "Internet", "Celular", "Nafta", "Seguro Auto", "Farmacia",
+                   "Prepaga", "Colegio", "Restaurante", "Netflix", "Spotify", "Ropa", "Electrodomestico", "TERRENO"]
+CONCEPTOS_GANANCIA = ["Sueldo", "SALARIO CHICOS", "Honorarios", "Alquiler cobrado", "Intereses", "Venta"]
+COLUMNAS_BENCH = ["fecha", "mes", "tipo", "grupo", "tipo_gasto", "contrato", "cuota", "monto", "moneda", "forma_pago", "fecha_pago", "pagado"]
+MESES_BENCH = 36  # 2026-2028
+
+
+# --- GENERADOR SINTETICO ---
+def generar_ledger(n, semilla=0, meses=MESES_BENCH):
+    """DataFrame de `n` movimientos con la forma del libro real.
+
+    ~80% gastos, ~10% en USD, ~25% de los gastos en cuotas (k/3, k/6, k/12 en meses consecutivos),
+    montos log-normales y pagado segun la fecha de pago respecto de hoy.
+    """
+    rng = np.random.default_rng(semilla)
+    lista = np.array(LISTA_MESES_LARGA[:meses], dtype=object)
+    idx_mes = rng.integers(0, meses, n)
+    tipo = np.where(rng.random(n) < 0.8, "GASTO", "GANANCIA")
+    es_gasto = tipo == "GASTO"
+    concepto = np.where(es_gasto, rng.choice(CONCEPTOS_GASTO, n), rng.choice(CONCEPTOS_GANANCIA, n))
+    moneda = np.where(rng.random(n) < 0.1, "USD", "ARS")
+    monto = np.round(rng.lognormal(10.5, 1.2, n), 2)
+    monto = np.where(moneda == "USD", np.round(monto / DOLAR_BENCH, 2), monto)
+
+    # Cuotas: la cuota k del plan cae k-1 meses despues del mes de compra
+    en_cuotas = es_gasto & (rng.random(n) < 0.25)
+    total = rng.choice([3, 6, 12], n)
+    k = rng.integers(1, 13, n) % total + 1
+    cuota = np.where(en_cuotas, pd.Series(k).astype(str).str.cat(pd.Series(total).astype(str), sep="/").to_numpy(), "")
+    contrato = np.where(en_cuotas, "PLAN-" + pd.Series(rng.integers(1, max(n // 12, 2), n)).astype(str).to_numpy(), "")
+
+    anio = 2026 + idx_mes // 12
+    dia = rng.integers(1, 29, n)
+    fecha_pago = pd.to_datetime(pd.DataFrame({"year": anio, "month": idx_mes % 12 + 1, "day": dia}))
+    pagado = (fecha_pago.dt.date < datetime.date.today()).to_numpy() | (rng.random(n) < 0.3)
+    return pd.DataFrame({
+        "fecha": fecha_pago.dt.strftime("%Y-%m-%d"),
+        "mes": lista[idx_mes],
+        "tipo": tipo,
+        "grupo": np.where(concepto == "TERRENO", "AHORRO MANUEL", rng.choice(GRUPOS_BENCH, n)),
+        "tipo_gasto": concepto,
+        "contrato": contrato,
+        "cuota": cuota,
+        "monto": monto,
+        "moneda": moneda,
+        "forma_pago": rng.choice(OPCIONES_PAGO, n),
+        "fecha_pago": fecha_pago.dt.strftime("%Y-%m-%d"),
+        "pagado": pagado,
+    })[COLUMNAS_BENCH]
+
+
+def cargar_ledger(df, bloque=50000):
+    """Vacia movimientos y carga `df` con COPY (copy_expert tambien existe en el cursor SQLite)."""
+    from db import db_connection, usa_sqlite
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM movimientos" if usa_sqlite() else "TRUNCATE movimientos")
+        for i in range(0, len(df), bloque):
+            buf = io.StringIO()
+            df.iloc[i:i + bloque].to_csv(buf, index=False, header=False)
+            buf.seek(0)
+            c.copy_expert(f"COPY movimientos ({', '.join(COLUMNAS_BENCH)}) FROM STDIN WITH (FORMAT csv)", buf)
+        conn.commit()
+
+
+# --- CAMINOS MEDIDOS ---
+def agregados_dashboard(df_all, mes):
+    from tabs.dashboard import resultado_por_moneda, monto_en_ars, evolucion_patrimonial
+    df = df_all[df_all["mes"] == mes].copy()
+    resultado_por_moneda(df)
+    df["m_ars_v"] = monto_en_ars(df, DOLAR_BENCH)
+    gastos = df[df["tipo"] == "GASTO"]
+    gastos.groupby("grupo")["m_ars_v"].sum(); gastos.groupby("forma_pago")["m_ars_v"].sum()
+    gastos.groupby(pd.to_datetime(gastos["fecha_pago"], errors="coerce").dt.day)["m_ars_v"].sum()
+    df.groupby(["moneda", "tipo"])["monto"].sum()
+    evolucion_patrimonial(df_all, DOLAR_BENCH)
+
+
+def agregados_resumen(mes):
+    """Lo mismo que leen el dashboard y predicciones, pero desde resumen_mensual en lugar de las filas."""
+    from resumen import leer_resumen
+    from tabs.dashboard import resultado_por_moneda, monto_en_ars, evolucion_patrimonial
+    from tabs.predicciones import serie_mensual
+    resumen = leer_resumen(); res_mes = resumen[resumen["mes"] == mes]
+    resultado_por_moneda(res_mes); monto_en_ars(res_mes, DOLAR_BENCH)
+    evolucion_patrimonial(resumen, DOLAR_BENCH); serie_mensual(resumen)
+
+
+def ajuste_predicciones(df_all):
+    from tabs.predicciones import serie_mensual, proyectar
+    monthly = serie_mensual(df_all)
+    futuro = np.arange(monthly["mes_idx"].max() + 1, monthly["mes_idx"].max() + 13, dtype=float)
+    # Sin la cache en disco: se mide el ajuste, no la lectura de la entrada guardada
+    for grado in (1, 2, 3): proyectar.__wrapped__(monthly, grado, futuro)
+
+
+def presupuestos_todos(df_all):
+    from presupuestos import calcular
+    grupos = df_all["grupo"].value_counts().index[:6]
+    calcular(df_all, pd.DataFrame({"grupo": grupos, "limite": 1e6, "moneda": "ARS"}), DOLAR_BENCH)
+
+
+def categorizar_todo(df_all):
+    """Peor caso del categorizador: reentrenar de cero (log podado o grupo nuevo) y categorizar todo el libro."""
+    import categorizador
+    m = categorizador.entrenar()
+    categorizador._estado.update(ruta=categorizador._ruta(), modelo=m)
+    categorizador.categorizar_lote(df_all["tipo_gasto"], df_all["contrato"])
+
+
+def anomalias_todas(df_all):
+    from anomalias import totales, puntuar
+    puntuar(totales(df_all, DOLAR_BENCH))
+
+
+def caminos():
+    """Nombre -> funcion(df_all) de cada camino caliente medido. Los imports van aca para no medirlos."""
+    import tabs.dashboard, tabs.predicciones, resumen  # noqa: F401
+    from utils import generar_alertas
+    from logic import actualizar_saldos, automatizaciones
+    from db import generar_backup_sql
+    from logic import _excel
+    mes = LISTA_MESES_LARGA[0]
+    return {
+        "generar_alertas": lambda df: generar_alertas(df, DOLAR_BENCH),
+        "dashboard_agregados": lambda df: agregados_dashboard(df, mes),
+        "resumen_mensual": lambda df: agregados_resumen(mes),
+        "actualizar_saldos": lambda df: actualizar_saldos(mes),
+        "automatizaciones": lambda df: automatizaciones(),
+        "backup": lambda df: generar_backup_sql(),
+        "excel": lambda df: _excel.__wrapped__(None),
+        "predicciones": ajuste_predicciones,
+        "presupuestos": presupuestos_todos,
+        "categorizador": categorizar_todo,
+        "anomalias": anomalias_todas,
+    }
+
+
+def medir(fn, arg, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter(); fn(arg); tiempos.append(time.perf_counter() - t0)
+    return min(tiempos)
+
+
+def correr(tamanos, repeticiones=3, omitir=(), semilla=0):
+    from db import init_db, db_connection
+    init_db()
+    resultados = {}
+    for n in tamanos:
+        df = generar_ledger(n, semilla)
+        t0 = time.perf_counter(); cargar_ledger(df); carga = time.perf_counter() - t0
+        with db_connection() as conn: df_all = pd.read_sql("SELECT * FROM movimientos", conn)
+        res = {"carga": carga}
+        for nombre, fn in caminos().items():
+            if nombre in omitir: continue
+            res[nombre] = medir(fn, df_all, repeticiones)
+            print(f"  {n:>9} {nombre:<22} {res[nombre]:8.3f} s", flush=True)
+        resultados[str(n)] = res
+    return resultados
+
+
+def regresiones(actual, base, tolerancia, minimo=0.05):
+    """Caminos que tardan mas de base * (1 + tolerancia). Se ignoran los que en ambos casos estan bajo `minimo` s (ruido)."""
+    salida = []
+    for n, caminos_n in actual.items():
+        for nombre, t in caminos_n.items():
+            b = base.get(n, {}).get(nombre)
+            if b is None or max(t, b) < minimo: continue
+            if t > b * (1 + tolerancia): salida.append((n, nombre, b, t))
+    return salida
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--tamanos", default="10000,100000", help="cantidades de movimientos separadas por coma (ej. 10000,100000,1000000)")
+    ap.add_argument("--repeticiones", type=int, default=3)
+    ap.add_argument("--omitir", default="", help="caminos a saltear separados por coma")
+    ap.add_argument("--database-url", help="Postgres de prueba; por defecto SQLite temporal")
+    ap.add_argument("--json", help="guardar resultados en este archivo")
+    ap.add_argument("--comparar", help="JSON de una corrida anterior; falla (exit 1) ante regresiones")
+    ap.add_argument("--tolerancia", type=float, default=0.25, help="regresion admitida (0.25 = 25%%)")
+    args = ap.parse_args()
+
+    if args.database_url: os.environ["DATABASE_URL"] = args.database_url
+    else: os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_'), 'bench.db')}"
+
+    tamanos = [int(t) for t in args.tamanos.split(",") if t.strip()]
+    print(f"== Benchmark ({'postgres' if args.database_url else 'sqlite'}, min de {args.repeticiones}) ==")
+    resultados = correr(tamanos, args.repeticiones, {o.strip() for o in args.omitir.split(",") if o.strip()})
+    salida = {"entorno": {"python": platform.python_version(), "pandas": pd.__version__, "maquina": platform.machine(),
+                          "backend": "postgres" if args.database_url else "sqlite", "fecha": str(datetime.date.today())},
+              "tiempos": resultados}
+    if args.json:
+        with open(args.json, "w") as f: json.dump(salida, f, indent=2)
+
+    if args.comparar:
+        with open(args.comparar) as f: base = json.load(f)["tiempos"]
+        malas = regresiones(resultados, base, args.tolerancia)
+        for n, nombre, b, t in malas: print(f"REGRESION {nombre} ({n}): {b:.3f} s -> {t:.3f} s")
+        if malas: sys.exit(1)
+        print(f"Sin regresiones (tolerancia {args.tolerancia:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import PyInstaller.__main__
 import os
+import sys
 import streamlit
 import streamlit_lottie
 
@@ -15,11 +16,17 @@ lottie_frontend = os.path.join(lottie_folder, "frontend")
 print(f"📍 Streamlit en: {streamlit_folder}")
 print(f"📍 Lottie en: {lottie_folder}")
 
+# --onedir: carpeta con el ejecutable y sus dependencias ya descomprimidas (arranca mucho mas rapido
+# que --onefile, que extrae todo a un temporal en cada inicio). Por defecto sigue siendo --onefile.
+# Los .spec aceptan lo mismo: pyinstaller ContabilidadV3.spec -- --onedir
+modo = '--onedir' if '--onedir' in sys.argv[1:] else '--onefile'
+print(f"📦 Modo: {modo}")
+
 # 3. Ejecutar PyInstaller
 PyInstaller.__main__.run([
     'run_app.py',
     '--name=ContabilidadV3',
-    '--onefile',
+    modo,
     '--clean',
     '--noconfirm',
     
@@ -41,6 +48,7 @@ PyInstaller.__main__.run([
     '--hidden-import=pandas',
     '--hidden-import=plotly',
     '--hidden-import=psycopg2',
+    '--hidden-import=sqlite3',
     '--hidden-import=sklearn',
     '--hidden-import=dotenv',
     '--hidden-import=streamlit_lottie',
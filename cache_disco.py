@@ -0,0 +1,159 @@
+import os
+import time
+import atexit
+import pickle
+import sqlite3
+import hashlib
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# --- CACHE EN DISCO COMPARTIDA POR HOST ---
+# st.cache_data vive en la memoria de cada proceso: con varios servidores detras de un proxy cada
+# uno volvia a pedir el dolar, armar el Excel o ajustar las predicciones. Aca las entradas van a
+# un SQLite local (WAL: lectores y un escritor a la vez entre procesos), con TTL por entrada, tope
+# de tamano con desalojo LRU y contadores de aciertos/fallos por espacio. Cada escritura es una
+# transaccion: otro proceso ve la entrada anterior o la nueva, nunca una a medias. Si la cache
+# falla (disco lleno, archivo bloqueado) se calcula igual y solo se registra el error.
+# Las lecturas no escriben: el "usado" del LRU y los contadores se acumulan en el proceso y se
+# vuelcan en la proxima escritura, cada VOLCAR_CADA segundos o al terminar.
+CACHE_DIR = os.environ.get("CACHE_DIR", os.path.join(os.path.expanduser("~"), ".contabilidad_v5", "cache"))
+MAX_MB = float(os.environ.get("CACHE_MAX_MB", "200"))
+ARCHIVO = "cache.sqlite3"
+VOLCAR_CADA = 30
+_local = threading.local()
+_pendiente = {"ruta": None, "usos": {}, "cuentas": {}, "volcado": time.monotonic()}
+_lock_pendiente = threading.Lock()
+
+
+def _conn():
+    ruta = os.path.join(CACHE_DIR, ARCHIVO)
+    if getattr(_local, "ruta", None) != ruta:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        conn = sqlite3.connect(ruta, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL"); conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS entradas (clave TEXT PRIMARY KEY, espacio TEXT NOT NULL, valor BLOB NOT NULL, tamano INTEGER NOT NULL, expira REAL NOT NULL, usado REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entradas_usado ON entradas (usado)")
+        conn.execute("CREATE TABLE IF NOT EXISTS contadores (espacio TEXT PRIMARY KEY, aciertos INTEGER NOT NULL DEFAULT 0, fallos INTEGER NOT NULL DEFAULT 0)")
+        _local.conn, _local.ruta = conn, ruta
+    return _local.conn
+
+
+@contextmanager
+def _transaccion(c):
+    c.execute("BEGIN IMMEDIATE")
+    try: yield c
+    except BaseException:
+        c.execute("ROLLBACK"); raise
+    c.execute("COMMIT")
+
+
+def _anotar(espacio, clave, acierto):
+    """Registra la lectura en memoria; devuelve True si ya toca volcar."""
+    ruta = os.path.join(CACHE_DIR, ARCHIVO)
+    with _lock_pendiente:
+        if _pendiente["ruta"] != ruta: _pendiente.update(ruta=ruta, usos={}, cuentas={})
+        if acierto: _pendiente["usos"][clave] = time.time()
+        k = (espacio, "aciertos" if acierto else "fallos")
+        _pendiente["cuentas"][k] = _pendiente["cuentas"].get(k, 0) + 1
+        return time.monotonic() - _pendiente["volcado"] >= VOLCAR_CADA
+
+
+def _volcar_en(c):
+    """Escribe lo anotado por las lecturas, dentro de la transaccion de `c`."""
+    with _lock_pendiente:
+        if _pendiente["ruta"] != os.path.join(CACHE_DIR, ARCHIVO): return
+        usos, cuentas = _pendiente["usos"], _pendiente["cuentas"]
+        _pendiente.update(usos={}, cuentas={}, volcado=time.monotonic())
+    c.executemany("UPDATE entradas SET usado = MAX(usado, ?) WHERE clave = ?", [(t, k) for k, t in usos.items()])
+    for (espacio, columna), n in cuentas.items():
+        c.execute(f"INSERT INTO contadores (espacio, {columna}) VALUES (?, ?) ON CONFLICT (espacio) DO UPDATE SET {columna} = {columna} + excluded.{columna}", (espacio, n))
+
+
+@atexit.register
+def volcar():
+    """Vuelca ya los contadores y usos pendientes de este proceso."""
+    try:
+        with _transaccion(_conn()) as c: _volcar_en(c)
+    except Exception as e: logger.error(f"Cache en disco (contadores): {e}")
+
+
+def obtener(espacio, clave):
+    """(True, valor) si hay una entrada vigente; (False, None) si no. Solo lee: no toma el lock de escritura."""
+    try:
+        fila = _conn().execute("SELECT valor FROM entradas WHERE clave = ? AND expira > ?", (clave, time.time())).fetchone()
+        if _anotar(espacio, clave, fila is not None): volcar()
+        return (True, pickle.loads(fila[0])) if fila else (False, None)
+    except Exception as e:
+        logger.error(f"Cache en disco ({espacio}): {e}")
+        return False, None
+
+
+def guardar(espacio, clave, valor, ttl):
+    try:
+        blob = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > MAX_MB * 2**20: return
+        c, ahora = _conn(), time.time()
+        with _transaccion(c):
+            c.execute("INSERT OR REPLACE INTO entradas VALUES (?, ?, ?, ?, ?, ?)", (clave, espacio, blob, len(blob), ahora + ttl, ahora))
+            _volcar_en(c)  # el LRU ve las lecturas recientes antes de desalojar
+            _desalojar(c, ahora)
+    except Exception as e:
+        logger.error(f"Cache en disco ({espacio}): {e}")
+
+
+def _desalojar(c, ahora):
+    """Borra lo vencido y, si se pasa del tope, las entradas usadas hace mas tiempo."""
+    c.execute("DELETE FROM entradas WHERE expira <= ?", (ahora,))
+    c.execute("""DELETE FROM entradas WHERE clave IN (
+                     SELECT clave FROM (SELECT clave, SUM(tamano) OVER (ORDER BY usado DESC, clave) AS acumulado FROM entradas)
+                     WHERE acumulado > ?)""", (MAX_MB * 2**20,))
+
+
+def _huella(x):
+    """Version hasheable de un argumento: los DataFrame/arrays por contenido."""
+    if isinstance(x, (pd.DataFrame, pd.Series)):
+        nombres = x.columns if isinstance(x, pd.DataFrame) else [x.name]
+        return (type(x).__name__, tuple(map(str, nombres)), pd.util.hash_pandas_object(x, index=True).to_numpy().tobytes())
+    if hasattr(x, "tobytes") and hasattr(x, "dtype"): return ("ndarray", str(x.dtype), x.shape, x.tobytes())
+    if isinstance(x, (list, tuple)): return tuple(_huella(v) for v in x)
+    if isinstance(x, dict): return tuple(sorted((str(k), _huella(v)) for k, v in x.items()))
+    return x
+
+
+def clave_de(*partes):
+    return hashlib.sha256(pickle.dumps(_huella(partes), protocol=4)).hexdigest()
+
+
+def cacheado(espacio, ttl):
+    """Decorador: memoiza en disco por (funcion, argumentos) durante `ttl` segundos."""
+    def deco(fn):
+        nombre = f"{fn.__module__}.{fn.__qualname__}"
+        @functools.wraps(fn)
+        def envuelta(*args, **kwargs):
+            clave = clave_de(nombre, args, kwargs)
+            hay, valor = obtener(espacio, clave)
+            if hay: return valor
+            valor = fn(*args, **kwargs)
+            guardar(espacio, clave, valor, ttl)
+            return valor
+        return envuelta
+    return deco
+
+
+def estadisticas():
+    """Aciertos, fallos, entradas vigentes y MB por espacio."""
+    volcar()
+    c = _conn()
+    cont = pd.read_sql("SELECT espacio, aciertos, fallos FROM contadores", c)
+    ent = pd.read_sql("SELECT espacio, COUNT(*) AS entradas, SUM(tamano) / 1048576.0 AS mb FROM entradas WHERE expira > ? GROUP BY espacio", c, params=(time.time(),))
+    return cont.merge(ent, on="espacio", how="outer").fillna(0).sort_values("espacio", ignore_index=True)
+
+
+def vaciar():
+    with _lock_pendiente: _pendiente.update(usos={}, cuentas={})
+    with _transaccion(_conn()) as c: c.execute("DELETE FROM entradas"); c.execute("DELETE FROM contadores")
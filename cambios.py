@@ -0,0 +1,93 @@
+import os
+import time
+import select
+import logging
+import threading
+import pandas as pd
+import psycopg2
+from db import usa_sqlite, MAX_CAMBIOS
+from memoria import unir
+
+logger = logging.getLogger(__name__)
+
+# --- DELTAS ENTRE SESIONES ---
+# La tabla movimientos_cambios (triggers en db.init_db) numera cada alta, modificacion y baja. Una
+# sesion que cargo hasta la version v solo relee los ids (o meses, op R) tocados despues de v.
+# En Postgres ademas un hilo por proceso escucha NOTIFY movimientos_cambios y guarda la ultima
+# version avisada: las sesiones la comparan en memoria para refrescarse sin consultar la base.
+CANAL = "movimientos_cambios"
+ESPERA_RECONEXION = 5
+
+
+def version_actual(c):
+    c.execute("SELECT COALESCE(max(version), 0) FROM movimientos_cambios")
+    return c.fetchone()[0]
+
+
+def leer_cambios(c, desde):
+    """(version, ids, meses) con lo cambiado despues de `desde`; None si hace falta recargar todo (TRUNCATE o log podado)."""
+    ultima = version_actual(c)
+    if ultima == desde: return ultima, [], []
+    if desde < ultima - MAX_CAMBIOS: return None
+    c.execute("SELECT id, mes, op FROM movimientos_cambios WHERE version > %s AND version <= %s", (desde, ultima))
+    filas = c.fetchall()
+    if any(op == "T" for _, _, op in filas): return None
+    ids = sorted({i for i, _, op in filas if op != "R" and i is not None})
+    meses = sorted({m for _, m, op in filas if op == "R"})
+    return ultima, ids, meses
+
+
+def aplicar_cambios(df, conn, ids, meses):
+    """Reemplaza en `df` (libro compacto) las filas de esos ids/meses por su estado actual. None si cambio el esquema."""
+    nuevos = pd.read_sql("SELECT * FROM movimientos WHERE id = ANY(%s) OR mes = ANY(%s)", conn, params=(ids, meses))
+    if list(nuevos.columns) != list(df.columns): return None
+    return unir(df[~(df["id"].isin(ids) | df["mes"].isin(meses))], nuevos)
+
+
+# --- ESCUCHA (LISTEN/NOTIFY) ---
+class Escucha(threading.Thread):
+    """Conexion dedicada en autocommit con LISTEN; se reconecta sola si se corta."""
+
+    def __init__(self, dsn):
+        super().__init__(name="escucha-cambios", daemon=True)
+        self.dsn, self.version = dsn, 0
+
+    def run(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn); conn.autocommit = True
+                c = conn.cursor(); c.execute(f"LISTEN {CANAL}")
+                # Lo confirmado mientras no se escuchaba no llega por NOTIFY
+                self.version = max(self.version, version_actual(c))
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []): continue
+                    conn.poll()
+                    while conn.notifies:
+                        aviso = conn.notifies.pop(0)
+                        if aviso.payload.isdigit(): self.version = max(self.version, int(aviso.payload))
+            except Exception as e:
+                logger.error(f"Escucha de cambios cortada: {e}")
+            finally:
+                if conn is not None:
+                    try: conn.close()  # cada corte abria otra conexion sin soltar la anterior
+                    except Exception: pass
+            time.sleep(ESPERA_RECONEXION)
+
+
+_escucha = None
+_lock_escucha = threading.Lock()
+
+
+def iniciar_escucha():
+    """Arranca el hilo una vez por proceso. En SQLite no hay NOTIFY: devuelve None."""
+    global _escucha
+    if usa_sqlite(): return None
+    with _lock_escucha:
+        if _escucha is None:
+            _escucha = Escucha(os.environ.get("DATABASE_URL")); _escucha.start()
+    return _escucha
+
+
+def ultima_version_notificada():
+    return _escucha.version if _escucha else 0
@@ -0,0 +1,214 @@
+"""Prueba de carga: N sesiones simultaneas de la app (AppTest) contra una base local.
+
+Cada sesion corre en su propio hilo dentro de un solo proceso, como en el servidor de Streamlit, y hace
+un recorrido realista: login, cambio de mes y de seccion, altas y pagos de deudas. Por cada nivel de
+concurrencia informa la latencia de rerun (p50/p95), los pedidos al pool de conexiones, las veces
+que estuvo agotado, la espera para obtener conexion y los errores. Uso:
+    python carga.py [--sesiones 1,2,4,8] [--pasos 8] [--filas 20000] [--json carga.json] [--max-p95 5.0]
+Por defecto usa una base SQLite descartable con el libro sintetico de benchmark.py. Con --database-url
+corre contra ese Postgres (local o de prueba) con sus datos: lo que carga lleva el prefijo CARGA y se
+borra al terminar. DB_POOL_MAX cambia el tamaño del pool.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import datetime
+import tempfile
+import threading
+import numpy as np
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(BASE, "app.py")
+USUARIO, CLAVE = "carga", "carga-123"
+PREFIJO = "CARGA "
+DEUDA = "CARGA deuda"
+SECCIONES = ["📊 DASHBOARD", "💰 INVERSIONES", "🔮 PREDICCIONES", "⚙️ CONFIGURACIÓN", "📉 DEUDAS", "🔎 BUSCADOR"]
+PESOS = {"mes": 0.35, "seccion": 0.25, "alta": 0.2, "pago": 0.2}  # recorrido de una sesion tipica
+TIMEOUT = 300
+
+
+# --- PREPARACION ---
+def preparar(filas, semilla):
+    """Usuario y deuda de prueba; en SQLite, ademas, el libro sintetico. Devuelve el id de la deuda."""
+    from db import init_db_una_vez, db_connection, usa_sqlite
+    from auth import make_hashes
+    init_db_una_vez()
+    if usa_sqlite():
+        from benchmark import generar_ledger, cargar_ledger
+        cargar_ledger(generar_ledger(filas, semilla))
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("INSERT INTO users VALUES (%s, %s) ON CONFLICT DO NOTHING", (USUARIO, make_hashes(CLAVE)))
+        c.execute("INSERT INTO deudas (nombre_deuda, monto_total, moneda, fecha_inicio, estado) VALUES (%s, %s, 'ARS', %s, 'ACTIVA')", (DEUDA, 1e12, str(datetime.date.today())))
+        c.execute("SELECT max(id) FROM deudas WHERE nombre_deuda = %s", (DEUDA,)); deuda = c.fetchone()[0]
+        conn.commit()
+    return deuda
+
+
+def limpiar():
+    """Borra lo que cargo la prueba (altas, pagos, deuda y usuario) y recalcula los saldos."""
+    from config import LISTA_MESES_LARGA
+    from db import db_connection
+    from logic import actualizar_saldos
+    with db_connection() as conn:
+        c = conn.cursor()
+        filtro = ("tipo_gasto LIKE %s OR tipo_gasto = %s", (f"{PREFIJO}%", f"Pago: {DEUDA}"))
+        c.execute(f"SELECT DISTINCT mes FROM movimientos WHERE {filtro[0]}", filtro[1]); meses = [r[0] for r in c.fetchall() if r[0] in LISTA_MESES_LARGA]
+        c.execute(f"DELETE FROM movimientos WHERE {filtro[0]}", filtro[1])
+        c.execute("DELETE FROM deudas WHERE nombre_deuda = %s", (DEUDA,))
+        c.execute("DELETE FROM users WHERE username = %s", (USUARIO,))
+        conn.commit()
+    if meses: actualizar_saldos(min(meses, key=LISTA_MESES_LARGA.index))
+
+
+# --- SESION ---
+def _apptest_en_hilos():
+    """AppTest no esta pensado para varias sesiones en hilos. Pone su Runtime simulado al empezar cada
+    corrida y None al terminar: la que termina se lo saca a las que siguen corriendo, asi que queda
+    visible el ultimo para todas; lo mismo con la opcion global.appTest, que queda prendida. Y compila
+    app.py en cada corrida: en 3.11 ast.parse en varios hilos a la vez puede fallar, se serializa (el
+    servidor real compila una vez)."""
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner import magic
+    agregar, lock = magic.add_magic, threading.Lock()
+    def add_magic(*a, **k):
+        with lock: return agregar(*a, **k)
+    magic.add_magic = add_magic
+    config.set_option("global.appTest", True)
+    ultimo = {}
+    def instance(cls):
+        if cls._instance is not None: ultimo["rt"] = cls._instance
+        if "rt" not in ultimo: raise RuntimeError("Runtime hasn't been created!")
+        return ultimo["rt"]
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or "rt" in ultimo)
+
+
+class Sesion:
+    """Una sesion de navegador: cada accion toca widgets de la app y corre el rerun que dispararia."""
+
+    def __init__(self, n, semilla, deuda, registro):
+        from streamlit.testing.v1 import AppTest
+        from config import LISTA_MESES_LARGA, obtener_indice_mes_actual
+        self.n, self.rng, self.deuda, self.registro = n, random.Random(semilla + n), deuda, registro
+        i = obtener_indice_mes_actual()
+        self.meses = LISTA_MESES_LARGA[max(i - 3, 0):i + 4]
+        self.at = AppTest.from_file(APP, default_timeout=TIMEOUT)
+
+    def correr(self, accion):
+        t = time.perf_counter()
+        try:
+            self.at.run(); errores = [str(e.value)[:200] for e in self.at.exception]
+        except Exception as e: errores = [repr(e)[:200]]
+        self.registro.append({"sesion": self.n, "accion": accion, "segundos": time.perf_counter() - t, "errores": errores})
+
+    def _widget(self, lista, etiqueta):
+        return next(w for w in lista if w.label == etiqueta)
+
+    def login(self):
+        self.correr("inicio")
+        self._widget(self.at.text_input, "Usuario").input(USUARIO)
+        self._widget(self.at.text_input, "Contraseña").input(CLAVE)
+        self._widget(self.at.button, "Entrar").click()
+        self.correr("login")
+
+    def mes(self):
+        self._widget(self.at.sidebar.selectbox, "Mes de Trabajo:").select(self.rng.choice(self.meses))
+        self.correr("mes")
+
+    def seccion(self, nombre=None):
+        self.at.session_state["seccion"] = nombre or self.rng.choice(SECCIONES)
+        self.correr("seccion")
+
+    def alta(self):
+        sb = self.at.sidebar
+        grupo = self._widget(sb.selectbox, "GRUPO"); grupo.select(self.rng.choice(grupo.options[1:]))  # sin el automatico
+        self._widget(sb.text_input, "CONCEPTO").input(f"{PREFIJO}{self.n}-{self.rng.randrange(1000)}")
+        self._widget(sb.text_input, "MONTO").input(f"{self.rng.randrange(100, 100000)},00")
+        self._widget(sb.button, "GRABAR").click()
+        self.correr("alta")
+
+    def pago(self):
+        if self.at.session_state["seccion"] != "📉 DEUDAS": self.seccion("📉 DEUDAS")
+        self.at.text_input(key=f"m{self.deuda}").input(str(self.rng.randrange(10, 1000)))
+        self.at.button(key=f"b{self.deuda}").click()
+        self.correr("pago")
+
+    def recorrido(self, pasos):
+        acciones = ["login"] + self.rng.choices(list(PESOS), weights=list(PESOS.values()), k=pasos)
+        for accion in acciones:
+            try: getattr(self, accion)()
+            except Exception as e:  # un widget que no aparecio (la corrida anterior fallo)
+                self.registro.append({"sesion": self.n, "accion": accion, "segundos": 0.0, "errores": [repr(e)[:200]]})
+                if accion == "login": return
+
+
+# --- NIVELES DE CONCURRENCIA ---
+def nivel(sesiones, pasos, semilla, deuda):
+    from db import estadisticas_pool
+    registro = []
+    estadisticas_pool(reiniciar=True)
+    hilos = [threading.Thread(target=lambda n=n: Sesion(n, semilla, deuda, registro).recorrido(pasos)) for n in range(sesiones)]
+    t = time.perf_counter()
+    for h in hilos: h.start()
+    for h in hilos: h.join()
+    total = time.perf_counter() - t
+    seg = np.array([r["segundos"] for r in registro if r["segundos"] > 0])
+    por_accion = {}
+    for r in registro: por_accion.setdefault(r["accion"], []).append(r["segundos"])
+    return {"sesiones": sesiones, "reruns": len(seg), "p50": float(np.percentile(seg, 50)) if len(seg) else 0.0,
+            "p95": float(np.percentile(seg, 95)) if len(seg) else 0.0, "max": float(seg.max()) if len(seg) else 0.0,
+            "reruns_por_s": len(seg) / total, "errores": sum(len(r["errores"]) > 0 for r in registro),
+            "ejemplos_error": sorted({e for r in registro for e in r["errores"]})[:5],
+            "p50_por_accion": {a: round(float(np.median(v)), 3) for a, v in por_accion.items()}, "pool": estadisticas_pool()}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sesiones", default="1,2,4,8", help="niveles de concurrencia separados por coma")
+    ap.add_argument("--pasos", type=int, default=8, help="acciones por sesion despues del login")
+    ap.add_argument("--filas", type=int, default=20000, help="movimientos del libro sintetico (solo SQLite)")
+    ap.add_argument("--semilla", type=int, default=0)
+    ap.add_argument("--database-url", help="Postgres local o de prueba; por defecto SQLite temporal")
+    ap.add_argument("--json", help="guardar resultados en este archivo")
+    ap.add_argument("--max-p95", type=float, help="falla (exit 1) si algun nivel supera este p95 en segundos")
+    args = ap.parse_args()
+
+    # Antes de importar la app: base, snapshot, cache y modelo van a un directorio descartable
+    tmp = tempfile.mkdtemp(prefix="carga_")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmp, 'carga.db')}"
+    for var in ("SNAPSHOT_DIR", "CACHE_DIR", "MODELO_DIR"): os.environ.setdefault(var, os.path.join(tmp, var.lower()))
+    sys.path.insert(0, BASE)
+    logging.basicConfig(level=logging.CRITICAL)  # el pool agotado se cuenta; no hace falta un log por rerun
+    for ruido in ("streamlit.deprecation_util", "streamlit.runtime.scriptrunner_utils.script_run_context"):
+        logging.getLogger(ruido).disabled = True  # un aviso por rerun y por hilo
+
+    _apptest_en_hilos()
+    deuda = preparar(args.filas, args.semilla)
+    from db import POOL_MAX, usa_sqlite
+    print(f"== Carga ({'sqlite' if usa_sqlite() else f'postgres, pool de {POOL_MAX}'}, {args.pasos} acciones por sesion) ==")
+    print(f"  {'sesiones':>8} {'reruns':>6} {'p50 s':>7} {'p95 s':>7} {'max s':>7} {'rerun/s':>8} {'errores':>7} {'pedidas':>8} {'agotado':>8} {'pico':>5} {'espera p95 ms':>14}")
+    niveles = []
+    try:
+        for n in [int(s) for s in args.sesiones.split(",") if s.strip()]:
+            r = nivel(n, args.pasos, args.semilla, deuda); niveles.append(r); p = r["pool"]
+            print(f"  {n:>8} {r['reruns']:>6} {r['p50']:>7.2f} {r['p95']:>7.2f} {r['max']:>7.2f} {r['reruns_por_s']:>8.2f} {r['errores']:>7} "
+                  f"{p['pedidas']:>8} {p['agotado']:>8} {p['pico']:>5} {p['espera_p95_ms']:>14.2f}")
+            for e in r["ejemplos_error"]: print(f"           error: {e}")
+    finally:
+        limpiar()
+
+    if args.json:
+        with open(args.json, "w") as f: json.dump({"fecha": str(datetime.date.today()), "pool_max": POOL_MAX, "niveles": niveles}, f, indent=2)
+    malos = [r for r in niveles if args.max_p95 and r["p95"] > args.max_p95]
+    for r in malos: print(f"FALLA: {r['sesiones']} sesiones, p95 {r['p95']:.2f} s > {args.max_p95} s")
+    if malos: sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import os
+import time
+import atexit
+import pickle
+import hashlib
+import logging
+import threading
+from collections import Counter
+import numpy as np
+import pandas as pd
+from db import db_connection
+from cambios import leer_cambios, version_actual
+from consultas import normalizar_busqueda
+
+logger = logging.getLogger(__name__)
+
+# --- CATEGORIZADOR DE GRUPOS ---
+# Sugiere el GRUPO de un movimiento a partir de su concepto y contrato: n-gramas de caracteres con
+# hashing (sin vocabulario que crezca) y un clasificador lineal (SGD) que aprende con partial_fit.
+# El modelo se guarda en disco junto con la version del log de cambios que ya vio: al arrancar se
+# lee el archivo y solo se aprenden las altas y ediciones posteriores (una correccion de grupo en el
+# editor tambien cuenta). Se reentrena de cero si el log se podo, la base es otra o aparece un grupo
+# nuevo (SGD no admite clases nuevas). sklearn se importa recien al usar el modelo.
+# Lo aprendido al grabar queda en memoria: el archivo se reescribe a lo sumo cada GUARDAR_CADA
+# segundos y al terminar el proceso. En la app el primer modelo se carga (o entrena) en un hilo aparte.
+MODELO_DIR = os.environ.get("MODELO_DIR", os.path.join(os.path.expanduser("~"), ".contabilidad_v5", "modelos"))
+N_FEATURES = 2**17
+NGRAMAS = (2, 4)
+EPOCAS = 5
+CONFIANZA_MIN = 0.5  # por debajo, el importador usa el grupo por defecto
+GUARDAR_CADA = 600
+_estado = {"ruta": None, "modelo": None, "pendiente": False, "guardado": 0.0, "cargando": None, "hilo": None}
+_lock = threading.Lock()
+_lock_hilo = threading.Lock()
+
+
+def _ruta():
+    base = os.environ.get("DATABASE_URL", "") + os.environ.get("DB_BACKEND", "")
+    return os.path.join(MODELO_DIR, f"categorizador-{hashlib.sha1(base.encode()).hexdigest()[:10]}.pkl")
+
+
+def _texto(concepto, contrato=""):
+    return f"{normalizar_busqueda(concepto)} {normalizar_busqueda(contrato)}".strip()
+
+
+def _vectorizador():
+    from sklearn.feature_extraction.text import HashingVectorizer
+    return HashingVectorizer(n_features=N_FEATURES, analyzer="char_wb", ngram_range=NGRAMAS, alternate_sign=False)
+
+
+def _matriz(vec, conceptos, contratos=None):
+    """Filas hasheadas; normaliza y hashea una vez por (concepto, contrato) distinto."""
+    conceptos = pd.Series(conceptos, dtype=object).fillna("").astype(str).reset_index(drop=True)
+    contratos = "" if contratos is None else pd.Series(contratos, dtype=object).fillna("").astype(str).reset_index(drop=True)
+    cod, unicos = pd.factorize(conceptos + "\x00" + contratos)
+    return vec.transform([_texto(*u.split("\x00", 1)) for u in unicos])[cod]
+
+
+def _filas(c, ids=None):
+    sql = "SELECT tipo_gasto, contrato, grupo FROM movimientos WHERE grupo <> '' AND tipo_gasto <> ''"
+    if ids is None: c.execute(sql)
+    else: c.execute(sql + " AND id = ANY(%s)", (ids,))
+    return pd.DataFrame(c.fetchall(), columns=["tipo_gasto", "contrato", "grupo"], dtype=object)
+
+
+def _codigos(m, grupos):
+    return pd.Categorical(grupos, categories=m["clases"]).codes
+
+
+def _pesos(m):
+    """Coeficientes contiguos por clase (en binario sklearn guarda una sola fila: se arma la opuesta)."""
+    clf = m["clf"]
+    w, b = clf.coef_, clf.intercept_
+    if len(clf.classes_) == 2: w, b = np.vstack([-w, w]), np.concatenate([-b, b])
+    m["pesos"] = (m["clases"], np.ascontiguousarray(w), b)
+    return m
+
+
+def entrenar():
+    """Modelo nuevo con todos los movimientos; None si no hay al menos dos grupos con datos."""
+    from sklearn.linear_model import SGDClassifier
+    with db_connection() as conn:
+        c = conn.cursor(); version = version_actual(c)
+        c.execute("SELECT nombre FROM grupos"); grupos = {r[0] for r in c.fetchall()}
+        df = _filas(c)
+    clases = np.array(sorted(grupos | set(df["grupo"])), dtype=object)
+    if len(clases) < 2 or df.empty: return None
+    # Se entrena con el indice del grupo: sklearn ordena las etiquetas en cada partial_fit y con texto es lento
+    m = {"clases": clases, "version": version, "vec": _vectorizador()}
+    X, y = _matriz(m["vec"], df["tipo_gasto"], df["contrato"]), _codigos(m, df["grupo"])
+    m["clf"] = SGDClassifier(loss="modified_huber", alpha=1e-4, random_state=0)
+    rng = np.random.default_rng(0)
+    for _ in range(EPOCAS):
+        orden = rng.permutation(len(y)); m["clf"].partial_fit(X[orden], y[orden], classes=np.arange(len(clases)))
+    return _pesos({**m, "analizador": m["vec"].build_analyzer()})
+
+
+def _guardar(m):
+    ruta = _ruta(); os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f: pickle.dump({"clf": m["clf"], "clases": m["clases"], "version": m["version"]}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, ruta)  # otro proceso lee el archivo anterior o el nuevo, nunca uno a medias
+    _estado.update(pendiente=False, guardado=time.monotonic())
+
+
+def _guardar_si_toca(forzar=False):
+    """Escribe el modelo si aprendio algo y paso GUARDAR_CADA desde la ultima vez (o si `forzar`)."""
+    m = _estado["modelo"]
+    if m is not None and _estado["pendiente"] and (forzar or time.monotonic() - _estado["guardado"] >= GUARDAR_CADA): _guardar(m)
+
+
+@atexit.register
+def _al_salir():
+    if _lock.acquire(timeout=10):  # no espera sin limite a un entrenamiento en curso
+        try: _guardar_si_toca(forzar=True)
+        except Exception as e: logger.error(f"Categorizador: no se pudo guardar: {e}")
+        finally: _lock.release()
+
+
+def _leer():
+    try:
+        with open(_ruta(), "rb") as f: m = pickle.load(f)
+    except FileNotFoundError: return None
+    except Exception as e:
+        logger.error(f"Modelo de categorias ilegible, se reentrena: {e}"); return None
+    vec = _vectorizador()
+    return _pesos({**m, "vec": vec, "analizador": vec.build_analyzer()})
+
+
+def _poner_al_dia(m):
+    """Aprende lo cambiado desde m['version']; devuelve el modelo (otro si hubo que reentrenar)."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        cambios = leer_cambios(c, m["version"])
+        if cambios is None or cambios[0] < m["version"]: m = None
+        else:
+            ultima, ids, _ = cambios
+            if ultima == m["version"]: return m
+            df = _filas(c, ids)
+    if m is None or set(df["grupo"]) - set(m["clases"]): m = entrenar()
+    else:
+        if len(df): m["clf"].partial_fit(_matriz(m["vec"], df["tipo_gasto"], df["contrato"]), _codigos(m, df["grupo"]))
+        m = _pesos({**m, "version": ultima})
+    return m
+
+
+def _cargar(ruta):
+    """El de disco al dia con el log, o uno entrenado de cero (se escribe si cambio). Con _lock tomado."""
+    try:
+        leido = _leer()
+        m = _poner_al_dia(leido) if leido else entrenar()
+        if m is not None and (leido is None or m["version"] != leido["version"]): _guardar(m)
+    except ImportError: m = None
+    except Exception as e:
+        logger.error(f"Categorizador no disponible: {e}"); m = None
+    _estado.update(ruta=ruta, modelo=m, pendiente=False, guardado=time.monotonic())
+
+
+def _modelo(esperar=True):
+    """Modelo del proceso; None sin sklearn o sin datos. Con esperar=False no bloquea: si todavia no
+    esta cargado lo carga un hilo aparte y devuelve None."""
+    ruta = _ruta()
+    if _estado["ruta"] == ruta: return _estado["modelo"]
+    if not esperar:
+        with _lock_hilo:
+            if _estado["cargando"] != ruta:
+                hilo = threading.Thread(target=_modelo, daemon=True, name="categorizador")
+                _estado.update(cargando=ruta, hilo=hilo); hilo.start()
+        return None
+    with _lock:
+        if _estado["ruta"] != ruta: _cargar(ruta)
+    return _estado["modelo"]
+
+
+def precargar(esperar=False):
+    """Carga el modelo si todavia no esta; con esperar=False lo hace un hilo aparte y no bloquea."""
+    _modelo(esperar)
+
+
+def aprender(esperar=True):
+    """Incorpora al modelo lo cargado o editado desde la ultima vez (llamar despues de grabar).
+    Con esperar=False lo hace un hilo aparte: el alta no espera al modelo."""
+    if not esperar:
+        threading.Thread(target=aprender, daemon=True, name="categorizador").start(); return
+    with _lock:
+        if _estado["ruta"] != _ruta(): return  # este proceso no lo uso: se pone al dia al cargarlo
+        try:
+            m = _estado["modelo"]
+            nuevo = _poner_al_dia(m) if m else entrenar()
+            if nuevo is not None and nuevo is not m: _estado.update(modelo=nuevo, pendiente=True)
+            _guardar_si_toca()
+        except ImportError: pass
+        except Exception as e: logger.error(f"Categorizador: no se pudo actualizar: {e}")
+
+
+def _probas(s):
+    """Probabilidades de modified_huber, como predict_proba de sklearn."""
+    p = (np.clip(s, -1, 1) + 1) / 2
+    total = p.sum(axis=-1, keepdims=True)
+    return np.divide(p, total, out=np.full_like(p, 1 / p.shape[-1]), where=total > 0)
+
+
+def sugerir(concepto, contrato="", esperar=True):
+    """(grupo, confianza) para un movimiento; (None, 0.0) si no hay modelo o texto (o, con esperar=False,
+    mientras se carga). Hashea los n-gramas como HashingVectorizer pero sin su validacion: un texto tarda microsegundos."""
+    m, texto = _modelo(esperar), _texto(concepto, contrato)
+    if m is None or not texto: return None, 0.0
+    from sklearn.utils import murmurhash3_32
+    clases, w, b = m["pesos"]
+    cuenta = Counter(abs(murmurhash3_32(g, seed=0)) % N_FEATURES for g in m["analizador"](texto))
+    idx = np.fromiter(cuenta.keys(), dtype=np.int64, count=len(cuenta))
+    val = np.fromiter(cuenta.values(), dtype=float, count=len(cuenta))
+    p = _probas(w[:, idx] @ (val / np.linalg.norm(val)) + b)
+    k = int(p.argmax())
+    return clases[k], float(p[k])
+
+
+def categorizar_lote(conceptos, contratos=None):
+    """Grupo y confianza para muchas filas (importaciones): un solo transform por concepto distinto."""
+    m, n = _modelo(), len(conceptos)
+    if m is None or not n: return np.full(n, None, dtype=object), np.zeros(n)
+    clases, w, b = m["pesos"]
+    p = _probas(np.asarray(_matriz(m["vec"], conceptos, contratos) @ w.T) + b)
+    k = p.argmax(axis=1)
+    return clases[k], p[np.arange(n), k]
@@ -0,0 +1,63 @@
+import datetime
+import pandas as pd
+from config import LISTA_MESES_LARGA
+from db import db_connection, ultimo_cerrado
+from logic import actualizar_saldos
+from utils import tasas_asof
+
+# --- CIERRE DE MES ---
+# Cerrar un mes lo vuelve definitivo: el trigger de cierres_mes (db.py) rechaza escribir en sus filas y
+# quedan guardados sus totales en ARS, el neto en USD convertido y el saldo que pasa al mes siguiente
+# como "Ahorro Mes Anterior". Los cierres van en orden: cerrar un mes cierra los abiertos anteriores y
+# reabrir uno reabre los posteriores, asi los cerrados son siempre los primeros del calendario.
+# Saldos, automatizaciones, cuotas y los agregados del dashboard arrancan del ultimo cierre: el trabajo
+# depende de los meses abiertos, no del largo del historial.
+SQL_CIERRE = "INSERT INTO cierres_mes (mes, fecha, ganancias, gastos, saldo, neto_usd, filas) VALUES (%s,%s,%s,%s,%s,%s,%s) ON CONFLICT DO NOTHING"
+
+
+def totales_cierre(res, dolar_val, cot=None):
+    """Por mes (filas de resumen_mensual): ganancias y gastos en ARS, saldo ARS (lo que arrastra
+    actualizar_saldos), neto en USD a la cotizacion de cada fecha de pago y cantidad de filas."""
+    ars, usd = res["moneda"] == "ARS", res["moneda"] == "USD"
+    signo = res["tipo"].map({"GANANCIA": 1.0, "GASTO": -1.0}).fillna(0.0)
+    monto = res["monto"].astype(float)
+    t = pd.DataFrame({"ganancias": monto.where(ars & (res["tipo"] == "GANANCIA"), 0.0),
+                      "gastos": monto.where(ars & (res["tipo"] == "GASTO"), 0.0),
+                      "neto_usd": (monto * tasas_asof(res["fecha_pago"], cot, dolar_val) * signo).where(usd, 0.0),
+                      "filas": res["n"].astype(int)}).groupby(res["mes"]).sum()
+    return t.assign(saldo=t["ganancias"] - t["gastos"])
+
+
+def cerrar_mes(hasta, dolar_val, cot=None):
+    """Cierra `hasta` y los meses abiertos anteriores; primero pone al dia su Ahorro Mes Anterior.
+    Devuelve los meses cerrados."""
+    with db_connection() as conn: desde = ultimo_cerrado(conn.cursor()) + 1
+    fin = LISTA_MESES_LARGA.index(hasta)
+    if fin < desde: return []
+    # actualizar_saldos cubre 24 meses por llamada
+    for i in range(max(desde - 1, 0), fin, 24): actualizar_saldos(LISTA_MESES_LARGA[i])
+    meses, hoy = LISTA_MESES_LARGA[desde:fin + 1], str(datetime.date.today())
+    with db_connection() as conn:
+        res = pd.read_sql("SELECT mes, tipo, moneda, fecha_pago, monto, n FROM resumen_mensual WHERE mes = ANY(%s)", conn, params=(meses,))
+        t = totales_cierre(res, dolar_val, cot).reindex(meses, fill_value=0)
+        c = conn.cursor()
+        c.executemany(SQL_CIERRE, [(m, hoy, float(r.ganancias), float(r.gastos), float(r.saldo), float(r.neto_usd), int(r.filas)) for m, r in t.iterrows()])
+        conn.commit()
+    return meses
+
+
+def reabrir_mes(mes):
+    """Reabre `mes` y los cerrados posteriores. Devuelve los meses reabiertos."""
+    posteriores = LISTA_MESES_LARGA[LISTA_MESES_LARGA.index(mes):]
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM cierres_mes WHERE mes = ANY(%s) RETURNING mes", (posteriores,)); meses = [r[0] for r in c.fetchall()]
+        conn.commit()
+    return sorted(meses, key=LISTA_MESES_LARGA.index)
+
+
+def leer_cierres():
+    """cierres_mes en orden de calendario."""
+    with db_connection() as conn: df = pd.read_sql("SELECT * FROM cierres_mes", conn)
+    orden = df["mes"].map({m: i for i, m in enumerate(LISTA_MESES_LARGA)})
+    return df[orden.notna()].iloc[orden.dropna().argsort()].reset_index(drop=True)
@@ -0,0 +1,187 @@
+"""Operaciones de mantenimiento sin Streamlit (para cron o corridas masivas).
+
+Usa los mismos modulos db/logic que la app, sin cargar Streamlit. Ejemplos:
+    python cli.py saldos --desde "Enero 2026"
+    python cli.py recurrentes --anio 2026
+    python cli.py automatizaciones
+    python cli.py dolar
+    python cli.py backup -o backup.sql
+    python cli.py exportar -o contabilidad.xlsx
+    python cli.py cotizaciones historial.csv
+    python cli.py resumen [--reconstruir]
+    python cli.py duplicados [--umbral 0.9] [--fusionar | --eliminar]
+    python cli.py anomalias [--mes "Marzo 2026" | --anio 2026]
+    python cli.py cuotas [--vincular]
+    python cli.py cierre [--hasta "Agosto 2026" | --reabrir "Agosto 2026"]
+"""
+import sys
+import time
+import logging
+import argparse
+import datetime
+from config import LISTA_MESES_LARGA, obtener_indice_mes_actual
+from db import init_db
+
+
+def _meses(args):
+    if args.mes: meses = args.mes
+    elif args.anio: meses = [m for m in LISTA_MESES_LARGA if m.endswith(f" {args.anio}")]
+    else: meses = [LISTA_MESES_LARGA[obtener_indice_mes_actual()]]
+    desconocidos = [m for m in meses if m not in LISTA_MESES_LARGA]
+    if desconocidos: sys.exit(f"Meses desconocidos: {', '.join(desconocidos)}")
+    return meses
+
+
+def saldos(args):
+    from logic import actualizar_saldos
+    if args.desde not in LISTA_MESES_LARGA: sys.exit(f"Mes desconocido: {args.desde}")
+    actualizar_saldos(args.desde)
+    return f"Saldos recalculados desde {args.desde}"
+
+
+def recurrentes(args):
+    from logic import generar_recurrentes
+    meses = _meses(args)
+    n = generar_recurrentes(meses)
+    return "No hay recurrentes activos" if n is None else f"{n} movimientos recurrentes generados en {len(meses)} meses"
+
+
+def automatizaciones(args):
+    from logic import automatizaciones
+    automatizaciones()
+    return "Automatizaciones aplicadas"
+
+
+def dolar(args):
+    from logic import get_dolar
+    valor, info = get_dolar.__wrapped__()  # siempre consulta (y registra la cotizacion del dia)
+    return f"Dolar blue: {valor:.2f} {info}"
+
+
+def backup(args):
+    from db import generar_backup_sql
+    script = generar_backup_sql()
+    if not script: sys.exit("No se pudo generar el backup")
+    with open(args.salida, "w", encoding="utf-8") as f: f.write(script)
+    return f"Backup escrito en {args.salida}"
+
+
+def exportar(args):
+    from logic import generar_excel
+    with open(args.salida, "wb") as f: f.write(generar_excel())
+    return f"Excel escrito en {args.salida}"
+
+
+def cotizaciones(args):
+    from cotizaciones import leer_csv_cotizaciones, importar_cotizaciones
+    with open(args.archivo, "rb") as f: df = leer_csv_cotizaciones(f)
+    if df.empty: sys.exit("No se encontraron filas con fecha y valor")
+    return f"{importar_cotizaciones(df)} dias cargados ({df['fecha'].iloc[0]} a {df['fecha'].iloc[-1]})"
+
+
+def resumen(args):
+    from resumen import reconstruir, diferencias_resumen
+    if args.reconstruir: reconstruir()
+    dif = diferencias_resumen()
+    if dif.empty: return "resumen_mensual coincide con movimientos"
+    print(dif.to_string(index=False)); sys.exit(1)
+
+
+def duplicados(args):
+    import pandas as pd
+    from db import db_connection
+    from logic import actualizar_saldos
+    from duplicados import detectar, eliminar_duplicados, fusionar_duplicados
+    with db_connection() as conn:
+        # Los meses cerrados no se tocan
+        df = pd.read_sql("SELECT id, mes, tipo, grupo, tipo_gasto, contrato, cuota, monto, moneda, fecha_pago FROM movimientos WHERE mes NOT IN (SELECT mes FROM cierres_mes)", conn)
+    pares = detectar(df, args.umbral)
+    if not (args.fusionar or args.eliminar):
+        if not pares.empty: print(pares.head(50).to_string(index=False))
+        return f"{len(pares)} pares de posibles duplicados"
+    n, meses = (fusionar_duplicados if args.fusionar else eliminar_duplicados)(list(zip(pares["id_a"], pares["id_b"])))
+    validos = [m for m in meses if m in LISTA_MESES_LARGA]
+    if validos: actualizar_saldos(min(validos, key=LISTA_MESES_LARGA.index))
+    return f"{n} movimientos duplicados quitados de {len(pares)} pares"
+
+
+def anomalias(args):
+    import pandas as pd
+    from logic import get_dolar
+    from cotizaciones import leer_cotizaciones
+    from anomalias import actualizar_anomalias, del_mes
+    meses = _meses(args)
+    res, n = actualizar_anomalias(get_dolar()[0], leer_cotizaciones())
+    filas = pd.concat([del_mes(res, m) for m in meses], ignore_index=True)
+    if not filas.empty: print(filas[["mes", "nivel", "clave", "monto", "mediana", "z"]].to_string(index=False, float_format="{:,.2f}".format))
+    return f"{len(filas)} gastos inusuales en {len(meses)} meses ({n} series recalculadas)"
+
+
+def cuotas(args):
+    from db import db_connection
+    from logic import actualizar_saldos
+    from cuotas import materializar, vincular_cuotas
+    vinculadas = "%d planes con %d cuotas vinculados, " % vincular_cuotas() if args.vincular else ""
+    with db_connection() as conn:
+        c = conn.cursor(); n, meses = materializar(c); conn.commit()
+    if meses: actualizar_saldos(meses[0])
+    return f"{vinculadas}{n} cuotas generadas hasta el horizonte"
+
+
+def cierre(args):
+    from logic import get_dolar
+    from cotizaciones import leer_cotizaciones
+    from cierres import cerrar_mes, reabrir_mes, leer_cierres
+    mes = args.hasta or args.reabrir
+    if mes and mes not in LISTA_MESES_LARGA: sys.exit(f"Mes desconocido: {mes}")
+    if args.hasta: return f"{len(cerrar_mes(args.hasta, get_dolar()[0], leer_cotizaciones()))} meses cerrados hasta {args.hasta}"
+    if args.reabrir: return f"{len(reabrir_mes(args.reabrir))} meses reabiertos desde {args.reabrir}"
+    cierres = leer_cierres()
+    if not cierres.empty: print(cierres[["mes", "fecha", "ganancias", "gastos", "neto_usd", "saldo"]].to_string(index=False, float_format="{:,.2f}".format))
+    return f"{len(cierres)} meses cerrados"
+
+
+def parser():
+    hoy = datetime.date.today().strftime("%Y%m%d")
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("saldos", help="recalcular 'Ahorro Mes Anterior' de 24 meses")
+    p.add_argument("--desde", default=LISTA_MESES_LARGA[obtener_indice_mes_actual()]); p.set_defaults(fn=saldos)
+    p = sub.add_parser("recurrentes", help="generar los recurrentes activos que falten")
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--mes", nargs="+"); g.add_argument("--anio", type=int); p.set_defaults(fn=recurrentes)
+    sub.add_parser("automatizaciones", help="salario chicos y terreno").set_defaults(fn=automatizaciones)
+    sub.add_parser("dolar", help="consultar y registrar la cotizacion del dia").set_defaults(fn=dolar)
+    p = sub.add_parser("backup", help="script SQL con todas las tablas")
+    p.add_argument("-o", "--salida", default=f"backup_{hoy}.sql"); p.set_defaults(fn=backup)
+    p = sub.add_parser("exportar", help="Excel con una hoja por mes")
+    p.add_argument("-o", "--salida", default=f"contabilidad_{hoy}.xlsx"); p.set_defaults(fn=exportar)
+    p = sub.add_parser("cotizaciones", help="importar un CSV de cotizaciones historicas")
+    p.add_argument("archivo"); p.set_defaults(fn=cotizaciones)
+    p = sub.add_parser("resumen", help="verificar (o reconstruir) resumen_mensual")
+    p.add_argument("--reconstruir", action="store_true"); p.set_defaults(fn=resumen)
+    p = sub.add_parser("duplicados", help="buscar (y fusionar o eliminar) movimientos duplicados")
+    p.add_argument("--umbral", type=float, default=0.85)
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--fusionar", action="store_true"); g.add_argument("--eliminar", action="store_true"); p.set_defaults(fn=duplicados)
+    p = sub.add_parser("anomalias", help="recalcular los gastos inusuales y listar los del mes")
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--mes", nargs="+"); g.add_argument("--anio", type=int); p.set_defaults(fn=anomalias)
+    p = sub.add_parser("cuotas", help="generar las cuotas de los planes que entran en el horizonte")
+    p.add_argument("--vincular", action="store_true"); p.set_defaults(fn=cuotas)
+    p = sub.add_parser("cierre", help="cerrar meses (o reabrirlos) y listar los cerrados")
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--hasta"); g.add_argument("--reabrir"); p.set_defaults(fn=cierre)
+    return ap
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    t = time.perf_counter()
+    init_db()
+    print(f"{args.fn(args)} ({time.perf_counter() - t:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,13 @@ def obtener_indice_mes_actual():
 
 INDICE_MES_ACTUAL = obtener_indice_mes_actual()
 OPCIONES_PAGO = ["Bancario", "Efectivo", "Transferencia", "Tarjeta de Debito", "Tarjeta de Credito"]
+GRUPO_AUTO = "🤖 Automático"  # opcion del alta: el grupo lo sugiere el categorizador
 SMVM_BASE_2026 = {"Enero 2026": 341000.0, "Febrero 2026": 346800.0, "Marzo 2026": 352400.0, "Abril 2026": 357800.0, "Mayo 2026": 363000.0, "Junio 2026": 367800.0, "Julio 2026": 372400.0, "Agosto 2026": 376600.0}
 
 LOTTIE_FINANCE = "https://lottie.host/02a55953-2736-4763-b183-116515b81045/L1O1fW89yB.json"
+
+# --- LISTADO DEL DASHBOARD ---
+FILAS_POR_PAGINA = 50
+
+# --- IMPORTACION DE EXTRACTOS ---
+CHUNK_IMPORTACION = 5000
@@ -0,0 +1,85 @@
+import re
+import pandas as pd
+from config import FILAS_POR_PAGINA
+from db import db_connection, busqueda_trigramas, usa_sqlite, ACENTOS, SIN_ACENTOS
+from cotizaciones import sql_tasa
+
+# --- LISTADO PAGINADO DE MOVIMIENTOS ---
+# Los filtros del dashboard se traducen a un WHERE parametrizado y cada grupo se pagina
+# por keyset sobre (pagado, fecha_pago, id), el mismo orden que usa la tabla.
+ORDEN_LISTADO = "COALESCE(pagado, FALSE), COALESCE(fecha_pago, ''), id"
+COLUMNAS_LISTADO = "id, tipo, grupo, tipo_gasto, contrato, cuota, monto, moneda, forma_pago, fecha_pago, COALESCE(pagado, FALSE) AS pagado, CASE WHEN pagado THEN '✅' ELSE '⏳' END AS estado, plan_id"
+
+
+def _escapar_like(t):
+    return t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def construir_filtro_movimientos(mes, grupo=None, busqueda="", moneda="Todas", forma_pago="Todas", estado="Todos"):
+    where, params = ["mes = %s"], [mes]
+    if grupo: where.append("grupo = %s"); params.append(grupo)
+    if busqueda: where.append("tipo_gasto ILIKE %s"); params.append(f"%{_escapar_like(busqueda)}%")
+    if moneda != "Todas": where.append("moneda = %s"); params.append(moneda)
+    if forma_pago != "Todas": where.append("forma_pago = %s"); params.append(forma_pago)
+    if estado == "Pagado": where.append("pagado = TRUE")
+    elif estado == "Pendiente": where.append("pagado IS NOT TRUE")
+    return " AND ".join(where), params
+
+
+def totales_por_grupo(where, params, dolar_val):
+    """Cantidad de filas y total en ARS (USD a la cotizacion de su fecha de pago) por tipo y grupo para el filtro dado."""
+    with db_connection() as conn:
+        return pd.read_sql(f"SELECT tipo, grupo, count(*) AS filas, SUM(CASE WHEN moneda='USD' THEN monto * {sql_tasa('m.fecha_pago')} ELSE monto END) AS total_ars FROM movimientos m WHERE {where} GROUP BY tipo, grupo ORDER BY tipo, grupo",
+                           conn, params=[dolar_val] + params)
+
+
+def primeras_paginas(where, params, limite=FILAS_POR_PAGINA):
+    """Primera pagina de cada (tipo, grupo) en una sola consulta; trae limite+1 filas para saber si hay mas."""
+    with db_connection() as conn:
+        return pd.read_sql(f"SELECT * FROM (SELECT {COLUMNAS_LISTADO}, ROW_NUMBER() OVER (PARTITION BY tipo, grupo ORDER BY {ORDEN_LISTADO}) AS rn FROM movimientos WHERE {where}) t WHERE rn <= %s ORDER BY tipo, grupo, rn",
+                           conn, params=params + [limite + 1]).astype({"pagado": bool})
+
+
+def pagina_movimientos(where, params, tipo, grupo, despues=None, limite=FILAS_POR_PAGINA):
+    """Pagina de un grupo a partir del cursor `despues` = (pagado, fecha_pago, id) de la ultima fila vista."""
+    sql = f"SELECT {COLUMNAS_LISTADO} FROM movimientos WHERE {where} AND tipo = %s AND grupo = %s"
+    params = params + [tipo, grupo]
+    if despues:
+        sql += f" AND ({ORDEN_LISTADO}) > (%s, %s, %s)"; params += list(despues)
+    with db_connection() as conn:
+        return pd.read_sql(sql + f" ORDER BY {ORDEN_LISTADO} LIMIT %s", conn, params=params + [limite + 1]).astype({"pagado": bool})
+
+
+def cursor_de(fila):
+    return (bool(fila['pagado']), fila['fecha_pago'] or '', int(fila['id']))
+
+
+# --- BUSCADOR DE TODO EL HISTORIAL ---
+def normalizar_busqueda(t):
+    return re.sub(r"[^a-z0-9]+", " ", (t or "").translate(str.maketrans(ACENTOS, SIN_ACENTOS)).lower()).strip()
+
+
+def buscar_movimientos(texto, limite=500, dolar_val=None):
+    """Totales por (concepto, contrato, mes) de los movimientos que coinciden con `texto`, con su score.
+    total_usd_ars convierte cada movimiento en USD a la cotizacion de su fecha de pago."""
+    q = normalizar_busqueda(texto)
+    if not q: return pd.DataFrame()
+    with db_connection() as conn:
+        if usa_sqlite():
+            # Sin indice de texto: cada palabra como subcadena; pesa mas la coincidencia que cubre mas texto
+            where = " AND ".join(["texto_busqueda(tipo_gasto, contrato) LIKE %s"] * len(q.split()))
+            score, p_score, p_where = "CAST(length(%s) AS REAL) / max(length(texto_busqueda(tipo_gasto, contrato)), 1)", [q], [f"%{_escapar_like(w)}%" for w in q.split()]
+        elif busqueda_trigramas(conn.cursor()):
+            # Subcadena o parecido (typos) contra el indice de trigramas
+            where = "texto_busqueda(tipo_gasto, contrato) LIKE %s OR texto_busqueda(tipo_gasto, contrato) %% %s"
+            score, p_score, p_where = "word_similarity(%s, texto_busqueda(tipo_gasto, contrato))", [q], [f"%{_escapar_like(q)}%", q]
+        else:
+            # Prefijo de cada palabra contra el indice tsvector
+            where = "to_tsvector('simple', texto_busqueda(tipo_gasto, contrato)) @@ to_tsquery('simple', %s)"
+            tsq = " & ".join(f"{w}:*" for w in q.split())
+            score, p_score, p_where = "ts_rank(to_tsvector('simple', texto_busqueda(tipo_gasto, contrato)), to_tsquery('simple', %s))", [tsq], [tsq]
+        return pd.read_sql(f"""SELECT tipo_gasto, COALESCE(contrato, '') AS contrato, mes, count(*) AS movimientos, MAX({score}) AS score,
+                                      SUM(CASE WHEN moneda='USD' THEN 0 ELSE monto END) AS total_ars, SUM(CASE WHEN moneda='USD' THEN monto ELSE 0 END) AS total_usd,
+                                      SUM(CASE WHEN moneda='USD' THEN monto * {sql_tasa('m.fecha_pago')} ELSE 0 END) AS total_usd_ars
+                               FROM movimientos_historico m WHERE {where} GROUP BY tipo_gasto, COALESCE(contrato, ''), mes ORDER BY score DESC LIMIT %s""",
+                           conn, params=p_score + [dolar_val] + p_where + [limite])
@@ -0,0 +1,75 @@
+import csv
+import datetime
+import time
+import logging
+import threading
+import pandas as pd
+from db import db_connection
+from utils import procesar_montos_serie
+
+logger = logging.getLogger(__name__)
+
+# --- COTIZACIONES HISTORICAS (USD -> ARS) ---
+# Una fila por dia (fecha ISO). get_dolar registra la del dia y el historial se carga una vez desde CSV.
+# La conversion es as-of sobre fecha_pago: utils.tasas_asof en pandas y SQL_TASA en las consultas.
+UPSERT = "INSERT INTO cotizaciones (fecha, valor, fuente) VALUES (%s, %s, %s) ON CONFLICT (fecha) DO UPDATE SET valor = EXCLUDED.valor, fuente = EXCLUDED.fuente"
+COLUMNAS_FECHA = ["fecha", "date", "dia", "día"]
+COLUMNAS_VALOR = ["valor", "cierre", "promedio", "close", "precio"]
+TTL_LECTURA = 600
+_memoria = {"df": None, "hora": 0.0}  # ultima lectura por proceso (sin st.cache_data: tambien la usa cli.py)
+_lock_memoria = threading.Lock()
+
+
+def sql_tasa(col):
+    """Expresion SQL con la cotizacion vigente en `col` (espera un %s con la cotizacion de hoy como ultimo recurso)."""
+    return (f"COALESCE((SELECT q.valor FROM cotizaciones q WHERE q.fecha <= {col} ORDER BY q.fecha DESC LIMIT 1), "
+            f"(SELECT q.valor FROM cotizaciones q ORDER BY q.fecha LIMIT 1), %s)")
+
+
+def leer_cotizaciones():
+    with _lock_memoria:
+        if _memoria["df"] is not None and time.monotonic() - _memoria["hora"] < TTL_LECTURA: return _memoria["df"]
+    with db_connection() as conn:
+        df = pd.read_sql("SELECT fecha, valor FROM cotizaciones ORDER BY fecha", conn)
+    df = pd.DataFrame({"fecha": pd.to_datetime(df["fecha"], errors="coerce").astype("datetime64[ns]"), "valor": df["valor"].astype(float)}).dropna()
+    with _lock_memoria: _memoria.update(df=df, hora=time.monotonic())
+    return df
+
+
+def olvidar_cotizaciones():
+    with _lock_memoria: _memoria["df"] = None
+
+
+def registrar_cotizacion(valor, fecha=None, fuente="dolarapi"):
+    try:
+        with db_connection() as conn:
+            conn.cursor().execute(UPSERT, (str(fecha or datetime.date.today()), float(valor), fuente)); conn.commit()
+    except Exception as e: logger.error(f"No se pudo registrar la cotizacion: {e}")
+
+
+def leer_csv_cotizaciones(archivo):
+    """CSV con una columna de fecha y otra de valor (o compra/venta, se promedian). Devuelve fecha ISO + valor."""
+    muestra = archivo.read(4096); archivo.seek(0)
+    texto = muestra.decode("utf-8", errors="ignore") if isinstance(muestra, bytes) else muestra
+    try: sep = csv.Sniffer().sniff(texto.split("\n", 1)[0], delimiters=";,\t|").delimiter
+    except csv.Error: sep = ","
+    df = pd.read_csv(archivo, sep=sep, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    cols = {c.lower().strip(): c for c in df.columns}
+    c_fecha = next((cols[c] for c in COLUMNAS_FECHA if c in cols), df.columns[0])
+    c_valor = next((cols[c] for c in COLUMNAS_VALOR if c in cols), None)
+    if c_valor: valor = procesar_montos_serie(df[c_valor])
+    elif "compra" in cols and "venta" in cols: valor = (procesar_montos_serie(df[cols["compra"]]) + procesar_montos_serie(df[cols["venta"]])) / 2
+    else: valor = procesar_montos_serie(df[df.columns[1]])
+    iso = df[c_fecha].str.match(r"^\d{4}-\d{2}-\d{2}")
+    fecha = pd.to_datetime(df[c_fecha].where(iso).str[:10], format="%Y-%m-%d", errors="coerce").fillna(
+        pd.to_datetime(df[c_fecha].where(~iso), dayfirst=True, errors="coerce"))
+    out = pd.DataFrame({"fecha": fecha.dt.strftime("%Y-%m-%d"), "valor": valor})
+    return out[fecha.notna() & (valor > 0)].drop_duplicates("fecha", keep="last").sort_values("fecha")
+
+
+def importar_cotizaciones(df, fuente="csv"):
+    """Carga masiva (upsert por fecha) en una transaccion. Devuelve la cantidad de dias cargados."""
+    with db_connection() as conn:
+        conn.cursor().executemany(UPSERT, [(f, float(v), fuente) for f, v in zip(df["fecha"], df["valor"])]); conn.commit()
+    olvidar_cotizaciones()
+    return len(df)
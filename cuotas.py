@@ -0,0 +1,146 @@
+import os
+import datetime
+import threading
+import pandas as pd
+from config import LISTA_MESES_LARGA, obtener_indice_mes_actual
+from db import db_connection, ultimo_cerrado
+from logic import calcular_monto_salario_mes, actualizar_saldos
+
+# --- PLANES EN CUOTAS ---
+# Una compra en cuotas es una fila de planes_cuotas (monto por cuota, cuota inicial, total) y sus
+# cuotas son movimientos con plan_id. No se generan todas al cargarla: solo las que caen hasta
+# HORIZONTE_CUOTAS meses despues del mes actual; materializar() agrega las siguientes a medida que
+# pasan los meses. `generadas` guarda la ultima cuota creada, asi una cuota borrada a mano no vuelve.
+# Editar o cancelar un plan es una sentencia sobre sus cuotas pendientes: las pagadas no se tocan, y
+# tampoco las de meses cerrados (cierres.py), donde tampoco se generan cuotas atrasadas.
+HORIZONTE_CUOTAS = 12
+EDITABLES = ["tipo", "grupo", "tipo_gasto", "contrato", "monto", "moneda", "forma_pago"]
+SQL_PLAN = "INSERT INTO planes_cuotas (fecha, tipo, grupo, tipo_gasto, contrato, monto, moneda, forma_pago, mes_inicio, fecha_pago, cuota_inicial, total, generadas) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s) RETURNING id"
+SQL_CUOTA = "INSERT INTO movimientos (fecha, mes, tipo, grupo, tipo_gasto, contrato, cuota, monto, moneda, forma_pago, fecha_pago, pagado, plan_id) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"
+PENDIENTES = "plan_id = %s AND pagado IS NOT TRUE AND mes NOT IN (SELECT mes FROM cierres_mes)"
+_memoria = {"clave": None}
+_lock_memoria = threading.Lock()
+
+
+def horizonte():
+    """Indice en LISTA_MESES_LARGA del ultimo mes con cuotas generadas."""
+    return min(obtener_indice_mes_actual() + HORIZONTE_CUOTAS, len(LISTA_MESES_LARGA) - 1)
+
+
+def _cuota(plan, k, pagado=False):
+    """Fila de movimientos de la cuota k: cae k - cuota_inicial meses (y 30 dias por mes) despues de la inicial."""
+    off = k - plan["cuota_inicial"]
+    mes = LISTA_MESES_LARGA[LISTA_MESES_LARGA.index(plan["mes_inicio"]) + off]
+    vc = calcular_monto_salario_mes(mes) if (plan["tipo_gasto"] or "").strip().upper() == "SALARIO CHICOS" else None
+    try: base = datetime.date.fromisoformat(str(plan["fecha_pago"])[:10])
+    except ValueError: base = datetime.date.today()
+    return (str(datetime.date.today()), mes, plan["tipo"], plan["grupo"], plan["tipo_gasto"], plan["contrato"], f"{k}/{plan['total']}", vc or plan["monto"],
+            plan["moneda"], plan["forma_pago"], (base + datetime.timedelta(days=30 * off)).strftime('%Y-%m-%d'), pagado, plan["id"])
+
+
+def materializar(c, hasta=None):
+    """Crea las cuotas de los planes activos que caen hasta el mes `hasta` (indice; por defecto el horizonte).
+    Devuelve (cuotas creadas, meses afectados)."""
+    hasta, cerrado = horizonte() if hasta is None else hasta, ultimo_cerrado(c)
+    c.execute("SELECT * FROM planes_cuotas WHERE activo = TRUE AND generadas < total")
+    cols = [d[0] for d in c.description]
+    filas, avances = [], []
+    for plan in (dict(zip(cols, r)) for r in c.fetchall()):
+        if plan["mes_inicio"] not in LISTA_MESES_LARGA: continue
+        # La cuota k cae en el indice del mes inicial + (k - cuota_inicial)
+        base = plan["cuota_inicial"] - LISTA_MESES_LARGA.index(plan["mes_inicio"])
+        ultima = min(plan["total"], hasta + base)
+        if ultima <= plan["generadas"]: continue
+        filas += [_cuota(plan, k) for k in range(max(plan["generadas"], cerrado + base) + 1, ultima + 1)]
+        avances.append((ultima, plan["id"]))
+    c.executemany(SQL_CUOTA, filas)
+    c.executemany("UPDATE planes_cuotas SET generadas = %s WHERE id = %s", avances)
+    return len(filas), sorted({f[1] for f in filas}, key=LISTA_MESES_LARGA.index)
+
+
+def crear_plan(c, mes, tipo, grupo, concepto, contrato, monto, moneda, forma_pago, fecha_pago, pagado, cuota_inicial, total):
+    """Alta de un plan: la cuota `cuota_inicial` en `mes` (pagada si `pagado`) y las siguientes hasta el
+    horizonte. Usa el cursor del llamador (confirma el). Devuelve el id del plan; None si la cuota pasa el total."""
+    if cuota_inicial > total: return None
+    hoy = str(datetime.date.today())
+    c.execute(SQL_PLAN, (hoy, tipo, grupo, concepto, contrato, monto, moneda, forma_pago, mes, fecha_pago, cuota_inicial, total, cuota_inicial))
+    plan_id = c.fetchone()[0]
+    plan = {"id": plan_id, "tipo": tipo, "grupo": grupo, "tipo_gasto": concepto, "contrato": contrato, "monto": monto, "moneda": moneda,
+            "forma_pago": forma_pago, "mes_inicio": mes, "fecha_pago": fecha_pago, "cuota_inicial": cuota_inicial, "total": total}
+    c.execute(SQL_CUOTA, _cuota(plan, cuota_inicial, pagado))
+    materializar(c, max(horizonte(), LISTA_MESES_LARGA.index(mes)))
+    return plan_id
+
+
+def planes_al_dia():
+    """materializar() una vez por proceso y horizonte: en cada rerun de la app no consulta la base. Devuelve cuantas creo."""
+    clave = (os.environ.get("DATABASE_URL", ""), os.environ.get("DB_BACKEND", ""), horizonte())
+    with _lock_memoria:
+        if _memoria["clave"] == clave: return 0
+        with db_connection() as conn:
+            c = conn.cursor(); n, meses = materializar(c); conn.commit()
+        if meses: actualizar_saldos(meses[0])
+        _memoria["clave"] = clave
+    return n
+
+
+def editar_plan(plan_id, **campos):
+    """Cambia el plan y, en una sola sentencia, todas sus cuotas pendientes (generadas o no).
+    Solo columnas de EDITABLES. Devuelve (cuotas cambiadas, meses afectados)."""
+    campos = {k: v for k, v in campos.items() if k in EDITABLES}
+    if not campos: return 0, []
+    sets = ", ".join(f"{k} = %s" for k in campos)
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"UPDATE planes_cuotas SET {sets} WHERE id = %s", (*campos.values(), plan_id))
+        c.execute(f"SELECT DISTINCT mes FROM movimientos WHERE {PENDIENTES}", (plan_id,)); meses = [r[0] for r in c.fetchall()]
+        c.execute(f"UPDATE movimientos SET {sets} WHERE {PENDIENTES}", (*campos.values(), plan_id)); n = c.rowcount
+        conn.commit()
+    return n, meses
+
+
+def cancelar_plan(plan_id):
+    """Borra las cuotas pendientes y deja de generar las siguientes; las pagadas quedan. Devuelve (borradas, meses)."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"SELECT DISTINCT mes FROM movimientos WHERE {PENDIENTES}", (plan_id,)); meses = [r[0] for r in c.fetchall()]
+        c.execute(f"DELETE FROM movimientos WHERE {PENDIENTES}", (plan_id,)); n = c.rowcount
+        c.execute("UPDATE planes_cuotas SET activo = FALSE WHERE id = %s", (plan_id,))
+        conn.commit()
+    return n, meses
+
+
+def listar_planes():
+    """Planes activos con cuotas pagadas y saldo: pendientes ya generadas mas las que faltan generar al monto del plan."""
+    with db_connection() as conn:
+        return pd.read_sql("""SELECT p.id, p.tipo_gasto, p.grupo, p.contrato, p.monto, p.moneda, p.total,
+                                     p.cuota_inicial - 1 + COALESCE(SUM(CASE WHEN m.pagado THEN 1 ELSE 0 END), 0) AS pagadas,
+                                     COALESCE(SUM(CASE WHEN m.pagado THEN 0 ELSE m.monto END), 0) + (p.total - p.generadas) * p.monto AS saldo
+                              FROM planes_cuotas p LEFT JOIN movimientos_historico m ON m.plan_id = p.id
+                              WHERE p.activo = TRUE GROUP BY p.id ORDER BY p.id""", conn)
+
+
+def vincular_cuotas():
+    """Agrupa en planes las cuotas sueltas (k/n con n > 1, sin plan_id) cargadas antes de que existieran.
+    Las de un mismo plan comparten tipo, grupo, concepto, contrato, moneda, forma de pago y total, y
+    su indice de mes menos k es el mismo. Devuelve (planes creados, cuotas vinculadas)."""
+    with db_connection() as conn:
+        df = pd.read_sql("SELECT id, fecha, mes, tipo, grupo, tipo_gasto, contrato, cuota, monto, moneda, forma_pago, fecha_pago FROM movimientos WHERE plan_id IS NULL AND cuota LIKE %s AND mes NOT IN (SELECT mes FROM cierres_mes)", conn, params=("%/%",))
+        partes = df["cuota"].astype(str).str.extract(r"^\s*(\d+)\s*/\s*(\d+)\s*$").astype(float)
+        df = df.assign(k=partes[0], n=partes[1], i=df["mes"].map({m: i for i, m in enumerate(LISTA_MESES_LARGA)}))
+        df = df[(df["n"] > 1) & (df["k"] >= 1) & (df["k"] <= df["n"]) & df["i"].notna()]
+        if df.empty: return 0, 0
+        claves = ["tipo", "grupo", "tipo_gasto", "contrato", "moneda", "forma_pago", "n", "ancla"]
+        df = df.astype({"k": int, "n": int, "i": int}).assign(ancla=lambda d: d["i"] - d["k"])
+        df[claves[:6]] = df[claves[:6]].astype(object).fillna("")
+        c, planes, vinculos = conn.cursor(), 0, []
+        for _, g in df.sort_values(["k", "id"]).groupby(claves, sort=False):
+            primera, ultima = g.iloc[0], g.iloc[-1]
+            # El plan sigue con el monto de la ultima cuota (la que se edito por ultima vez a mano)
+            c.execute(SQL_PLAN, (primera["fecha"], primera["tipo"], primera["grupo"], primera["tipo_gasto"], primera["contrato"], float(ultima["monto"]), primera["moneda"],
+                                 primera["forma_pago"], primera["mes"], primera["fecha_pago"], int(primera["k"]), int(primera["n"]), int(ultima["k"])))
+            plan_id = c.fetchone()[0]; planes += 1
+            vinculos += [(plan_id, int(i)) for i in g["id"]]
+        c.executemany("UPDATE movimientos SET plan_id = %s WHERE id = %s", vinculos)
+        conn.commit()
+    return planes, len(vinculos)
@@ -1,4 +1,9 @@
 import os
+import re
+import time
+import sqlite3
+import threading
+import collections
 import psycopg2
 import psycopg2.pool
 import datetime
@@ -6,19 +11,33 @@ import logging
 from contextlib import contextmanager
 from dotenv import load_dotenv
 from auth import make_hashes
+from config import LISTA_MESES_LARGA, MESES_NOMBRES
+import db_sqlite
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# --- BACKEND ---
+# Postgres por defecto; SQLite embebido (db_sqlite) con DB_BACKEND=sqlite o DATABASE_URL=sqlite:///ruta.db
+def usa_sqlite():
+    return os.environ.get("DB_BACKEND", "").lower() == "sqlite" or os.environ.get("DATABASE_URL", "").startswith("sqlite")
+
 # --- POOL DE CONEXIONES ---
+# ThreadedConnectionPool no hace esperar: con las POOL_MAX conexiones prestadas getconn() falla y se
+# abre una conexion directa (fuera del tope). Se cuentan pedidos, pool agotado, conexiones en uso y
+# el tiempo para obtener cada una; lo leen carga.py y el panel de administrador.
+POOL_MAX = int(os.environ.get("DB_POOL_MAX", 10))
 _pool = None
+_uso_pool = {"pedidas": 0, "agotado": 0, "en_uso": 0, "pico": 0}
+_esperas = collections.deque(maxlen=10000)
+_lock_uso = threading.Lock()
 
 def _get_pool():
     global _pool
     if _pool is None:
         try:
             _pool = psycopg2.pool.ThreadedConnectionPool(
-                minconn=1, maxconn=5,
+                minconn=1, maxconn=POOL_MAX,
                 dsn=os.environ.get('DATABASE_URL')
             )
         except Exception as e:
@@ -26,20 +45,47 @@ def _get_pool():
             _pool = None
     return _pool
 
+def _contar(t0, agotado=False):
+    with _lock_uso:
+        _uso_pool["pedidas"] += 1; _uso_pool["agotado"] += agotado; _uso_pool["en_uso"] += 1
+        _uso_pool["pico"] = max(_uso_pool["pico"], _uso_pool["en_uso"])
+        _esperas.append(time.perf_counter() - t0)
+
+def estadisticas_pool(reiniciar=False):
+    """Pedidos, veces que el pool estaba agotado, conexiones en uso (y pico) y espera p50/p95/max en ms."""
+    with _lock_uso:
+        esperas = sorted(_esperas)
+        res = {**_uso_pool, "tope": POOL_MAX}
+        if reiniciar: _uso_pool.update(pedidas=0, agotado=0, pico=_uso_pool["en_uso"]); _esperas.clear()
+    for nombre, q in [("espera_p50_ms", 0.5), ("espera_p95_ms", 0.95), ("espera_max_ms", 1.0)]:
+        res[nombre] = round(esperas[min(int(q * len(esperas)), len(esperas) - 1)] * 1000, 2) if esperas else 0.0
+    return res
+
 def get_db_connection():
-    pool = _get_pool()
+    t0 = time.perf_counter()
+    if usa_sqlite():
+        try: conn = db_sqlite.conectar(FUNCIONES_SQLITE)
+        except Exception as e:
+            import streamlit as st
+            logger.critical(f"DB Error: {e}"); st.error("Error BD"); st.stop()
+        _contar(t0); return conn
+    pool, agotado = _get_pool(), False
     if pool:
         try:
-            return pool.getconn()
+            conn = pool.getconn(); _contar(t0); return conn
         except Exception as e:
+            agotado = isinstance(e, psycopg2.pool.PoolError)
             logger.error(f"Pool getconn error: {e}")
     # Fallback directo
-    try: return psycopg2.connect(os.environ.get('DATABASE_URL'))
+    try: conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
     except Exception as e:
         import streamlit as st
         logger.critical(f"DB Error: {e}"); st.error("Error BD"); st.stop()
+    _contar(t0, agotado); return conn
 
 def _put_connection(conn):
+    with _lock_uso: _uso_pool["en_uso"] -= 1
+    if isinstance(conn, sqlite3.Connection): db_sqlite.devolver(conn); return
     pool = _get_pool()
     if pool:
         try: pool.putconn(conn); return
@@ -55,33 +101,389 @@ def db_connection():
     finally:
         _put_connection(conn)
 
+# --- PARTICIONES DE MOVIMIENTOS ---
+# movimientos esta particionada por LIST (mes): una particion por año con sus 12 meses,
+# asi toda consulta con "mes=..." lee solo la particion de ese año (partition pruning).
+# Los años cerrados se pasan a movimientos_archivo para achicar el set de trabajo. Los años de
+# historial fuera de LISTA_MESES_LARGA (anteriores a 2026) tambien tienen su particion: si quedaran
+# en movimientos_default no se podrian archivar.
+COLUMNAS_MOVIMIENTOS = "id INTEGER NOT NULL DEFAULT nextval('movimientos_id_seq'), fecha TEXT, mes TEXT NOT NULL, tipo TEXT, grupo TEXT, tipo_gasto TEXT, cuota TEXT, monto REAL, moneda TEXT, forma_pago TEXT, fecha_pago TEXT, pagado BOOLEAN DEFAULT FALSE, contrato TEXT DEFAULT '', plan_id INTEGER, PRIMARY KEY (id, mes)"
+
+def particiones_movimientos():
+    anios = {}
+    for m in LISTA_MESES_LARGA: anios.setdefault(int(m.split(" ")[1]), []).append(m)
+    return anios
+
+def meses_del_anio(anio):
+    return [f"{m} {anio}" for m in MESES_NOMBRES]
+
+def _sql_mover_particion(anio, origen, destino):
+    meses = ", ".join("'" + m + "'" for m in meses_del_anio(anio))
+    return [f"ALTER TABLE {origen} DETACH PARTITION movimientos_{anio}",
+            f"ALTER TABLE {destino} ATTACH PARTITION movimientos_{anio} FOR VALUES IN ({meses})"]
+
+def _crear_movimientos_particionado(c):
+    c.execute("CREATE SEQUENCE IF NOT EXISTS movimientos_id_seq")
+    c.execute(f"CREATE TABLE movimientos ({COLUMNAS_MOVIMIENTOS}) PARTITION BY LIST (mes)")
+    c.execute("ALTER SEQUENCE movimientos_id_seq OWNED BY movimientos.id")
+
+def _crear_particiones(c):
+    for anio, meses in particiones_movimientos().items():
+        # IF NOT EXISTS: un año archivado sigue existiendo (colgado de movimientos_archivo) y no se recrea
+        c.execute(f"CREATE TABLE IF NOT EXISTS movimientos_{anio} PARTITION OF movimientos FOR VALUES IN ({', '.join(['%s'] * len(meses))})", meses)
+    c.execute("CREATE TABLE IF NOT EXISTS movimientos_default PARTITION OF movimientos DEFAULT")
+
+def _particionar_anios_viejos(c):
+    """Pasa de movimientos_default a una particion propia cada año con filas "<Mes> <año>". Se borran y
+    reinsertan por la tabla padre: los triggers de resumen y de cambios ven las dos operaciones."""
+    c.execute(r"SELECT DISTINCT substring(mes from '\d{4}$')::int FROM movimientos_default WHERE mes ~ ' \d{4}$'")
+    for (anio,) in c.fetchall():
+        meses = meses_del_anio(anio)
+        c.execute("SELECT to_regclass(%s)", (f"movimientos_{anio}",))
+        if c.fetchone()[0] is not None: continue  # ya tiene particion (archivada): lo nuevo queda en default
+        c.execute("CREATE TEMP TABLE movimientos_mover AS SELECT * FROM movimientos WHERE mes = ANY(%s)", (meses,))
+        c.execute("DELETE FROM movimientos WHERE mes = ANY(%s)", (meses,))
+        c.execute(f"CREATE TABLE movimientos_{anio} PARTITION OF movimientos FOR VALUES IN ({', '.join(['%s'] * len(meses))})", meses)
+        c.execute("INSERT INTO movimientos SELECT * FROM movimientos_mover")
+        c.execute("DROP TABLE movimientos_mover")
+        logger.info(f"Particion creada para {anio} (historial anterior a la lista de meses)")
+
+def _migrar_movimientos(c):
+    c.execute("SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid=c.relnamespace WHERE c.relname='movimientos' AND n.nspname=current_schema()")
+    r = c.fetchone()
+    if r is None:
+        _crear_movimientos_particionado(c)
+    elif r[0] == 'r':
+        # Tabla V5 sin particionar: se copia a la estructura nueva dentro de la misma transaccion
+        for col in ["pagado BOOLEAN DEFAULT FALSE", "contrato TEXT DEFAULT ''"]:
+            c.execute(f"ALTER TABLE movimientos ADD COLUMN IF NOT EXISTS {col}")
+        logger.info("Migrando movimientos a tabla particionada por año")
+        c.execute("ALTER TABLE movimientos RENAME TO movimientos_legacy")
+        c.execute("ALTER INDEX IF EXISTS movimientos_pkey RENAME TO movimientos_legacy_pkey")
+        c.execute("ALTER SEQUENCE IF EXISTS movimientos_id_seq OWNED BY NONE")
+        _crear_movimientos_particionado(c)
+        _crear_particiones(c)
+        c.execute("INSERT INTO movimientos (id, fecha, mes, tipo, grupo, tipo_gasto, cuota, monto, moneda, forma_pago, fecha_pago, pagado, contrato) SELECT id, fecha, COALESCE(mes, ''), tipo, grupo, tipo_gasto, cuota, monto, moneda, forma_pago, fecha_pago, pagado, contrato FROM movimientos_legacy")
+        c.execute("DROP TABLE movimientos_legacy")
+        c.execute("SELECT setval('movimientos_id_seq', COALESCE((SELECT MAX(id) FROM movimientos), 0) + 1, false)")
+
+def listar_particiones():
+    """Devuelve [(anio, ubicacion, filas)] con ubicacion 'ACTIVA' o 'ARCHIVO'."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        if usa_sqlite():
+            filas = {}
+            for t in ["movimientos", "movimientos_archivo"]:
+                c.execute(f"SELECT CAST(substr(mes, -4) AS INTEGER), count(*) FROM {t} GROUP BY 1")
+                filas[t] = dict(c.fetchall())
+            anios = sorted(set(particiones_movimientos()) | {a for t in filas.values() for a in t if a})
+            return [(a, "ARCHIVO", filas["movimientos_archivo"][a]) if filas["movimientos_archivo"].get(a) else (a, "ACTIVA", filas["movimientos"].get(a, 0)) for a in anios]
+        c.execute("""SELECT p.relname, i.inhparent::regclass::text FROM pg_inherits i JOIN pg_class p ON p.oid = i.inhrelid
+                     WHERE i.inhparent IN ('movimientos'::regclass, 'movimientos_archivo'::regclass) AND p.relname ~ '^movimientos_[0-9]{4}$'""")
+        res = []
+        for rel, padre in sorted(c.fetchall()):
+            c.execute(f"SELECT count(*) FROM {rel}")
+            res.append((int(rel.split("_")[1]), "ARCHIVO" if padre == "movimientos_archivo" else "ACTIVA", c.fetchone()[0]))
+        return res
+
+def _mover_anio_sqlite(c, anio, origen, destino):
+    # Sin particiones se mueven las filas; los triggers de version registran el cambio. Mover no edita
+    # los meses cerrados: el bloqueo de cierres se levanta solo dentro de esta transaccion
+    meses = tuple(meses_del_anio(anio))
+    c.execute("INSERT INTO cierres_desbloqueo (motivo) VALUES ('archivo')")
+    c.execute(f"INSERT INTO {destino} SELECT * FROM {origen} WHERE mes IN %s", (meses,))
+    c.execute(f"DELETE FROM {origen} WHERE mes IN %s", (meses,))
+    c.execute("DELETE FROM cierres_desbloqueo")
+
+def archivar_anio(anio):
+    """Saca del set de trabajo un año cerrado moviendo su particion a movimientos_archivo."""
+    if anio >= datetime.date.today().year: return False
+    with db_connection() as conn:
+        c = conn.cursor()
+        if usa_sqlite(): _mover_anio_sqlite(c, anio, "movimientos", "movimientos_archivo")
+        else:
+            for q in _sql_mover_particion(anio, "movimientos", "movimientos_archivo"): c.execute(q)
+            _reversionar_meses(c, meses_del_anio(anio), quitar=True)
+        conn.commit()
+    return True
+
+def desarchivar_anio(anio):
+    with db_connection() as conn:
+        c = conn.cursor()
+        if usa_sqlite(): _mover_anio_sqlite(c, anio, "movimientos_archivo", "movimientos")
+        else:
+            for q in _sql_mover_particion(anio, "movimientos_archivo", "movimientos"): c.execute(q)
+            _reversionar_meses(c, meses_del_anio(anio), quitar=False)
+        conn.commit()
+    return True
+
+# --- BUSQUEDA EN TODO EL HISTORIAL ---
+# texto_busqueda() normaliza concepto + contrato (minusculas, sin acentos ni signos) y se indexa con
+# pg_trgm si la extension esta disponible; si no, con un indice tsvector sobre la misma expresion.
+ACENTOS, SIN_ACENTOS = "áéíóúüñÁÉÍÓÚÜÑàèìòùÀÈÌÒÙ", "aeiouunAEIOUUNaeiouAEIOU"
+
+def _crear_busqueda(c):
+    c.execute("SAVEPOINT ext_trgm")
+    try: c.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm"); c.execute("RELEASE SAVEPOINT ext_trgm")
+    except Exception as e:
+        c.execute("ROLLBACK TO SAVEPOINT ext_trgm"); logger.warning(f"pg_trgm no disponible, se usa tsvector: {e}")
+    c.execute(f"CREATE OR REPLACE FUNCTION texto_busqueda(concepto TEXT, contrato TEXT) RETURNS TEXT AS $$ SELECT trim(regexp_replace(lower(translate(COALESCE(concepto, '') || ' ' || COALESCE(contrato, ''), '{ACENTOS}', '{SIN_ACENTOS}')), '[^a-z0-9]+', ' ', 'g')) $$ LANGUAGE SQL IMMUTABLE")
+    for t in ["movimientos", "movimientos_archivo"]:
+        if busqueda_trigramas(c): c.execute(f"CREATE INDEX IF NOT EXISTS idx_{t}_busqueda_trgm ON {t} USING gin (texto_busqueda(tipo_gasto, contrato) gin_trgm_ops)")
+        else: c.execute(f"CREATE INDEX IF NOT EXISTS idx_{t}_busqueda_ts ON {t} USING gin (to_tsvector('simple', texto_busqueda(tipo_gasto, contrato)))")
+    # Vista de todo el historial (años activos + archivados); se recrea para tomar columnas nuevas
+    c.execute("DROP VIEW IF EXISTS movimientos_historico")
+    c.execute("CREATE VIEW movimientos_historico AS SELECT * FROM movimientos UNION ALL SELECT * FROM movimientos_archivo")
+
+def _texto_busqueda(concepto, contrato):
+    """Misma normalizacion que texto_busqueda() en SQL, registrada como funcion en SQLite."""
+    texto = f"{concepto or ''} {contrato or ''}".translate(str.maketrans(ACENTOS, SIN_ACENTOS)).lower()
+    return re.sub(r"[^a-z0-9]+", " ", texto).strip()
+
+FUNCIONES_SQLITE = {"texto_busqueda": (2, _texto_busqueda)}
+
+def busqueda_trigramas(c):
+    if usa_sqlite(): return False
+    c.execute("SELECT 1 FROM pg_extension WHERE extname='pg_trgm'")
+    return c.fetchone() is not None
+
+# --- VERSION POR MES ---
+# Cada cambio en movimientos sube la version de los meses afectados (trigger por sentencia
+# con tablas de transicion, un solo upsert por mes aunque se carguen miles de filas).
+# El snapshot local compara estas versiones para refrescar solo los meses que cambiaron.
+def _crear_versionado(c):
+    c.execute("CREATE SEQUENCE IF NOT EXISTS movimientos_version_seq")
+    c.execute("CREATE TABLE IF NOT EXISTS movimientos_version (mes TEXT PRIMARY KEY, version BIGINT NOT NULL)")
+    c.execute("""CREATE OR REPLACE FUNCTION versionar_movimientos() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN DELETE FROM movimientos_version; RETURN NULL; END IF;
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO movimientos_version SELECT mes, nextval('movimientos_version_seq') FROM (SELECT DISTINCT mes FROM nuevas) n
+                ON CONFLICT (mes) DO UPDATE SET version = EXCLUDED.version;
+            ELSIF TG_OP = 'DELETE' THEN
+                INSERT INTO movimientos_version SELECT mes, nextval('movimientos_version_seq') FROM (SELECT DISTINCT mes FROM viejas) v
+                ON CONFLICT (mes) DO UPDATE SET version = EXCLUDED.version;
+            ELSE
+                -- Solo meses con filas que realmente cambiaron: automatizaciones reescribe los mismos valores en cada rerun
+                INSERT INTO movimientos_version SELECT mes, nextval('movimientos_version_seq') FROM (
+                    SELECT mes FROM (SELECT * FROM nuevas EXCEPT ALL SELECT * FROM viejas) n UNION SELECT mes FROM (SELECT * FROM viejas EXCEPT ALL SELECT * FROM nuevas) v) m
+                ON CONFLICT (mes) DO UPDATE SET version = EXCLUDED.version;
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql""")
+    for op, ref in [("INSERT", "NEW TABLE AS nuevas"), ("UPDATE", "NEW TABLE AS nuevas OLD TABLE AS viejas"), ("DELETE", "OLD TABLE AS viejas")]:
+        c.execute(f"DROP TRIGGER IF EXISTS trg_version_{op.lower()} ON movimientos")
+        c.execute(f"CREATE TRIGGER trg_version_{op.lower()} AFTER {op} ON movimientos REFERENCING {ref} FOR EACH STATEMENT EXECUTE FUNCTION versionar_movimientos()")
+    c.execute("DROP TRIGGER IF EXISTS trg_version_truncate ON movimientos")
+    c.execute("CREATE TRIGGER trg_version_truncate AFTER TRUNCATE ON movimientos FOR EACH STATEMENT EXECUTE FUNCTION versionar_movimientos()")
+    c.execute("INSERT INTO movimientos_version SELECT mes, nextval('movimientos_version_seq') FROM movimientos WHERE NOT EXISTS (SELECT 1 FROM movimientos_version) GROUP BY mes")
+
+def _reversionar_meses(c, meses, quitar):
+    if quitar: c.execute("DELETE FROM movimientos_version WHERE mes = ANY(%s)", (meses,))
+    else: c.execute("INSERT INTO movimientos_version SELECT mes, nextval('movimientos_version_seq') FROM (SELECT DISTINCT mes FROM movimientos WHERE mes = ANY(%s)) m ON CONFLICT (mes) DO UPDATE SET version = EXCLUDED.version", (meses,))
+    # DETACH/ATTACH no dispara triggers: las sesiones recargan esos meses completos
+    c.execute(f"SELECT pg_advisory_xact_lock({LOCK_CAMBIOS})")
+    c.execute("INSERT INTO movimientos_cambios (mes, op) SELECT m, 'R' FROM unnest(%s::text[]) m", (list(meses),))
+    c.execute("SELECT pg_notify('movimientos_cambios', (SELECT max(version) FROM movimientos_cambios)::text)")
+    if quitar: c.execute("DELETE FROM resumen_mensual WHERE mes = ANY(%s)", (meses,))
+    else: c.execute(sql_sumar_resumen("SELECT *, 1 AS s FROM movimientos WHERE mes = ANY(%s)"), (meses,))
+
+# --- REGISTRO DE CAMBIOS (DELTAS ENTRE SESIONES) ---
+# Una fila por movimiento insertado (I), modificado (U) o borrado (D); R = recargar el mes completo
+# (archivo), T = TRUNCATE (restauracion). Al confirmar se avisa por NOTIFY movimientos_cambios con la
+# ultima version. El lock transaccional ordena a los escritores: las versiones se vuelven visibles en
+# orden, asi quien lee "version > v" nunca saltea un cambio confirmado mas tarde con numero menor.
+LOCK_CAMBIOS = 70380
+MAX_CAMBIOS = 200000
+
+def podar_cambios(c):
+    """El registro se poda por cantidad; una sesion que quedo atras de la poda recarga todo."""
+    c.execute("DELETE FROM movimientos_cambios WHERE version <= (SELECT max(version) FROM movimientos_cambios) - %s", (MAX_CAMBIOS,))
+    return c.rowcount
+
+def _crear_cambios(c):
+    c.execute("CREATE TABLE IF NOT EXISTS movimientos_cambios (version BIGSERIAL PRIMARY KEY, id BIGINT, mes TEXT, op CHAR(1) NOT NULL)")
+    c.execute(f"""CREATE OR REPLACE FUNCTION registrar_cambios() RETURNS trigger AS $$
+        BEGIN
+            -- Cada rama referencia solo las tablas de transicion que existen para esa operacion.
+            -- Las sentencias por sentencia disparan aunque no toquen filas: sin cambios no se toma el lock
+            IF TG_OP = 'INSERT' THEN IF NOT EXISTS (SELECT 1 FROM nuevas) THEN RETURN NULL; END IF;
+            ELSIF TG_OP = 'DELETE' THEN IF NOT EXISTS (SELECT 1 FROM viejas) THEN RETURN NULL; END IF;
+            ELSIF TG_OP = 'UPDATE' THEN IF NOT EXISTS (SELECT * FROM nuevas EXCEPT SELECT * FROM viejas) THEN RETURN NULL; END IF;
+            END IF;
+            PERFORM pg_advisory_xact_lock({LOCK_CAMBIOS});
+            IF TG_OP = 'TRUNCATE' THEN INSERT INTO movimientos_cambios (op) VALUES ('T');
+            ELSIF TG_OP = 'INSERT' THEN INSERT INTO movimientos_cambios (id, mes, op) SELECT id, mes, 'I' FROM nuevas;
+            ELSIF TG_OP = 'DELETE' THEN INSERT INTO movimientos_cambios (id, mes, op) SELECT id, mes, 'D' FROM viejas;
+            ELSE INSERT INTO movimientos_cambios (id, mes, op) SELECT id, mes, 'U' FROM (SELECT * FROM nuevas EXCEPT SELECT * FROM viejas) n;
+            END IF;
+            IF FOUND THEN PERFORM pg_notify('movimientos_cambios', (SELECT max(version) FROM movimientos_cambios)::text); END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql""")
+    for op, ref in [("INSERT", "NEW TABLE AS nuevas"), ("UPDATE", "NEW TABLE AS nuevas OLD TABLE AS viejas"), ("DELETE", "OLD TABLE AS viejas")]:
+        c.execute(f"DROP TRIGGER IF EXISTS trg_cambios_{op.lower()} ON movimientos")
+        c.execute(f"CREATE TRIGGER trg_cambios_{op.lower()} AFTER {op} ON movimientos REFERENCING {ref} FOR EACH STATEMENT EXECUTE FUNCTION registrar_cambios()")
+    c.execute("DROP TRIGGER IF EXISTS trg_cambios_truncate ON movimientos")
+    c.execute("CREATE TRIGGER trg_cambios_truncate AFTER TRUNCATE ON movimientos FOR EACH STATEMENT EXECUTE FUNCTION registrar_cambios()")
+
+# --- RESUMEN MENSUAL ---
+# Totales por mes x tipo x moneda x grupo que mantienen los triggers: un alta suma, una baja resta y
+# una modificacion hace las dos cosas (n = cantidad de filas; la clave con n = 0 se borra). Los USD
+# conservan fecha_pago para convertirlos con la cotizacion as-of; en ARS queda vacia. Las columnas
+# se llaman como en movimientos, asi los agregados del dashboard sirven para filas o resumen.
+CLAVE_RESUMEN = "mes, tipo, moneda, grupo, fecha_pago"
+CLAVE_RESUMEN_FILA = "{f}.mes, COALESCE({f}.tipo, ''), COALESCE({f}.moneda, ''), COALESCE({f}.grupo, ''), CASE WHEN {f}.moneda = 'USD' THEN COALESCE({f}.fecha_pago, '') ELSE '' END"
+TABLA_RESUMEN = f"CREATE TABLE IF NOT EXISTS resumen_mensual (mes TEXT NOT NULL, tipo TEXT NOT NULL, moneda TEXT NOT NULL, grupo TEXT NOT NULL, fecha_pago TEXT NOT NULL, monto DOUBLE PRECISION NOT NULL, n INTEGER NOT NULL, PRIMARY KEY ({CLAVE_RESUMEN}))"
+
+def sql_agregar_resumen(origen):
+    """Agregado por clave de `origen` (filas de movimientos mas una columna s = +1 / -1)."""
+    # monto es REAL (float4): pasando por texto se suma el mismo valor que lee pandas
+    monto = "d.monto" if usa_sqlite() else "d.monto::text::float8"
+    return f"SELECT {CLAVE_RESUMEN_FILA.format(f='d')}, SUM(d.s * COALESCE({monto}, 0)), SUM(d.s) FROM ({origen}) d GROUP BY 1, 2, 3, 4, 5"
+
+def sql_sumar_resumen(origen):
+    return f"INSERT INTO resumen_mensual AS r ({CLAVE_RESUMEN}, monto, n) {sql_agregar_resumen(origen)} ON CONFLICT ({CLAVE_RESUMEN}) DO UPDATE SET monto = r.monto + EXCLUDED.monto, n = r.n + EXCLUDED.n"
+
+def _crear_resumen(c):
+    c.execute(TABLA_RESUMEN)
+    # En UPDATE solo entran las filas que cambiaron (EXCEPT ALL: el id hace unica cada fila)
+    origen = {"INSERT": "SELECT *, 1 AS s FROM nuevas", "DELETE": "SELECT *, -1 AS s FROM viejas",
+              "UPDATE": "SELECT *, 1 AS s FROM (SELECT * FROM nuevas EXCEPT ALL SELECT * FROM viejas) n UNION ALL SELECT *, -1 AS s FROM (SELECT * FROM viejas EXCEPT ALL SELECT * FROM nuevas) v"}
+    c.execute(f"""CREATE OR REPLACE FUNCTION mantener_resumen() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN DELETE FROM resumen_mensual; RETURN NULL;
+            ELSIF TG_OP = 'DELETE' THEN IF NOT EXISTS (SELECT 1 FROM viejas) THEN RETURN NULL; END IF;
+            ELSIF NOT EXISTS (SELECT 1 FROM nuevas) THEN RETURN NULL;
+            END IF;
+            IF TG_OP = 'INSERT' THEN {sql_sumar_resumen(origen['INSERT'])};
+            ELSIF TG_OP = 'DELETE' THEN {sql_sumar_resumen(origen['DELETE'])};
+            ELSE {sql_sumar_resumen(origen['UPDATE'])};
+            END IF;
+            DELETE FROM resumen_mensual WHERE n = 0;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql""")
+    for op, ref in [("INSERT", "NEW TABLE AS nuevas"), ("UPDATE", "NEW TABLE AS nuevas OLD TABLE AS viejas"), ("DELETE", "OLD TABLE AS viejas")]:
+        c.execute(f"DROP TRIGGER IF EXISTS trg_resumen_{op.lower()} ON movimientos")
+        c.execute(f"CREATE TRIGGER trg_resumen_{op.lower()} AFTER {op} ON movimientos REFERENCING {ref} FOR EACH STATEMENT EXECUTE FUNCTION mantener_resumen()")
+    c.execute("DROP TRIGGER IF EXISTS trg_resumen_truncate ON movimientos")
+    c.execute("CREATE TRIGGER trg_resumen_truncate AFTER TRUNCATE ON movimientos FOR EACH STATEMENT EXECUTE FUNCTION mantener_resumen()")
+
+# --- CIERRES DE MES ---
+# Un mes en cierres_mes es definitivo: se rechaza toda alta, cambio o baja de sus filas (tambien mover
+# una fila desde o hacia el). Por sentencia con las tablas de transicion, asi un UPDATE de muchas filas
+# hace una sola consulta. Los totales congelados y el saldo que pasa al mes siguiente los calcula cierres.py.
+TABLA_CIERRES = "CREATE TABLE IF NOT EXISTS cierres_mes (mes TEXT PRIMARY KEY, fecha TEXT, ganancias DOUBLE PRECISION, gastos DOUBLE PRECISION, saldo DOUBLE PRECISION, neto_usd DOUBLE PRECISION, filas INTEGER)"
+
+def _crear_cierres(c):
+    c.execute("""CREATE OR REPLACE FUNCTION bloquear_meses_cerrados() RETURNS trigger AS $$
+        DECLARE cerrado TEXT;
+        BEGIN
+            IF TG_OP <> 'DELETE' THEN SELECT n.mes INTO cerrado FROM nuevas n JOIN cierres_mes USING (mes) LIMIT 1; END IF;
+            IF cerrado IS NULL AND TG_OP <> 'INSERT' THEN SELECT v.mes INTO cerrado FROM viejas v JOIN cierres_mes USING (mes) LIMIT 1; END IF;
+            IF cerrado IS NOT NULL THEN RAISE EXCEPTION 'El mes % está cerrado', cerrado USING ERRCODE = 'check_violation'; END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql""")
+    for op, ref in [("INSERT", "NEW TABLE AS nuevas"), ("UPDATE", "NEW TABLE AS nuevas OLD TABLE AS viejas"), ("DELETE", "OLD TABLE AS viejas")]:
+        c.execute(f"DROP TRIGGER IF EXISTS trg_cierre_{op.lower()} ON movimientos")
+        c.execute(f"CREATE TRIGGER trg_cierre_{op.lower()} AFTER {op} ON movimientos REFERENCING {ref} FOR EACH STATEMENT EXECUTE FUNCTION bloquear_meses_cerrados()")
+
+def ultimo_cerrado(c):
+    """Indice en LISTA_MESES_LARGA del ultimo mes cerrado (los anteriores tambien lo estan); -1 si no hay."""
+    c.execute("SELECT mes FROM cierres_mes")
+    return max((LISTA_MESES_LARGA.index(r[0]) for r in c.fetchall() if r[0] in LISTA_MESES_LARGA), default=-1)
+
+def reconstruir_resumen(c):
+    c.execute("DELETE FROM resumen_mensual")
+    c.execute(f"INSERT INTO resumen_mensual ({CLAVE_RESUMEN}, monto, n) {sql_agregar_resumen('SELECT *, 1 AS s FROM movimientos')}")
+
+def versiones_movimientos():
+    with db_connection() as conn:
+        c = conn.cursor(); c.execute("SELECT mes, version FROM movimientos_version")
+        return {m: int(v) for m, v in c.fetchall()}
+
 def init_db():
     try:
         with db_connection() as conn:
             c = conn.cursor()
-            c.execute('''CREATE TABLE IF NOT EXISTS movimientos (id SERIAL PRIMARY KEY, fecha TEXT, mes TEXT, tipo TEXT, grupo TEXT, tipo_gasto TEXT, cuota TEXT, monto REAL, moneda TEXT, forma_pago TEXT, fecha_pago TEXT)''')
-            for col in ["pagado BOOLEAN DEFAULT FALSE", "contrato TEXT DEFAULT ''"]:
-                try: c.execute(f"ALTER TABLE movimientos ADD COLUMN {col}"); conn.commit()
-                except: conn.rollback()
+            if usa_sqlite(): db_sqlite.crear_esquema_movimientos(c, COLUMNAS_MOVIMIENTOS)
+            else:
+                _migrar_movimientos(c)
+                _crear_particiones(c)
+                c.execute("CREATE TABLE IF NOT EXISTS movimientos_archivo (LIKE movimientos INCLUDING DEFAULTS, PRIMARY KEY (id, mes)) PARTITION BY LIST (mes)")
+                # Columnas nuevas en una base existente: ADD COLUMN en la tabla padre llega a todas sus particiones
+                for t in ["movimientos", "movimientos_archivo"]: c.execute(f"ALTER TABLE {t} ADD COLUMN IF NOT EXISTS plan_id INTEGER")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_movimientos_mes_tipo_gasto ON movimientos (mes, tipo_gasto)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_movimientos_listado ON movimientos (mes, tipo, grupo, (COALESCE(pagado, FALSE)), (COALESCE(fecha_pago, '')), id)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_movimientos_plan ON movimientos (plan_id) WHERE plan_id IS NOT NULL")
+            c.execute(TABLA_CIERRES)
+            if not usa_sqlite():
+                _crear_busqueda(c)
+                _crear_versionado(c)
+                _crear_cambios(c)
+                _crear_resumen(c)
+                _crear_cierres(c)
+            else:
+                db_sqlite.crear_resumen(c, TABLA_RESUMEN, CLAVE_RESUMEN, CLAVE_RESUMEN_FILA)
+                db_sqlite.crear_bloqueo_cierres(c)
+            # Primera vez (tabla recien creada): se calcula desde las filas
+            c.execute("SELECT count(*) FROM resumen_mensual")
+            if c.fetchone()[0] == 0: reconstruir_resumen(c)
+            if not usa_sqlite(): _particionar_anios_viejos(c)
+            podar_cambios(c)
             c.execute('''CREATE TABLE IF NOT EXISTS grupos (nombre TEXT PRIMARY KEY)''')
             c.execute('''CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT)''')
             c.execute('''CREATE TABLE IF NOT EXISTS deudas (id SERIAL PRIMARY KEY, nombre_deuda TEXT, monto_total REAL, moneda TEXT, fecha_inicio TEXT, estado TEXT)''')
-            c.execute('''CREATE TABLE IF NOT EXISTS inversiones (id SERIAL PRIMARY KEY, tipo TEXT, entidad TEXT, monto_inicial REAL, tna REAL, fecha_inicio TEXT, plazo_dias INTEGER, estado TEXT)''')
+            c.execute('''CREATE TABLE IF NOT EXISTS inversiones (id SERIAL PRIMARY KEY, tipo TEXT, entidad TEXT, monto_inicial REAL, tna REAL, fecha_inicio TEXT, plazo_dias INTEGER, estado TEXT, moneda TEXT DEFAULT 'ARS')''')
+            c.execute("ALTER TABLE inversiones ADD COLUMN IF NOT EXISTS moneda TEXT DEFAULT 'ARS'")
+            c.execute('''CREATE TABLE IF NOT EXISTS cotizaciones (fecha TEXT PRIMARY KEY, valor REAL NOT NULL, fuente TEXT DEFAULT 'dolarapi')''')
             c.execute('''CREATE TABLE IF NOT EXISTS presupuestos (id SERIAL PRIMARY KEY, grupo TEXT UNIQUE, limite REAL, moneda TEXT DEFAULT 'ARS')''')
+            c.execute('''CREATE TABLE IF NOT EXISTS planes_cuotas (id SERIAL PRIMARY KEY, fecha TEXT, tipo TEXT, grupo TEXT, tipo_gasto TEXT, contrato TEXT DEFAULT '', monto REAL, moneda TEXT, forma_pago TEXT, mes_inicio TEXT, fecha_pago TEXT, cuota_inicial INTEGER, total INTEGER, generadas INTEGER, activo BOOLEAN DEFAULT TRUE)''')
             c.execute('''CREATE TABLE IF NOT EXISTS recurrentes (id SERIAL PRIMARY KEY, tipo TEXT, grupo TEXT, tipo_gasto TEXT, contrato TEXT DEFAULT '', monto REAL, moneda TEXT, forma_pago TEXT, activo BOOLEAN DEFAULT TRUE)''')
             c.execute("SELECT count(*) FROM grupos")
             if c.fetchone()[0] == 0: c.executemany("INSERT INTO grupos VALUES (%s) ON CONFLICT DO NOTHING", [("AHORRO MANUEL",), ("CASA",), ("AUTO",), ("VARIOS",), ("DEUDAS",)])
             c.execute("SELECT count(*) FROM users")
             if c.fetchone()[0] == 0: c.execute("INSERT INTO users VALUES (%s, %s) ON CONFLICT DO NOTHING", ("admin", make_hashes("admin123")))
             conn.commit()
-    except Exception as e: logger.critical(f"Init DB Error: {e}")
+        return True
+    except Exception as e: logger.critical(f"Init DB Error: {e}"); return False
+
+# init_db() corre DDL (ALTER TABLE, triggers) que toma locks exclusivos sobre movimientos: en cada
+# rerun de varias sesiones a la vez se trababa con las lecturas de las otras (deadlock en carga.py).
+# La app lo corre una vez por proceso y base; si fallo, lo reintenta en el rerun siguiente. La poda
+# del registro de cambios tambien va ahi, asi que en un servidor que no reinicia se repite una vez por dia.
+_esquema = {"clave": None, "podado": None}
+_lock_esquema = threading.Lock()
+
+def base_actual():
+    """Identidad de la base en uso, para claves de cache: las versiones por mes se repiten entre bases."""
+    return os.environ.get("DATABASE_URL", ""), os.environ.get("DB_BACKEND", "")
+
+def init_db_una_vez():
+    clave = base_actual()
+    with _lock_esquema:
+        if _esquema["clave"] != clave and init_db(): _esquema["clave"] = clave; _esquema["podado"] = (clave, datetime.date.today())
+        if _esquema["clave"] == clave and _esquema["podado"] != (clave, datetime.date.today()):
+            try:
+                with db_connection() as conn: podar_cambios(conn.cursor()); conn.commit()
+                _esquema["podado"] = (clave, datetime.date.today())
+            except Exception as e: logger.error(f"Poda del registro de cambios: {e}")
 
 def generar_backup_sql():
     try:
         with db_connection() as conn:
+            if usa_sqlite(): return "\n".join(conn.iterdump())
             c = conn.cursor()
-            tablas = ['grupos', 'users', 'deudas', 'movimientos', 'inversiones', 'presupuestos', 'recurrentes']
-            script = "-- BACKUP V5 --\nTRUNCATE TABLE movimientos, deudas, grupos, users, inversiones RESTART IDENTITY CASCADE;\n\n"
+            # cierres_mes va despues de movimientos: con el mes ya cerrado el trigger rechazaria sus filas
+            tablas = ['grupos', 'users', 'deudas', 'movimientos', 'movimientos_archivo', 'inversiones', 'presupuestos', 'recurrentes', 'cotizaciones', 'planes_cuotas', 'cierres_mes']
+            script = "-- BACKUP V5 (movimientos particionada por año, requiere init_db) --\nTRUNCATE TABLE movimientos, movimientos_archivo, deudas, grupos, users, inversiones, planes_cuotas, cierres_mes RESTART IDENTITY CASCADE;\n\n"
+            # Los años archivados se vuelven a colgar de movimientos_archivo antes de cargar sus filas
+            for anio, ubicacion, _ in listar_particiones():
+                if ubicacion == "ARCHIVO":
+                    # Un año previo a la lista de meses no tiene particion en una base nueva
+                    script += f"CREATE TABLE IF NOT EXISTS movimientos_{anio} PARTITION OF movimientos FOR VALUES IN ({', '.join(chr(39) + m + chr(39) for m in meses_del_anio(anio))});\n"
+                    ddl = "; ".join(_sql_mover_particion(anio, "movimientos", "movimientos_archivo"))
+                    script += f"DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = 'movimientos_{anio}'::regclass AND inhparent = 'movimientos'::regclass) THEN {ddl}; END IF; END $$;\n"
+            script += "\n"
             for t in tablas:
                 try:
                     c.execute(f"SELECT * FROM {t}"); rows = c.fetchall()
@@ -92,6 +494,6 @@ def generar_backup_sql():
                     for r in rows:
                         vals = [f"'{str(v).replace(chr(39), chr(39)+chr(39))}'" if isinstance(v, str) else ("TRUE" if v is True else "FALSE" if v is False else ("NULL" if v is None else str(v))) for v in r]
                         script += f"INSERT INTO {t} ({', '.join(cols)}) VALUES ({', '.join(vals)}) ON CONFLICT DO NOTHING;\n"
-            script += "\nSELECT setval('movimientos_id_seq', (SELECT MAX(id) FROM movimientos));\nSELECT setval('deudas_id_seq', (SELECT MAX(id) FROM deudas));\nSELECT setval('inversiones_id_seq', (SELECT MAX(id) FROM inversiones));\n"
+            script += "\nSELECT setval('movimientos_id_seq', GREATEST((SELECT MAX(id) FROM movimientos), (SELECT MAX(id) FROM movimientos_archivo)));\nSELECT setval('deudas_id_seq', (SELECT MAX(id) FROM deudas));\nSELECT setval('inversiones_id_seq', (SELECT MAX(id) FROM inversiones));\nSELECT setval('planes_cuotas_id_seq', (SELECT MAX(id) FROM planes_cuotas));\n"
             return script
     except: return "-- Error backup"
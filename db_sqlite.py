@@ -0,0 +1,162 @@
+import os
+import re
+import csv
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- BACKEND SQLITE (build de escritorio) ---
+# Misma interfaz que psycopg2 para el resto de la app: el cursor traduce el SQL escrito para
+# Postgres (%s, ILIKE, = ANY(%s), IN %s, SERIAL, COPY) al dialecto de SQLite. Se mantiene una
+# conexion por hilo entre reruns, asi sqlite3 reutiliza sus sentencias preparadas (cached_statements).
+RUTA_DEFECTO = os.path.join(os.path.expanduser("~"), ".contabilidad_v5", "contabilidad.db")
+_local = threading.local()
+
+sqlite3.register_converter("BOOLEAN", lambda v: v not in (b"0", b""))
+
+_ANY = re.compile(r"=\s*ANY\(\s*%s\s*\)", re.I)
+_LIKE = re.compile(r"\bI?LIKE\s+%s", re.I)
+_ILIKE = re.compile(r"\bILIKE\b", re.I)
+_MARCAS = re.compile(r"%%|%s")
+_COPY = re.compile(r"COPY\s+(\w+)\s*\(([^)]*)\)\s+FROM\s+STDIN", re.I)
+_ADD_COLUMN = re.compile(r"ALTER\s+TABLE\s+(\w+)\s+ADD\s+COLUMN\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.I)
+
+
+def traducir(sql, params=None):
+    """Devuelve (sql, params) en estilo SQLite. Listas y tuplas se expanden a (?, ?, ...)."""
+    sql = _ANY.sub("IN %s", sql)
+    # Postgres usa '\' como escape de LIKE por defecto; SQLite necesita declararlo
+    sql = _ILIKE.sub("LIKE", _LIKE.sub(r"LIKE %s ESCAPE '\\'", sql))
+    sql = sql.replace("SERIAL PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT")
+    if params is None: return sql, ()
+    valores, salida = iter(params), []
+
+    def marca(m):
+        if m.group() == "%%": return "%"
+        v = next(valores)
+        if isinstance(v, (list, tuple)):
+            salida.extend(v)
+            return f"({', '.join('?' * len(v))})" if v else "(NULL)"
+        salida.append(v)
+        return "?"
+    return _MARCAS.sub(marca, sql), salida
+
+
+def _valor_copy(v):
+    # COPY csv: vacio es NULL; los booleanos llegan como texto desde pandas
+    return None if v == "" else {"True": 1, "False": 0}.get(v, v)
+
+
+class CursorSQLite(sqlite3.Cursor):
+    def execute(self, sql, params=None):
+        m = _ADD_COLUMN.match(sql.strip())
+        if m:
+            # SQLite no tiene ADD COLUMN IF NOT EXISTS: se consulta el esquema
+            if m.group(2).lower() in (f[1].lower() for f in super().execute(f"PRAGMA table_info({m.group(1)})").fetchall()): return self
+            sql = _ADD_COLUMN.sub(r"ALTER TABLE \1 ADD COLUMN \2", sql, count=1)
+        return super().execute(*traducir(sql, params))
+
+    def executemany(self, sql, seq_params):
+        filas = list(seq_params)
+        if not filas: return self
+        return super().executemany(traducir(sql, filas[0])[0], filas)
+
+    def copy_expert(self, sql, archivo):
+        m = _COPY.match(sql.strip())
+        tabla, columnas = m.group(1), [c.strip() for c in m.group(2).split(",")]
+        filas = ([_valor_copy(v) for v in f] for f in csv.reader(archivo))
+        super().executemany(f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})", filas)
+
+
+class ConexionSQLite(sqlite3.Connection):
+    def cursor(self, factory=CursorSQLite):
+        return super().cursor(factory)
+
+
+def ruta_base():
+    url = os.environ.get("DATABASE_URL", "")
+    return url[len("sqlite:///"):] if url.startswith("sqlite:///") else RUTA_DEFECTO
+
+
+def conectar(funciones=None):
+    """Una conexion por hilo; un db_connection() anidado recibe la misma y suma un nivel."""
+    ruta = ruta_base()
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.ruta == ruta:
+        _local.nivel += 1; return conn
+    if os.path.dirname(ruta): os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    conn = sqlite3.connect(ruta, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES, cached_statements=256, factory=ConexionSQLite)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for nombre, (n_args, fn) in (funciones or {}).items():
+        conn.create_function(nombre, n_args, fn, deterministic=True)
+    _local.conn, _local.ruta, _local.nivel = conn, ruta, 1
+    return conn
+
+
+def devolver(conn):
+    # Igual que el pool de psycopg2: lo que quedo sin commit se descarta, pero solo al soltar el bloque
+    # mas externo (un bloque anidado no deshace lo pendiente del que lo contiene)
+    if conn is getattr(_local, "conn", None):
+        _local.nivel = max(_local.nivel - 1, 0)
+        if _local.nivel: return
+    if conn.in_transaction: conn.rollback()
+
+
+def cerrar():
+    conn = getattr(_local, "conn", None)
+    if conn is not None: conn.close()
+    _local.conn, _local.nivel = None, 0
+
+
+# --- ESQUEMA ---
+# Sin particiones: movimientos y movimientos_archivo son tablas comunes y archivar un año
+# mueve sus filas. La version por mes se mantiene con triggers por fila.
+def crear_esquema_movimientos(c, columnas):
+    cols = columnas.replace("id INTEGER NOT NULL DEFAULT nextval('movimientos_id_seq')", "id INTEGER PRIMARY KEY AUTOINCREMENT").replace(", PRIMARY KEY (id, mes)", "")
+    c.execute(f"CREATE TABLE IF NOT EXISTS movimientos ({cols})")
+    c.execute(f"CREATE TABLE IF NOT EXISTS movimientos_archivo ({cols.replace(' AUTOINCREMENT', '')})")
+    # Base creada con una version anterior: se agregan las columnas que falten (al final, en las dos tablas)
+    for t in ("movimientos", "movimientos_archivo"):
+        for col in cols.split(", ")[1:]: c.execute(f"ALTER TABLE {t} ADD COLUMN IF NOT EXISTS {col}")
+    c.execute("CREATE TABLE IF NOT EXISTS movimientos_version (mes TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_movimientos_version ON movimientos_version (version)")
+    siguiente = "(SELECT COALESCE(MAX(version), 0) + 1 FROM movimientos_version)"
+    upsert = "INSERT INTO movimientos_version VALUES ({}.mes, " + siguiente + ") ON CONFLICT (mes) DO UPDATE SET version = EXCLUDED.version;"
+    # UPDATE solo cuenta si alguna columna cambio (se recrea para incluir columnas nuevas)
+    c.execute("PRAGMA table_info(movimientos)")
+    cambio = " OR ".join(f"OLD.{col[1]} IS NOT NEW.{col[1]}" for col in c.fetchall())
+    c.execute("DROP TRIGGER IF EXISTS trg_version_update")
+    for op, filas, cuando in [("INSERT", ["NEW"], ""), ("UPDATE", ["OLD", "NEW"], f"WHEN {cambio}"), ("DELETE", ["OLD"], "")]:
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_version_{op.lower()} AFTER {op} ON movimientos {cuando} BEGIN {' '.join(upsert.format(f) for f in filas)} END")
+    # Registro de cambios por fila (mismo contrato que en Postgres, sin NOTIFY)
+    c.execute("CREATE TABLE IF NOT EXISTS movimientos_cambios (version INTEGER PRIMARY KEY AUTOINCREMENT, id INTEGER, mes TEXT, op TEXT NOT NULL)")
+    c.execute("DROP TRIGGER IF EXISTS trg_cambios_update")
+    for op, fila, cuando in [("INSERT", "NEW", ""), ("UPDATE", "NEW", f"WHEN {cambio}"), ("DELETE", "OLD", "")]:
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_cambios_{op.lower()} AFTER {op} ON movimientos {cuando} BEGIN INSERT INTO movimientos_cambios (id, mes, op) VALUES ({fila}.id, {fila}.mes, '{op[0]}'); END")
+    c.execute("INSERT INTO movimientos_version SELECT mes, ROW_NUMBER() OVER (ORDER BY mes) FROM movimientos WHERE NOT EXISTS (SELECT 1 FROM movimientos_version) GROUP BY mes")
+    c.execute("DROP VIEW IF EXISTS movimientos_historico")
+    c.execute("CREATE VIEW movimientos_historico AS SELECT * FROM movimientos UNION ALL SELECT * FROM movimientos_archivo")
+
+
+def crear_resumen(c, tabla, clave, clave_fila):
+    """Triggers por fila que mantienen resumen_mensual (en Postgres son por sentencia)."""
+    c.execute(tabla)
+    sumar = ("INSERT INTO resumen_mensual ({clave}, monto, n) VALUES ({fila}, {s} * COALESCE({f}.monto, 0), {s}) "
+             "ON CONFLICT ({clave}) DO UPDATE SET monto = monto + excluded.monto, n = n + excluded.n;")
+    for op, filas in [("INSERT", [("NEW", 1)]), ("UPDATE", [("NEW", 1), ("OLD", -1)]), ("DELETE", [("OLD", -1)])]:
+        cuerpo = " ".join(sumar.format(clave=clave, fila=clave_fila.format(f=f), f=f, s=s) for f, s in filas)
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_resumen_{op.lower()} AFTER {op} ON movimientos BEGIN {cuerpo} DELETE FROM resumen_mensual WHERE n = 0; END")
+
+
+def crear_bloqueo_cierres(c):
+    """Triggers por fila que rechazan escribir en un mes de cierres_mes (en Postgres son por sentencia).
+    Archivar un año mueve sus filas con INSERT/DELETE: mientras hay una fila en cierres_desbloqueo
+    (solo dentro de esa transaccion) el bloqueo no aplica."""
+    c.execute("CREATE TABLE IF NOT EXISTS cierres_desbloqueo (motivo TEXT)")
+    for op, filas in [("INSERT", ["NEW"]), ("UPDATE", ["NEW", "OLD"]), ("DELETE", ["OLD"])]:
+        cerrado = " OR ".join(f"{f}.mes IN (SELECT mes FROM cierres_mes)" for f in filas)
+        c.execute(f"DROP TRIGGER IF EXISTS trg_cierre_{op.lower()}")
+        c.execute(f"CREATE TRIGGER trg_cierre_{op.lower()} BEFORE {op} ON movimientos WHEN ({cerrado}) AND NOT EXISTS (SELECT 1 FROM cierres_desbloqueo) BEGIN SELECT RAISE(ABORT, 'El mes está cerrado'); END")
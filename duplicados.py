@@ -0,0 +1,137 @@
+import difflib
+import numpy as np
+import pandas as pd
+from db import db_connection
+from consultas import normalizar_busqueda
+
+# --- DETECTOR DE DUPLICADOS ---
+# Replicar, clonar, generar recurrentes o cargar a mano deja a veces el mismo movimiento dos veces.
+# Comparar todas las filas entre si es O(n²); aca solo se comparan las filas del mismo bloque
+# (mes, tipo, grupo, moneda, monto redondeado, primera palabra normalizada del concepto) y, dentro de cada
+# bloque ordenado por id, cada fila con las VENTANA siguientes (vecindario ordenado): un bloque
+# enorme de movimientos identicos cuesta O(n·VENTANA) y no O(n²). Cada par candidato recibe un
+# puntaje por parecido del concepto, cercania del monto y de la fecha de pago; cuotas o contratos
+# distintos (planes diferentes) lo descartan.
+VENTANA = 8
+UMBRAL = 0.85
+PESOS = {"concepto": 0.6, "monto": 0.25, "fecha": 0.15}
+DIAS_FECHA = 31  # a esta distancia la fecha ya no suma
+COLUMNAS = ["id_a", "id_b", "mes", "tipo", "concepto_a", "concepto_b", "monto_a", "monto_b", "moneda", "fecha_a", "fecha_b", "puntaje"]
+
+
+def _codigos(s):
+    return s.cat.codes.to_numpy() if isinstance(s.dtype, pd.CategoricalDtype) else pd.factorize(s.astype(str))[0]
+
+
+def candidatos(df):
+    """Pares (posicion a, posicion b) de filas del mismo bloque, a lo sumo VENTANA vecinos por fila, y el
+    concepto normalizado de cada fila. La normalizacion se hace una vez por concepto distinto, no por fila."""
+    cod, unicos = pd.factorize(df["tipo_gasto"].fillna("").astype(str))
+    norm_u = np.array([normalizar_busqueda(u) for u in unicos] or [""], dtype=object)
+    token = pd.factorize(np.array([n.split(" ", 1)[0][:6] for n in norm_u], dtype=object))[0][cod]
+    bloque = pd.DataFrame({"mes": _codigos(df["mes"]), "tipo": _codigos(df["tipo"]), "grupo": _codigos(df["grupo"]), "moneda": _codigos(df["moneda"]),
+                           "monto": np.round(df["monto"].to_numpy(dtype=float)), "token": token})
+    clave = bloque.groupby(list(bloque.columns), sort=False, dropna=False).ngroup().to_numpy()
+    norm = norm_u[cod]
+    tam = np.bincount(clave)[clave]
+    pos = np.flatnonzero(tam > 1)
+    if not len(pos): return np.array([], dtype=int), np.array([], dtype=int), norm
+    orden = pos[np.lexsort((df["id"].to_numpy()[pos], clave[pos]))]
+    a, b = [], []
+    for k in range(1, min(VENTANA, len(orden) - 1) + 1):
+        i, j = orden[:-k], orden[k:]
+        mismo = clave[i] == clave[j]
+        a.append(i[mismo]); b.append(j[mismo])
+    return np.concatenate(a), np.concatenate(b), norm
+
+
+def _fechas(s):
+    if pd.api.types.is_datetime64_any_dtype(s): return s
+    return pd.to_datetime(s.astype("string").str[:10], format="%Y-%m-%d", errors="coerce")
+
+
+def puntuar(df, a, b, norm):
+    """Puntaje 0..1 de cada par; 0 si las cuotas o los contratos no vacios difieren."""
+    textos = pd.DataFrame({"x": norm[a], "y": norm[b]})
+    parecido = {(x, y): difflib.SequenceMatcher(None, x, y).ratio() for x, y in textos.drop_duplicates().itertuples(index=False)}
+    s_texto = np.array([parecido[p] for p in zip(textos["x"], textos["y"])], dtype=float)
+    m = df["monto"].to_numpy(dtype=float)
+    mayor = np.maximum(np.abs(m[a]), np.abs(m[b]))
+    s_monto = 1 - np.divide(np.abs(m[a] - m[b]), mayor, out=np.zeros(len(a)), where=mayor > 0)
+    f = _fechas(df["fecha_pago"]).to_numpy()
+    dias = np.abs((f[a] - f[b]).astype("timedelta64[D]").astype(float))
+    s_fecha = np.where(np.isnan(dias), 0.5, np.clip(1 - dias / DIAS_FECHA, 0, 1))
+    puntaje = PESOS["concepto"] * s_texto + PESOS["monto"] * s_monto + PESOS["fecha"] * s_fecha
+    veto = np.zeros(len(a), dtype=bool)
+    for col in ("cuota", "contrato"):
+        if col not in df.columns: continue
+        v = df[col].astype(object).fillna("").astype(str).str.strip().to_numpy()
+        veto |= (v[a] != "") & (v[b] != "") & (v[a] != v[b])
+    return np.where(veto, 0.0, puntaje)
+
+
+def detectar(df, umbral=UMBRAL):
+    """Pares de posibles duplicados (id_a < id_b), de mayor a menor puntaje."""
+    if df.empty: return pd.DataFrame(columns=COLUMNAS)
+    df = df.reset_index(drop=True)
+    a, b, norm = candidatos(df)
+    if not len(a): return pd.DataFrame(columns=COLUMNAS)
+    p = puntuar(df, a, b, norm)
+    ok = p >= umbral
+    a, b, p = a[ok], b[ok], p[ok]
+    fechas = _fechas(df["fecha_pago"])
+    out = pd.DataFrame({"id_a": df["id"].to_numpy()[a], "id_b": df["id"].to_numpy()[b], "mes": df["mes"].astype(str).to_numpy()[a],
+                        "tipo": df["tipo"].astype(str).to_numpy()[a], "concepto_a": df["tipo_gasto"].to_numpy()[a], "concepto_b": df["tipo_gasto"].to_numpy()[b],
+                        "monto_a": df["monto"].to_numpy(dtype=float)[a], "monto_b": df["monto"].to_numpy(dtype=float)[b], "moneda": df["moneda"].astype(str).to_numpy()[a],
+                        "fecha_a": fechas.to_numpy()[a], "fecha_b": fechas.to_numpy()[b], "puntaje": p.round(3)})
+    return out.sort_values(["puntaje", "id_a"], ascending=[False, True], ignore_index=True)
+
+
+def grupos_duplicados(pares):
+    """id -> id que se conserva (el menor de su grupo conectado); los pares a-b, b-c forman un grupo."""
+    padre = {}
+    def raiz(x):
+        while padre.get(x, x) != x: x = padre[x]
+        return x
+    for x, y in pares:
+        rx, ry = raiz(int(x)), raiz(int(y))
+        if rx != ry: padre[max(rx, ry)] = min(rx, ry)
+    return {x: raiz(x) for x in list(padre)}
+
+
+def eliminar_duplicados(pares):
+    """Borra el movimiento de mayor id de cada grupo. Devuelve (borrados, meses afectados)."""
+    destino = grupos_duplicados(pares)
+    borrar = sorted(i for i, r in destino.items() if i != r)
+    if not borrar: return 0, []
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT DISTINCT mes FROM movimientos WHERE id = ANY(%s)", (borrar,)); meses = [r[0] for r in c.fetchall()]
+        c.execute("DELETE FROM movimientos WHERE id = ANY(%s)", (borrar,)); conn.commit()
+    return len(borrar), meses
+
+
+def fusionar_duplicados(pares):
+    """Como eliminar_duplicados, pero antes completa el que queda con lo que le falte (contrato, cuota,
+    forma de pago, fecha de pago) y lo marca pagado si alguno lo estaba."""
+    destino = grupos_duplicados(pares)
+    borrar = sorted(i for i, r in destino.items() if i != r)
+    if not borrar: return 0, []
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, contrato, cuota, forma_pago, fecha_pago, pagado, mes FROM movimientos WHERE id = ANY(%s)", (sorted(set(destino) | set(destino.values())),))
+        filas = {r[0]: r[1:] for r in c.fetchall()}
+        meses = sorted({filas[i][5] for i in borrar if i in filas})
+        cambios = []
+        for quedan in sorted(set(destino.values())):
+            if quedan not in filas: continue
+            contrato, cuota, fpago, fecha, pagado, _ = filas[quedan]
+            for i in (i for i, r in destino.items() if r == quedan and i != quedan and i in filas):
+                o = filas[i]
+                contrato, cuota, fpago, fecha = contrato or o[0], cuota or o[1], fpago or o[2], fecha or o[3]
+                pagado = bool(pagado) or bool(o[4])
+            if (contrato, cuota, fpago, fecha, pagado) != filas[quedan][:4] + (bool(filas[quedan][4]),):
+                cambios.append((contrato, cuota, fpago, fecha, pagado, quedan))
+        c.executemany("UPDATE movimientos SET contrato=%s, cuota=%s, forma_pago=%s, fecha_pago=%s, pagado=%s WHERE id=%s", cambios)
+        c.execute("DELETE FROM movimientos WHERE id = ANY(%s)", (borrar,)); conn.commit()
+    return len(borrar), meses
@@ -0,0 +1,182 @@
+import io
+import csv
+import datetime
+import logging
+import numpy as np
+import pandas as pd
+from config import MESES_NOMBRES, LISTA_MESES_LARGA, CHUNK_IMPORTACION
+from db import db_connection
+from utils import procesar_montos_serie
+from categorizador import categorizar_lote, aprender, precargar, CONFIANZA_MIN
+
+logger = logging.getLogger(__name__)
+
+# --- IMPORTADOR DE EXTRACTOS (CSV / XLSX) ---
+# Pipeline por bloques: parseo -> normalizacion -> mapeo a grupo -> dedup por hash -> COPY.
+# El grupo sale del historial (concepto identico); si no hay, del categorizador cuando esta seguro.
+# La memoria queda acotada por CHUNK_IMPORTACION y por los meses que toca el extracto.
+COLUMNAS_COPY = ["fecha", "mes", "tipo", "grupo", "tipo_gasto", "contrato", "cuota", "monto", "moneda", "forma_pago", "fecha_pago", "pagado"]
+CAMPOS_HASH = ["mes", "fecha_pago", "tipo", "concepto_norm", "monto_norm", "moneda"]
+SUGERENCIAS = {
+    "fecha": ["fecha", "fecha operacion", "fecha mov", "date"],
+    "concepto": ["concepto", "descripcion", "descripción", "detalle", "movimiento", "comercio"],
+    "monto": ["importe", "monto", "importe ars", "débito", "debito", "amount"],
+    "contrato": ["referencia", "comprobante", "cuota", "nro", "cuenta"],
+}
+
+
+def _es_xlsx(nombre):
+    return nombre.lower().endswith((".xlsx", ".xlsm"))
+
+
+def _leer_xlsx(archivo, chunksize):
+    import openpyxl
+    ws = openpyxl.load_workbook(archivo, read_only=True, data_only=True).active
+    filas = ws.iter_rows(values_only=True)
+    header = None
+    for fila in filas:
+        if any(v is not None for v in fila):
+            header = [str(v).strip() if v is not None else f"col_{i}" for i, v in enumerate(fila)]; break
+    if header is None: return
+    bloque = []
+    for fila in filas:
+        if all(v is None for v in fila): continue
+        bloque.append(fila[:len(header)])
+        if len(bloque) >= chunksize:
+            yield pd.DataFrame(bloque, columns=header); bloque = []
+    if bloque: yield pd.DataFrame(bloque, columns=header)
+
+
+def _leer_csv(archivo, chunksize):
+    muestra = archivo.read(65536); archivo.seek(0)
+    try: muestra.decode("utf-8"); encoding = "utf-8-sig"
+    except UnicodeDecodeError: encoding = "latin-1"
+    try: sep = csv.Sniffer().sniff(muestra.decode(encoding, errors="ignore").split("\n", 1)[0], delimiters=";,\t|").delimiter
+    except csv.Error: sep = ","
+    yield from pd.read_csv(archivo, sep=sep, dtype=str, keep_default_na=False, encoding=encoding, chunksize=chunksize, skipinitialspace=True)
+
+
+def leer_extracto(archivo, nombre, chunksize=CHUNK_IMPORTACION):
+    """Itera el extracto en DataFrames de a lo sumo `chunksize` filas."""
+    archivo.seek(0)
+    yield from (_leer_xlsx if _es_xlsx(nombre) else _leer_csv)(archivo, chunksize)
+
+
+def leer_encabezado(archivo, nombre):
+    bloque = next(leer_extracto(archivo, nombre, chunksize=20), pd.DataFrame())
+    archivo.seek(0)
+    return bloque
+
+
+def sugerir_columna(columnas, campo):
+    norm = {c.lower().strip(): c for c in columnas}
+    for s in SUGERENCIAS[campo]:
+        if s in norm: return norm[s]
+    return next((c for c in columnas if any(s in c.lower() for s in SUGERENCIAS[campo])), None)
+
+
+def mapa_grupos_historico():
+    """Grupo mas usado para cada concepto ya cargado (en mayusculas)."""
+    with db_connection() as conn:
+        df = pd.read_sql("SELECT upper(trim(tipo_gasto)) AS concepto, grupo, count(*) AS n FROM movimientos GROUP BY 1, 2", conn)
+    if df.empty: return {}
+    return df.sort_values("n").drop_duplicates("concepto", keep="last").set_index("concepto")["grupo"].to_dict()
+
+
+def hash_contenido(df):
+    """Hash por fila de los campos que identifican un movimiento (mes, fecha, tipo, concepto, monto, moneda)."""
+    claves = pd.DataFrame({
+        "mes": df["mes"].astype(str),
+        "fecha_pago": df["fecha_pago"].astype(str).str[:10],
+        "tipo": df["tipo"].astype(str),
+        "concepto_norm": df["tipo_gasto"].fillna("").astype(str).str.strip().str.upper(),
+        # monto es REAL en la base: se normaliza a float32 para que coincida con lo ya guardado
+        "monto_norm": np.round(df["monto"].astype("float32").astype("float64"), 2),
+        "moneda": df["moneda"].astype(str),
+    })[CAMPOS_HASH]
+    return pd.util.hash_pandas_object(claves, index=False).to_numpy()
+
+
+def mapear_bloque(df, columnas, grupo_defecto, mapa_grupos, moneda, forma_pago, signo_gasto=True, pagado=True, categorizar=False):
+    """Convierte un bloque del extracto a las columnas de movimientos. Descarta filas sin fecha, monto o mes valido."""
+    fecha = pd.to_datetime(df[columnas["fecha"]], dayfirst=True, errors="coerce")
+    monto = procesar_montos_serie(df[columnas["monto"]])
+    concepto = df[columnas["concepto"]].fillna("").astype(str).str.strip()
+    contrato = df[columnas["contrato"]].fillna("").astype(str).str.strip() if columnas.get("contrato") else ""
+    ok = fecha.notna() & (monto != 0) & (concepto != "")
+    mes = pd.Series(np.array(MESES_NOMBRES, dtype=object)[(fecha.dt.month.fillna(1).astype(int) - 1).to_numpy()], index=df.index) + " " + fecha.dt.year.fillna(0).astype(int).astype(str)
+    ok &= mes.isin(LISTA_MESES_LARGA)
+    grupo = concepto.str.upper().map(mapa_grupos).astype(object)
+    falta = grupo.isna() & ok
+    if categorizar and falta.any():
+        sug, confianza = categorizar_lote(concepto[falta], contrato[falta] if isinstance(contrato, pd.Series) else None)
+        grupo[falta] = np.where(confianza >= CONFIANZA_MIN, sug, None)
+    out = pd.DataFrame({
+        "fecha": str(datetime.date.today()),
+        "mes": mes,
+        # Extracto bancario: negativos son gastos. Tarjeta: todo es gasto.
+        "tipo": np.where(monto < 0, "GASTO", "GANANCIA") if signo_gasto else "GASTO",
+        "grupo": grupo.fillna(grupo_defecto),
+        "tipo_gasto": concepto,
+        "contrato": contrato,
+        "cuota": "",
+        "monto": monto.abs(),
+        "moneda": moneda,
+        "forma_pago": forma_pago,
+        "fecha_pago": fecha.dt.strftime("%Y-%m-%d"),
+        "pagado": pagado,
+    }, index=df.index)
+    return out[ok], int((~ok).sum())
+
+
+def _hashes_existentes(c, meses, cache):
+    faltan = [m for m in meses if m not in cache]
+    if faltan:
+        c.execute("SELECT mes, fecha_pago, tipo, tipo_gasto, monto, moneda FROM movimientos WHERE mes = ANY(%s)", (faltan,))
+        df = pd.DataFrame(c.fetchall(), columns=["mes", "fecha_pago", "tipo", "tipo_gasto", "monto", "moneda"])
+        for m in faltan: cache[m] = set()
+        if not df.empty:
+            for m, h in zip(df["mes"], hash_contenido(df)): cache[m].add(h)
+    return cache
+
+
+def importar_extracto(archivo, nombre, columnas, grupo_defecto, moneda="ARS", forma_pago="Bancario", signo_gasto=True, pagado=True, mapa_grupos=None, chunksize=CHUNK_IMPORTACION, categorizar=True):
+    """Importa el extracto completo en una sola transaccion. Devuelve estadisticas de la carga.
+    Las filas de meses cerrados no se cargan: se cuentan en `cerrados`."""
+    stats = {"leidas": 0, "descartadas": 0, "cerrados": 0, "duplicadas": 0, "insertadas": 0, "meses": set()}
+    mapa_grupos = mapa_grupos_historico() if mapa_grupos is None else mapa_grupos
+    cache = {}
+    # El modelo se carga (o entrena) antes de abrir la transaccion y no a mitad de la carga
+    if categorizar: precargar(esperar=True)
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT mes FROM cierres_mes"); cerrados = [r[0] for r in c.fetchall()]
+        try:
+            for bloque in leer_extracto(archivo, nombre, chunksize):
+                stats["leidas"] += len(bloque)
+                df, descartadas = mapear_bloque(bloque, columnas, grupo_defecto, mapa_grupos, moneda, forma_pago, signo_gasto, pagado, categorizar)
+                stats["descartadas"] += descartadas
+                abierto = ~df["mes"].isin(cerrados)
+                stats["cerrados"] += int((~abierto).sum()); df = df[abierto]
+                if df.empty: continue
+                h = hash_contenido(df)
+                _hashes_existentes(c, df["mes"].unique().tolist(), cache)
+                nuevo = np.array([hh not in cache[m] for m, hh in zip(df["mes"], h)], dtype=bool)
+                # Duplicados dentro del mismo extracto
+                nuevo &= ~pd.Series(h).duplicated().to_numpy()
+                stats["duplicadas"] += int((~nuevo).sum())
+                df = df[nuevo]
+                if df.empty: continue
+                buf = io.StringIO()
+                df[COLUMNAS_COPY].to_csv(buf, index=False, header=False)
+                buf.seek(0)
+                c.copy_expert(f"COPY movimientos ({', '.join(COLUMNAS_COPY)}) FROM STDIN WITH (FORMAT csv)", buf)
+                for m, hh in zip(df["mes"], h[nuevo]): cache[m].add(hh)
+                stats["insertadas"] += len(df); stats["meses"].update(df["mes"].unique())
+            conn.commit()
+        except Exception as e:
+            conn.rollback(); logger.error(f"Importacion cancelada: {e}")
+            raise
+    stats["meses"] = sorted(stats["meses"], key=LISTA_MESES_LARGA.index)
+    if stats["insertadas"]: aprender()
+    return stats
@@ -1,8 +1,12 @@
+import io
 import datetime
 import requests
-import streamlit as st
+import pandas as pd
 from config import LISTA_MESES_LARGA, SMVM_BASE_2026
-from db import db_connection
+from db import db_connection, versiones_movimientos, ultimo_cerrado, base_actual
+from perfil import medido
+from cotizaciones import registrar_cotizacion
+from cache_disco import cacheado
 
 def calcular_monto_salario_mes(m):
     if m in SMVM_BASE_2026:
@@ -22,32 +26,80 @@ def calcular_monto_salario_mes(m):
 def automatizaciones():
     try:
         with db_connection() as conn:
-            c = conn.cursor()
-            c.execute("SELECT id, mes FROM movimientos WHERE tipo_gasto = 'SALARIO CHICOS'")
+            c = conn.cursor(); desde = ultimo_cerrado(c) + 1  # los meses cerrados no se tocan
+            c.execute("SELECT id, mes FROM movimientos WHERE tipo_gasto = 'SALARIO CHICOS' AND mes = ANY(%s)", (LISTA_MESES_LARGA[desde:],))
             for r in c.fetchall():
                 v = calcular_monto_salario_mes(r[1])
-                if v: c.execute("UPDATE movimientos SET monto=%s WHERE id=%s", (v, r[0]))
-            for i, m in enumerate(LISTA_MESES_LARGA):
-                c.execute("UPDATE movimientos SET monto=%s WHERE mes=%s AND tipo_gasto='TERRENO'", (13800.0 * ((1.04) ** i), m))
+                if v: c.execute("UPDATE movimientos SET monto=%s WHERE id=%s AND (monto IS NULL OR monto <> CAST(%s AS REAL))", (v, r[0], v))
+            # Solo se reescribe lo que cambio: una UPDATE sin cambios igual dispara los triggers de resumen y cambios
+            for i, m in enumerate(LISTA_MESES_LARGA[desde:], desde):
+                v = 13800.0 * ((1.04) ** i)
+                c.execute("UPDATE movimientos SET monto=%s WHERE mes=%s AND tipo_gasto='TERRENO' AND (monto IS NULL OR monto <> CAST(%s AS REAL))", (v, m, v))
             conn.commit()
     except: pass
 
 def actualizar_saldos(mes):
     try:
         with db_connection() as conn:
-            c = conn.cursor(); idx = LISTA_MESES_LARGA.index(mes)
+            c = conn.cursor(); cerrado = ultimo_cerrado(c)
+            # Los meses cerrados no cambian: la cascada arranca del ultimo cierre, con el saldo que guardo
+            idx = max(LISTA_MESES_LARGA.index(mes), cerrado)
             for i in range(idx, min(len(LISTA_MESES_LARGA)-1, idx+24)):
                 ma, ms = LISTA_MESES_LARGA[i], LISTA_MESES_LARGA[i+1]
-                c.execute("SELECT COALESCE(SUM(CASE WHEN tipo='GANANCIA' THEN monto ELSE 0 END),0) - COALESCE(SUM(CASE WHEN tipo='GASTO' THEN monto ELSE 0 END),0) FROM movimientos WHERE mes=%s AND moneda='ARS'", (ma,))
+                if i == cerrado: c.execute("SELECT saldo FROM cierres_mes WHERE mes=%s", (ma,))
+                else: c.execute("SELECT COALESCE(SUM(CASE WHEN tipo='GANANCIA' THEN monto ELSE 0 END),0) - COALESCE(SUM(CASE WHEN tipo='GASTO' THEN monto ELSE 0 END),0) FROM resumen_mensual WHERE mes=%s AND moneda='ARS'", (ma,))
                 saldo = c.fetchone()[0] or 0.0
                 c.execute("SELECT id FROM movimientos WHERE mes=%s AND tipo_gasto='Ahorro Mes Anterior'", (ms,))
                 r = c.fetchone()
                 if r: c.execute("UPDATE movimientos SET monto=%s, pagado=TRUE WHERE id=%s", (saldo, r[0]))
                 else: c.execute("INSERT INTO movimientos (fecha, mes, tipo, grupo, tipo_gasto, cuota, monto, moneda, forma_pago, fecha_pago, pagado) VALUES (%s,%s,'GANANCIA','AHORRO MANUEL','Ahorro Mes Anterior','1/1',%s,'ARS','Automático',%s, TRUE)", (str(datetime.date.today()), ms, saldo, str(datetime.date.today())))
-                conn.commit()
+            conn.commit()  # una transaccion para los 24 meses
     except: pass
 
-@st.cache_data(ttl=60)
+@cacheado("dolar", ttl=60)  # una consulta por host y minuto, no una por proceso
+@medido("dolarapi")
 def get_dolar():
-    try: return (float(requests.get("https://dolarapi.com/v1/dolares/blue", timeout=3).json()['compra']) + float(requests.get("https://dolarapi.com/v1/dolares/blue", timeout=3).json()['venta'])) / 2, "(Ref)"
+    try:
+        d = requests.get("https://dolarapi.com/v1/dolares/blue", timeout=3).json()
+        v = (float(d['compra']) + float(d['venta'])) / 2
     except: return 1480.0, "(Ref)"
+    registrar_cotizacion(v)  # historial para la conversion as-of
+    return v, "(Ref)"
+
+
+def generar_recurrentes(meses):
+    """Crea en cada mes abierto los recurrentes activos que falten (mismo concepto y grupo). Devuelve cuantos
+    se crearon, o None si no hay recurrentes activos. Una lectura y un executemany para todos los meses."""
+    with db_connection() as conn:
+        rec = pd.read_sql("SELECT * FROM recurrentes WHERE activo=TRUE", conn)
+        if rec.empty: return None
+        c = conn.cursor()
+        abiertos = set(LISTA_MESES_LARGA[ultimo_cerrado(c) + 1:]); meses = [m for m in meses if m in abiertos]
+        c.execute("SELECT mes, tipo_gasto, grupo FROM movimientos WHERE mes = ANY(%s)", (list(meses),))
+        existentes, hoy, filas = set(c.fetchall()), str(datetime.date.today()), []
+        for m in meses:
+            for r in rec.to_dict("records"):
+                if (m, r['tipo_gasto'], r['grupo']) in existentes: continue
+                existentes.add((m, r['tipo_gasto'], r['grupo']))
+                filas.append((hoy, m, r['tipo'], r['grupo'], r['tipo_gasto'], r['contrato'], float(r['monto']), r['moneda'], r['forma_pago'], hoy))
+        c.executemany("INSERT INTO movimientos (fecha,mes,tipo,grupo,tipo_gasto,contrato,cuota,monto,moneda,forma_pago,fecha_pago,pagado) VALUES (%s,%s,%s,%s,%s,%s,'1/1',%s,%s,%s,%s,FALSE)", filas)
+        conn.commit()
+    return len(filas)
+
+
+def generar_excel():
+    return _excel(versiones_movimientos(), base_actual())
+
+
+@cacheado("exportes", ttl=86400)
+def _excel(versiones, base):
+    # `versiones` (por mes) y la base son la clave: cualquier alta, baja o cambio en movimientos genera otro archivo
+    with db_connection() as conn:
+        df_excel = pd.read_sql("SELECT * FROM movimientos ORDER BY mes, tipo, grupo", conn)
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df_excel.to_excel(writer, sheet_name='Todos', index=False)
+        for mes in df_excel['mes'].unique():
+            sheet_name = mes[:31]  # Excel max 31 chars
+            df_excel[df_excel['mes'] == mes].to_excel(writer, sheet_name=sheet_name, index=False)
+    return output.getvalue()
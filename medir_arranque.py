@@ -0,0 +1,81 @@
+"""Mide el costo de importacion de las dependencias pesadas y el arranque en frio de la app.
+
+Cada medicion corre en un interprete nuevo. Uso:
+    python medir_arranque.py [--repeticiones 3] [--json resultados.json] [--max-dashboard 4.0]
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+MODULOS = ["streamlit", "pandas", "numpy", "plotly.express", "plotly.graph_objects", "sklearn.linear_model",
+           "google.generativeai", "openpyxl", "pyarrow", "psycopg2", "streamlit_lottie", "requests"]
+
+# Corre app.py con AppTest (sesion ya logueada) y marca cuando termina de dibujarse el dashboard
+_ARRANQUE = """
+import sys, time, json; t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from streamlit.testing.v1 import AppTest
+import tabs.dashboard as dashboard
+marcas, _render = {}, dashboard.render
+def render(*a, **k):
+    r = _render(*a, **k); marcas.setdefault("dashboard", time.perf_counter() - t0); return r
+dashboard.render = render
+at = AppTest.from_file(sys.argv[2], default_timeout=300)
+at.session_state["logged_in"] = True; at.session_state["username"] = "admin"
+at.run(); marcas["total"] = time.perf_counter() - t0
+marcas["modulos"] = len(sys.modules); marcas["excepciones"] = [str(e.value) for e in at.exception]
+print("@@" + json.dumps(marcas))
+"""
+
+
+def tiempo_importacion(modulo):
+    """Tiempo acumulado (s) de `import modulo` en frio segun -X importtime; None si no esta instalado."""
+    p = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {modulo}"], capture_output=True, text=True, cwd=BASE)
+    if p.returncode != 0: return None
+    for linea in reversed(p.stderr.splitlines()):
+        m = re.match(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*(\S+)", linea)
+        if m and m.group(2) == modulo: return int(m.group(1)) / 1e6
+    return None
+
+
+def arranque_en_frio():
+    p = subprocess.run([sys.executable, "-c", _ARRANQUE, BASE, os.path.join(BASE, "app.py")], capture_output=True, text=True, cwd=BASE)
+    linea = next((l for l in p.stdout.splitlines() if l.startswith("@@")), None)
+    if linea is None: raise RuntimeError(p.stderr[-2000:])
+    return json.loads(linea[2:])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--repeticiones", type=int, default=3)
+    ap.add_argument("--json", help="guardar resultados en este archivo")
+    ap.add_argument("--max-dashboard", type=float, help="falla (exit 1) si la mediana hasta el dashboard supera estos segundos")
+    args = ap.parse_args()
+
+    print("== Importacion en frio (s) ==")
+    imports = {m: tiempo_importacion(m) for m in MODULOS}
+    for m, t in sorted(imports.items(), key=lambda x: -(x[1] or 0)):
+        print(f"  {m:<24} {'no instalado' if t is None else f'{t:6.3f}'}")
+
+    print(f"== Arranque en frio de app.py ({args.repeticiones} corridas) ==")
+    corridas = [arranque_en_frio() for _ in range(args.repeticiones)]
+    for c in corridas:
+        if c["excepciones"]: print("  excepciones:", c["excepciones"])
+    res = {"importacion": imports, "corridas": corridas,
+           "dashboard_mediana": statistics.median(c.get("dashboard", c["total"]) for c in corridas),
+           "total_mediana": statistics.median(c["total"] for c in corridas)}
+    print(f"  hasta dashboard: {res['dashboard_mediana']:.2f} s | corrida completa: {res['total_mediana']:.2f} s | modulos cargados: {corridas[-1]['modulos']}")
+
+    if args.json:
+        with open(args.json, "w") as f: json.dump(res, f, indent=2)
+    if args.max_dashboard and res["dashboard_mediana"] > args.max_dashboard:
+        print(f"FALLA: {res['dashboard_mediana']:.2f} s > {args.max_dashboard} s"); sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
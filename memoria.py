@@ -0,0 +1,73 @@
+import os
+import sys
+import pandas as pd
+
+# --- IMPORTACION SEGURA DE PSUTIL (solo para el RSS del reporte) ---
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+# --- COPY-ON-WRITE ---
+# En pandas >= 3 siempre esta activo; en 2.x se enciende aca. Con CoW un filtro o un copy(deep=False)
+# comparte los datos hasta que alguien escribe, asi las copias defensivas sobran.
+if int(pd.__version__.split(".")[0]) < 3: pd.set_option("mode.copy_on_write", True)
+
+# --- LIBRO COMPACTO EN MEMORIA ---
+# Pocas categorias repetidas en cientos de miles de filas: como category cada celda ocupa 1-2 bytes
+# en lugar de un objeto str. Las fechas se parsean una vez (datetime64) y no en cada consumidor.
+CATEGORICAS = ["mes", "tipo", "grupo", "moneda", "forma_pago", "cuota"]
+FECHAS = ["fecha", "fecha_pago"]
+
+
+def compactar(df):
+    """Tipos compactos para movimientos: category, id int32, plan_id Int32, pagado boolean y fechas datetime64."""
+    tipos = {c: "category" for c in CATEGORICAS if c in df.columns}
+    if "id" in df.columns: tipos["id"] = "int32"
+    if "pagado" in df.columns: tipos["pagado"] = "boolean"
+    if "plan_id" in df.columns: tipos["plan_id"] = "Int32"
+    if "monto" in df.columns: tipos["monto"] = "float64"
+    out = df.astype(tipos)
+    for c in FECHAS:
+        if c in out.columns and not pd.api.types.is_datetime64_any_dtype(out[c]):
+            out[c] = pd.to_datetime(out[c].astype("string").str[:10], format="%Y-%m-%d", errors="coerce")
+    return out
+
+
+def unir(base, nuevos):
+    """Concatena filas nuevas (sin compactar) a un libro compacto conservando las categorias."""
+    nuevos = compactar(nuevos)
+    for c in base.columns:
+        if isinstance(base[c].dtype, pd.CategoricalDtype) and c in nuevos.columns:
+            cats = base[c].cat.categories.union(nuevos[c].cat.categories)
+            base = base.assign(**{c: base[c].cat.set_categories(cats)})
+            nuevos = nuevos.assign(**{c: nuevos[c].cat.set_categories(cats)})
+    if nuevos.empty: return base.reset_index(drop=True)
+    return pd.concat([base, nuevos], ignore_index=True)
+
+
+# --- REPORTE ---
+def tamano(obj):
+    """Bytes aproximados de un objeto (profundo para DataFrame/Series)."""
+    if isinstance(obj, pd.DataFrame): return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series): return int(obj.memory_usage(deep=True))
+    if isinstance(obj, (list, tuple, set)): return sys.getsizeof(obj) + sum(tamano(x) for x in obj)
+    if isinstance(obj, dict): return sys.getsizeof(obj) + sum(tamano(v) for v in obj.values())
+    return sys.getsizeof(obj)
+
+
+def rss_mb():
+    return psutil.Process(os.getpid()).memory_info().rss / 2**20 if HAS_PSUTIL else None
+
+
+def reporte_columnas(df):
+    """MB y dtype por columna, de mayor a menor."""
+    mem = df.memory_usage(deep=True, index=False)
+    return pd.DataFrame({"Columna": mem.index, "Tipo": [str(df[c].dtype) for c in mem.index], "MB": (mem.values / 2**20).round(3)}).sort_values("MB", ascending=False)
+
+
+def reporte_sesion(estado):
+    """MB por clave de session_state (solo las que pesan mas de 1 KB)."""
+    filas = [(str(k), tamano(v) / 2**20) for k, v in estado.items()]
+    return pd.DataFrame([(k, round(mb, 3)) for k, mb in filas if mb > 1 / 1024], columns=["Clave", "MB"]).sort_values("MB", ascending=False)
@@ -0,0 +1,108 @@
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from db import db_connection, usa_sqlite, POOL_MAX
+from snapshot import cargar_movimientos
+from cotizaciones import leer_cotizaciones
+from resumen import leer_resumen
+from cierres import leer_cierres
+from logic import get_dolar
+from perfil import tramo, en_corrida
+
+# --- PREFETCH DE LA PAGINA ---
+# Las lecturas de un rerun no dependen entre si: se lanzan juntas en un pool de hilos, cada una con
+# su conexion del pool de la base, y la carga tarda lo que la mas lenta en lugar de la suma. Solo
+# se piden las de la seccion visible. Los fragmentos que escriben (pagos, presupuestos) guardan su
+# copia en session_state y la refrescan desde su callback con leer().
+HILOS = max(1, min(8, POOL_MAX - 2))  # dos conexiones del pool quedan para el hilo del script y otras sesiones
+
+
+def _consulta(sql):
+    def leer():
+        with db_connection() as conn: return pd.read_sql(sql, conn)
+    return leer
+
+
+def _movimientos():
+    df, version = cargar_movimientos()
+    return {"movimientos": df, "version_cambios": version}
+
+
+def _dolar():
+    valor, info = get_dolar()
+    return {"dolar_val": valor, "dolar_info": info}
+
+
+LECTURAS = {
+    "dolar": _dolar,
+    "movimientos": _movimientos,
+    "grupos": lambda: _consulta("SELECT nombre FROM grupos ORDER BY nombre ASC")()["nombre"].tolist(),
+    "cotizaciones": leer_cotizaciones,
+    "resumen": leer_resumen,
+    "cierres": leer_cierres,
+    "presupuestos": _consulta("SELECT * FROM presupuestos ORDER BY grupo"),
+    "recurrentes": _consulta("SELECT * FROM recurrentes WHERE activo=TRUE ORDER BY grupo, tipo_gasto"),
+    "inversiones": _consulta("SELECT * FROM inversiones WHERE estado='ACTIVA' ORDER BY fecha_inicio DESC"),
+    "deudas": _consulta("SELECT * FROM deudas WHERE estado='ACTIVA'"),
+    # Todos los pagos de deudas de una vez; cada tarjeta filtra los suyos (antes, dos consultas por deuda)
+    "pagos_deudas": _consulta("SELECT fecha, monto, moneda, forma_pago, mes, tipo_gasto FROM movimientos WHERE grupo='DEUDAS' ORDER BY fecha DESC"),
+}
+COMUNES = ["dolar", "movimientos", "grupos", "cierres"]  # cierres: el alta y los editores no escriben en meses cerrados
+
+
+@dataclass
+class DatosPagina:
+    dolar_val: float = None
+    dolar_info: str = ""
+    movimientos: pd.DataFrame = None
+    version_cambios: int = 0
+    grupos: list = None
+    cotizaciones: pd.DataFrame = None
+    resumen: pd.DataFrame = None
+    cierres: pd.DataFrame = None
+    presupuestos: pd.DataFrame = None
+    recurrentes: pd.DataFrame = None
+    inversiones: pd.DataFrame = None
+    deudas: pd.DataFrame = None
+    pagos_deudas: pd.DataFrame = None
+
+
+_pool = None
+_lock_pool = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _lock_pool:
+        if _pool is None: _pool = ThreadPoolExecutor(max_workers=HILOS, thread_name_prefix="prefetch")
+    return _pool
+
+
+def leer(nombre):
+    """Una lectura suelta (p. ej. desde un callback, para refrescar la copia de un fragmento)."""
+    return LECTURAS[nombre]()
+
+
+def prefetch(nombres, en_paralelo=None):
+    """Corre las lecturas pedidas (mas las comunes) y devuelve un DatosPagina. En SQLite (archivo local,
+    sin latencia que solapar) van en serie salvo que se pida lo contrario."""
+    if en_paralelo is None: en_paralelo = not usa_sqlite()
+    ctx = get_script_run_ctx()
+
+    def tarea(nombre):
+        # El contexto del script evita los avisos de st.cache_data fuera del hilo de Streamlit
+        if ctx: add_script_run_ctx(threading.current_thread(), ctx)
+        with tramo(nombre, "db"): return LECTURAS[nombre]()
+
+    nombres = list(dict.fromkeys(COMUNES + list(nombres)))
+    if en_paralelo: futuros = {n: _get_pool().submit(en_corrida(tarea), n) for n in nombres}
+    else: futuros = {n: None for n in nombres}
+    datos = DatosPagina()
+    for n, f in futuros.items():
+        r = f.result() if f else tarea(n)
+        if isinstance(r, dict):
+            for k, v in r.items(): setattr(datos, k, v)
+        else: setattr(datos, n, r)
+    return datos
@@ -0,0 +1,161 @@
+import io
+import os
+import time
+import marshal
+import pstats
+import cProfile
+import datetime
+import threading
+import functools
+import collections
+from contextlib import contextmanager
+
+# --- PERFIL POR RERUN ---
+# Cada corrida de app.py registra tramos (inicio relativo, duracion, nivel de anidamiento) en una
+# lista por hilo: Streamlit corre cada rerun en su propio hilo, y fuera de una corrida (tests,
+# benchmark.py, cli.py) los tramos no cuestan nada. Las ultimas corridas quedan en la sesion para
+# el panel. Streamlit se importa solo en las funciones que lo usan: cli.py corre sin cargarlo.
+MAX_CORRIDAS = 20
+ADMINS = set(os.environ.get("PERFIL_ADMINS", "admin").split(","))
+COLORES_TIPO = {"fase": "#4c78a8", "seccion": "#72b7b2", "db": "#f58518", "red": "#e45756", "cpu": "#54a24b"}
+_local = threading.local()
+
+
+def iniciar_corrida():
+    """Abre la corrida del rerun actual. Si se pidio, la perfila completa con cProfile."""
+    import streamlit as st
+    corridas = st.session_state.setdefault("perfil_corridas", collections.deque(maxlen=MAX_CORRIDAS))
+    # Un rerun cortado por st.rerun()/st.stop() no llega a cerrar_corrida: se vuelca su perfil aca
+    if corridas and corridas[-1].get("perfilador"): _volcar(corridas[-1])
+    c = {"hora": datetime.datetime.now().strftime("%H:%M:%S"), "t0": time.perf_counter(), "tramos": [], "total": None}
+    corridas.append(c)
+    _local.corrida, _local.nivel = c, 0
+    if st.session_state.pop("perfil_capturar", False):
+        c["perfilador"] = cProfile.Profile(); c["perfilador"].enable()
+    return c
+
+
+def cerrar_corrida():
+    c = getattr(_local, "corrida", None)
+    if c is None: return
+    c["total"] = time.perf_counter() - c["t0"]
+    if c.get("perfilador"): _volcar(c)
+    _local.corrida = None
+
+
+def _volcar(c):
+    prof = c.pop("perfilador"); prof.disable(); prof.create_stats()
+    c["perfil"] = marshal.dumps(prof.stats)  # mismo formato que pstats.dump_stats (.prof)
+    txt = io.StringIO()
+    pstats.Stats(prof, stream=txt).sort_stats("cumulative").print_stats(40)
+    c["perfil_txt"] = txt.getvalue()
+
+
+@contextmanager
+def tramo(nombre, tipo="fase"):
+    c = getattr(_local, "corrida", None)
+    if c is None:
+        yield; return
+    nivel = _local.nivel; _local.nivel += 1; t = time.perf_counter()
+    try: yield
+    finally:
+        _local.nivel = nivel
+        c["tramos"].append({"nombre": nombre, "tipo": tipo, "inicio": t - c["t0"], "duracion": time.perf_counter() - t, "nivel": nivel})
+
+
+def en_corrida(fn):
+    """Envuelve `fn` para que sus tramos caigan en la corrida actual aunque se ejecute en otro hilo."""
+    c, nivel = getattr(_local, "corrida", None), getattr(_local, "nivel", 0)
+    @functools.wraps(fn)
+    def envuelta(*args, **kwargs):
+        _local.corrida, _local.nivel = c, nivel
+        try: return fn(*args, **kwargs)
+        finally: _local.corrida = None
+    return envuelta
+
+
+def medido(nombre=None, tipo="red"):
+    """Decorador: registra cada llamada como un tramo (por defecto, llamada externa)."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def envuelta(*args, **kwargs):
+            with tramo(nombre or fn.__name__, tipo): return fn(*args, **kwargs)
+        return envuelta
+    return deco
+
+
+# --- PANEL (solo admin) ---
+def _cascada(c):
+    import plotly.graph_objects as go
+    tramos = sorted(c["tramos"], key=lambda t: t["inicio"])
+    etiquetas = [f"{i:02d} {'· ' * t['nivel']}{t['nombre']}" for i, t in enumerate(tramos)]
+    fig = go.Figure()
+    for tipo in dict.fromkeys(t["tipo"] for t in tramos):
+        idx = [i for i, t in enumerate(tramos) if t["tipo"] == tipo]
+        fig.add_trace(go.Bar(
+            y=[etiquetas[i] for i in idx], x=[tramos[i]["duracion"] * 1000 for i in idx], base=[tramos[i]["inicio"] * 1000 for i in idx],
+            orientation="h", name=tipo, marker_color=COLORES_TIPO.get(tipo), hovertemplate="%{y}<br>%{base:.0f} ms + %{x:.1f} ms<extra></extra>"))
+    fig.update_layout(height=max(200, 22 * len(tramos) + 60), margin=dict(l=10, r=10, t=10, b=10), barmode="overlay", legend=dict(orientation="h"),
+                      yaxis=dict(autorange="reversed", categoryorder="array", categoryarray=etiquetas), xaxis_title="ms desde el inicio del rerun")
+    return fig
+
+
+def panel_memoria(df_all):
+    import streamlit as st
+    from memoria import rss_mb, tamano, reporte_columnas, reporte_sesion
+    with st.expander("🧠 Memoria", expanded=False):
+        rss = rss_mb()
+        c1, c2 = st.columns(2)
+        c1.metric("Proceso (RSS)", f"{rss:,.0f} MB" if rss is not None else "s/d")
+        c2.metric("Libro de movimientos", f"{tamano(df_all) / 2**20:,.1f} MB", help="Uno por proceso, compartido por todas las sesiones")
+        st.dataframe(reporte_columnas(df_all), hide_index=True, use_container_width=True)
+        st.caption("Esta sesión (session_state):")
+        st.dataframe(reporte_sesion(st.session_state), hide_index=True, use_container_width=True)
+
+
+def panel_cache():
+    import streamlit as st
+    from cache_disco import estadisticas, vaciar
+    with st.expander("💾 Caché en disco", expanded=False):
+        st.dataframe(estadisticas(), hide_index=True, use_container_width=True)
+        if st.button("Vaciar caché", key="cache_vaciar"): vaciar(); st.rerun()
+
+
+def panel_pool():
+    import streamlit as st
+    from db import estadisticas_pool
+    with st.expander("🔌 Pool de conexiones", expanded=False):
+        e = estadisticas_pool()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("En uso / pico", f"{e['en_uso']} / {e['pico']}", help=f"Tope del pool: {e['tope']} (DB_POOL_MAX)")
+        c2.metric("Pedidas", f"{e['pedidas']:,}")
+        c3.metric("Pool agotado", e["agotado"], help="Veces que se abrió una conexión directa por falta de lugar")
+        c4.metric("Espera p95", f"{e['espera_p95_ms']:.1f} ms", help=f"p50 {e['espera_p50_ms']:.1f} ms · máx {e['espera_max_ms']:.1f} ms")
+        if st.button("Reiniciar contadores", key="pool_reiniciar"): estadisticas_pool(reiniciar=True); st.rerun()
+
+
+def panel_perfil(df_all=None):
+    import streamlit as st
+    if st.session_state.get("username") not in ADMINS: return
+    if df_all is not None: panel_memoria(df_all)
+    panel_cache()
+    panel_pool()
+    corridas = [c for c in st.session_state.get("perfil_corridas", []) if c["total"] is not None]
+    with st.expander("⏱️ Perfil de reruns", expanded=False):
+        if st.button("Perfilar próximo rerun (cProfile)", key="perfil_btn"):
+            st.session_state["perfil_capturar"] = True; st.rerun()
+        if not corridas: st.caption("Sin corridas completas todavía."); return
+        etiquetas = {f"{c['hora']} · {c['total']:.2f} s{' · cProfile' if 'perfil' in c else ''}": c for c in reversed(corridas)}
+        c = etiquetas[st.selectbox("Rerun", list(etiquetas), key="perfil_sel")]
+        if st.toggle("Ver cascada", key="perfil_cascada"):
+            st.plotly_chart(_cascada(c), use_container_width=True)
+        # Resumen de las ultimas corridas: mediana por tramo de primer nivel
+        fases = collections.defaultdict(list)
+        for x in corridas:
+            for t in x["tramos"]:
+                if t["nivel"] == 0: fases[t["nombre"]].append(t["duracion"] * 1000)
+        st.dataframe([{"Tramo": k, "Mediana (ms)": round(sorted(v)[len(v) // 2], 1), "Máx (ms)": round(max(v), 1), "N": len(v)} for k, v in fases.items()],
+                     hide_index=True, use_container_width=True)
+        if "perfil" in c:
+            st.download_button("Descargar .prof", c["perfil"], file_name=f"rerun_{c['hora'].replace(':', '')}.prof", mime="application/octet-stream")
+            st.code(c["perfil_txt"][:6000], language="text")
@@ -0,0 +1,106 @@
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+from config import MESES_NOMBRES, LISTA_MESES_LARGA
+from utils import formato_moneda_visual, tasas_asof
+
+# --- PRESUPUESTOS: GASTADO VS LIMITE POR GRUPO Y MES ---
+# Una pasada vectorizada sobre el libro (gastos en ARS, USD a la cotizacion de su fecha de pago)
+# arma la tabla grupo x mes de todos los meses. Para el mes en curso se proyecta el cierre: lo
+# comprometido (pagado + pendiente con fecha_pago en el mes) o el ritmo diario de lo pagado hasta
+# hoy extendido a fin de mes, lo que sea mayor. En meses cerrados la proyeccion es lo gastado.
+# La tabla se guarda por proceso con la version del log de cambios: solo se recalcula si cambiaron
+# los movimientos, los limites, el dolar o el dia.
+CERCA = 0.8
+COLUMNAS = ["mes", "grupo", "limite", "pagado", "pendiente", "gastado", "proyectado", "pct", "pct_proyectado", "estado"]
+_memoria = {"clave": None, "tabla": None}
+_lock_memoria = threading.Lock()
+
+
+def _calendario(meses, hoy):
+    """Dias del mes y dias transcurridos a `hoy` (0 en meses futuros, todos en los pasados)."""
+    partes = meses.str.split(" ", n=1, expand=True)
+    inicio = pd.to_datetime(pd.DataFrame({"year": partes[1].astype(int), "month": partes[0].map(MESES_NOMBRES.index) + 1, "day": 1}))
+    dias = inicio.dt.days_in_month.to_numpy()
+    transcurridos = np.clip((pd.Timestamp(hoy) - inicio).dt.days.to_numpy() + 1, 0, dias)
+    return dias, transcurridos
+
+
+def _estado(pct, pct_proy):
+    return np.select([pct >= 1, pct_proy >= 1, pct >= CERCA], ["EXCEDIDO", "EN RIESGO", "CERCA"], "OK")
+
+
+def _limites(pres, dolar_val):
+    """grupo -> limite en ARS (los limites en USD al dolar de hoy)."""
+    lim = pres["limite"].astype(float).to_numpy()
+    usd = (pres["moneda"].fillna("ARS") == "USD").to_numpy() if "moneda" in pres.columns else False
+    return pd.DataFrame({"grupo": pres["grupo"].to_numpy(), "limite": np.where(usd, lim * dolar_val, lim)})
+
+
+def calcular(df, pres, dolar_val, cot=None, hoy=None):
+    """Tabla mes x grupo (solo grupos con limite) con lo gastado, la proyeccion al cierre y el estado."""
+    hoy = hoy or datetime.date.today()
+    if pres is None or pres.empty or df.empty: return pd.DataFrame(columns=COLUMNAS)
+    g = df[(df["tipo"] == "GASTO") & df["grupo"].isin(pres["grupo"]) & df["mes"].isin(LISTA_MESES_LARGA)]
+    monto = g["monto"].to_numpy(dtype=float)
+    usd = (g["moneda"] == "USD").to_numpy()
+    if usd.any(): monto = np.where(usd, monto * tasas_asof(g["fecha_pago"], cot, dolar_val), monto)
+    pagado = g["pagado"].fillna(False).to_numpy(dtype=bool)
+    t = pd.DataFrame({"mes": g["mes"].astype(str).to_numpy(), "grupo": g["grupo"].astype(str).to_numpy(),
+                      "pagado": np.where(pagado, monto, 0.0), "pendiente": np.where(pagado, 0.0, monto)})
+    t = t.groupby(["mes", "grupo"], as_index=False, sort=False).sum()
+    t = t.merge(_limites(pres, dolar_val), on="grupo")
+    if t.empty: return pd.DataFrame(columns=COLUMNAS)
+    t["gastado"] = t["pagado"] + t["pendiente"]
+    dias, trans = _calendario(t["mes"], hoy)
+    ritmo = np.divide(t["pagado"].to_numpy(), trans, out=np.zeros(len(t)), where=trans > 0)
+    t["proyectado"] = np.maximum(t["gastado"].to_numpy(), t["pagado"].to_numpy() + ritmo * (dias - trans))
+    limite = t["limite"].to_numpy()
+    t["pct"] = np.divide(t["gastado"].to_numpy(), limite, out=np.zeros(len(t)), where=limite > 0)
+    t["pct_proyectado"] = np.divide(t["proyectado"].to_numpy(), limite, out=np.zeros(len(t)), where=limite > 0)
+    t["estado"] = _estado(t["pct"].to_numpy(), t["pct_proyectado"].to_numpy())
+    orden = t["mes"].map(LISTA_MESES_LARGA.index)
+    return t.assign(_o=orden).sort_values(["_o", "grupo"]).drop(columns="_o").reset_index(drop=True)[COLUMNAS]
+
+
+def tabla_presupuestos(df, pres, dolar_val, cot=None, version=None):
+    """calcular() memorizado por proceso; con `version` None (sin log de cambios) siempre recalcula."""
+    hoy = datetime.date.today()
+    huella = (None if cot is None or cot.empty else (len(cot), cot["fecha"].iloc[-1], float(cot["valor"].iloc[-1])))
+    clave = None if version is None or pres is None else (version, tuple(_limites(pres, dolar_val).itertuples(index=False)), dolar_val, hoy, huella)
+    with _lock_memoria:
+        if clave is not None and _memoria["clave"] == clave: return _memoria["tabla"]
+    tabla = calcular(df, pres, dolar_val, cot, hoy)
+    with _lock_memoria: _memoria.update(clave=clave, tabla=tabla)
+    return tabla
+
+
+def del_mes(tabla, pres, mes, dolar_val):
+    """Una fila por presupuesto para `mes`, en el orden de `pres` (los grupos sin gastos en cero)."""
+    t = _limites(pres, dolar_val).merge(tabla[tabla["mes"] == mes].drop(columns="limite"), on="grupo", how="left")
+    t = t.fillna({c: 0.0 for c in ["pagado", "pendiente", "gastado", "proyectado", "pct", "pct_proyectado"]}).fillna({"mes": mes, "estado": "OK"})
+    return t[COLUMNAS]
+
+
+def excesos(tabla):
+    """Solo las filas excedidas o en riesgo."""
+    return tabla[tabla["estado"].isin(["EXCEDIDO", "EN RIESGO"])]
+
+
+def historial(tabla):
+    """% gastado del limite, grupo x mes en orden cronologico (para el mapa de calor)."""
+    if tabla.empty: return pd.DataFrame()
+    h = tabla.pivot(index="grupo", columns="mes", values="pct")
+    return h[sorted(h.columns, key=LISTA_MESES_LARGA.index)]
+
+
+def alertas_presupuesto(tabla, mes):
+    """Avisos del mes: excedidos y los que, al ritmo actual, se van a exceder antes del cierre."""
+    mensajes = []
+    for r in excesos(tabla[tabla["mes"] == mes]).to_dict("records"):
+        if r["estado"] == "EXCEDIDO":
+            mensajes.append(f"📊 **Presupuesto excedido:** {r['grupo']} ({formato_moneda_visual(r['gastado'], 'ARS')} de {formato_moneda_visual(r['limite'], 'ARS')})")
+        else:
+            mensajes.append(f"📈 **Presupuesto en riesgo:** {r['grupo']} proyecta {formato_moneda_visual(r['proyectado'], 'ARS')} al cierre ({r['pct_proyectado']:.0%} del límite)")
+    return mensajes
@@ -0,0 +1,52 @@
+"""Resumen mensual de movimientos (tabla resumen_mensual, mantenida por triggers).
+
+Verificacion y reconstruccion desde la linea de comandos:
+    python resumen.py               # compara con las filas; exit 1 si hay diferencias
+    python resumen.py --reconstruir # recalcula la tabla completa
+"""
+import sys
+import argparse
+import pandas as pd
+from db import db_connection, init_db, sql_agregar_resumen, reconstruir_resumen
+
+CLAVE = ["mes", "tipo", "moneda", "grupo", "fecha_pago"]
+TOLERANCIA = 0.005
+
+
+def leer_resumen():
+    """Filas pre-agregadas con las columnas de movimientos que usan los agregados (mes, tipo, moneda, grupo, fecha_pago, monto, n)."""
+    with db_connection() as conn:
+        return pd.read_sql(f"SELECT {', '.join(CLAVE)}, monto, n FROM resumen_mensual", conn)
+
+
+def diferencias_resumen():
+    """Claves donde la tabla no coincide con el agregado de las filas (monto fuera de tolerancia o distinta cantidad)."""
+    with db_connection() as conn:
+        tabla = pd.read_sql(f"SELECT {', '.join(CLAVE)}, monto, n FROM resumen_mensual", conn)
+        filas = pd.read_sql(sql_agregar_resumen("SELECT *, 1 AS s FROM movimientos"), conn)
+    filas.columns = CLAVE + ["monto", "n"]
+    m = tabla.merge(filas, on=CLAVE, how="outer", suffixes=("", "_filas")).fillna({"monto": 0.0, "n": 0, "monto_filas": 0.0, "n_filas": 0})
+    malas = (m["n"] != m["n_filas"]) | ((m["monto"] - m["monto_filas"]).abs() > TOLERANCIA + 1e-9 * m["monto_filas"].abs())
+    return m[malas].reset_index(drop=True)
+
+
+def reconstruir():
+    with db_connection() as conn:
+        reconstruir_resumen(conn.cursor()); conn.commit()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--reconstruir", action="store_true", help="recalcular la tabla desde movimientos")
+    args = ap.parse_args()
+    init_db()
+    if args.reconstruir:
+        reconstruir(); print("resumen_mensual reconstruido")
+    dif = diferencias_resumen()
+    if dif.empty: print("resumen_mensual coincide con movimientos"); return
+    print(dif.to_string(index=False))
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
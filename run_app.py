@@ -9,6 +9,10 @@ def resolve_path(path):
     return os.path.join(basedir, path)
 
 if __name__ == "__main__":
+    # El ejecutable de escritorio usa la base SQLite local salvo que se pida Postgres (DB_BACKEND=postgres)
+    if getattr(sys, 'frozen', False):
+        os.environ.setdefault("DB_BACKEND", "sqlite")
+
     # Apuntamos al archivo principal de tu app
     app_path = resolve_path("app.py")
     
@@ -1,4 +1,5 @@
 # -*- mode: python ; coding: utf-8 -*-
+import sys
 
 
 a = Analysis(
@@ -6,7 +7,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('app.py', '.'), ('.env', '.')],
-    hiddenimports=['pandas', 'plotly', 'psycopg2'],
+    hiddenimports=['email', 'email.mime.text', 'email.mime.multipart', 'email.mime.base', 'smtplib', 'pandas', 'plotly', 'psycopg2', 'sqlite3', 'sklearn', 'dotenv', 'streamlit_lottie', 'streamlit.web.server', 'streamlit.runtime.scriptrunner.magic_funcs'],
     hookspath=['./hooks'],
     hooksconfig={},
     runtime_hooks=[],
@@ -16,12 +17,16 @@ a = Analysis(
 )
 pyz = PYZ(a.pure)
 
+# Igual que build.py: "pyinstaller run_app.spec -- --onedir" arma la carpeta descomprimida
+# (arranca mas rapido); sin argumentos, el ejecutable unico.
+ONEDIR = '--onedir' in sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else False
+
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
+    *([] if ONEDIR else [a.binaries, a.datas]),
     [],
+    exclude_binaries=ONEDIR,
     name='run_app',
     debug=False,
     bootloader_ignore_signals=False,
@@ -36,3 +41,5 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+if ONEDIR:
+    coll = COLLECT(exe, a.binaries, a.datas, strip=False, upx=True, upx_exclude=[], name='run_app')
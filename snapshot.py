@@ -0,0 +1,142 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import threading
+import pandas as pd
+from db import db_connection, versiones_movimientos
+from cambios import version_actual, leer_cambios, aplicar_cambios
+from memoria import compactar
+
+logger = logging.getLogger(__name__)
+
+# --- IMPORTACION SEGURA DE ARROW ---
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+# --- SNAPSHOT COLUMNAR DE MOVIMIENTOS ---
+# Copia local de movimientos en formato Arrow IPC. Las versiones por mes (tabla movimientos_version)
+# van en la metadata del archivo: al cargar solo se releen de Postgres los meses que cambiaron.
+# Cada refresco escribe un archivo nuevo y actualiza el puntero ACTUAL; asi un proceso que tiene
+# mapeado el anterior (Windows no deja reemplazarlo) sigue leyendo datos consistentes.
+# Cada base tiene su subdirectorio: dos bases con los mismos numeros de version no comparten archivo.
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(os.path.expanduser("~"), ".contabilidad_v5", "snapshot"))
+PUNTERO = "ACTUAL"
+CLAVE_VERSIONES = b"versiones"
+TIPOS_ARROW = {"id": "int64", "monto": "float64", "pagado": "bool_", "plan_id": "int64"}
+
+
+def _tipo(col):
+    return getattr(pa, TIPOS_ARROW.get(col, "string"))()
+
+
+def _a_tabla(df):
+    schema = pa.schema([(col, _tipo(col)) for col in df.columns])
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def _base():
+    return os.environ.get("DATABASE_URL", "") + os.environ.get("DB_BACKEND", "")
+
+
+def _dir():
+    return os.path.join(SNAPSHOT_DIR, hashlib.sha1(_base().encode()).hexdigest()[:10])
+
+
+def _ruta_actual():
+    try:
+        with open(os.path.join(_dir(), PUNTERO)) as f: nombre = f.read().strip()
+    except OSError: return None
+    ruta = os.path.join(_dir(), nombre)
+    return ruta if nombre and os.path.exists(ruta) else None
+
+
+def _abrir(ruta):
+    """Mapea el archivo en memoria; las columnas numericas sin nulos quedan sin copiar."""
+    tabla = pa.ipc.open_file(pa.memory_map(ruta, "r")).read_all()
+    meta = tabla.schema.metadata or {}
+    versiones = json.loads(meta.get(CLAVE_VERSIONES, b"{}"))
+    return tabla, versiones
+
+
+def _escribir(tabla, versiones):
+    d = _dir(); os.makedirs(d, exist_ok=True)
+    nombre = f"movimientos-{uuid.uuid4().hex}.arrow"
+    tabla = tabla.replace_schema_metadata({CLAVE_VERSIONES: json.dumps(versiones).encode()})
+    with pa.OSFile(os.path.join(d, nombre), "wb") as f, pa.ipc.new_file(f, tabla.schema) as w: w.write_table(tabla)
+    tmp = os.path.join(d, f"{PUNTERO}.{uuid.uuid4().hex}")
+    with open(tmp, "w") as f: f.write(nombre)
+    os.replace(tmp, os.path.join(d, PUNTERO))
+    _limpiar(d, nombre)
+    return os.path.join(d, nombre)
+
+
+def _limpiar(d, vigente):
+    for n in os.listdir(d):
+        if n.startswith("movimientos-") and n != vigente:
+            try: os.remove(os.path.join(d, n))
+            except OSError: pass  # todavia mapeado por otra sesion
+
+
+def refrescar_snapshot():
+    """Sincroniza el snapshot con la base releyendo solo los meses con version distinta. Devuelve la tabla Arrow."""
+    versiones = {m: str(v) for m, v in versiones_movimientos().items()}
+    ruta = _ruta_actual()
+    tabla, previas = _abrir(ruta) if ruta else (None, {})
+    if tabla is not None and previas == versiones: return tabla
+    cambiados = [m for m, v in versiones.items() if previas.get(m) != v]
+    with db_connection() as conn:
+        nuevos = pd.read_sql("SELECT * FROM movimientos WHERE mes = ANY(%s) ORDER BY id", conn, params=(cambiados,)) if tabla is not None else pd.read_sql("SELECT * FROM movimientos ORDER BY id", conn)
+    nuevos = _a_tabla(nuevos)
+    if tabla is not None and tabla.schema.names == nuevos.schema.names:
+        # Meses sin cambios se conservan; los cambiados o eliminados (archivados, borrados) se descartan
+        vigentes = [m for m in previas if m in versiones and m not in cambiados]
+        tabla = pa.concat_tables([tabla.filter(pc.is_in(tabla["mes"], value_set=pa.array(vigentes, pa.string()))).replace_schema_metadata(None), nuevos])
+    elif tabla is not None:
+        # Cambio el esquema (columna nueva): reconstruccion completa
+        with db_connection() as conn: tabla = _a_tabla(pd.read_sql("SELECT * FROM movimientos ORDER BY id", conn))
+    else:
+        tabla = nuevos
+    logger.info(f"Snapshot refrescado: {len(cambiados)} meses releidos, {tabla.num_rows} filas")
+    return _abrir(_escribir(tabla, versiones))[0]
+
+
+def _cargar_completo():
+    """DataFrame de movimientos desde el snapshot local; si no hay pyarrow o falla, lee de la base."""
+    if HAS_ARROW:
+        try: return refrescar_snapshot().to_pandas(split_blocks=True)
+        except Exception as e: logger.error(f"Snapshot no disponible, se lee de la base: {e}")
+    with db_connection() as conn: return pd.read_sql("SELECT * FROM movimientos", conn)
+
+
+# --- COPIA EN MEMORIA DEL PROCESO ---
+# Compartida por todas las sesiones. Cada rerun consulta solo la ultima version del registro de
+# cambios y aplica los deltas; la carga completa queda para el arranque, un TRUNCATE, un log podado
+# o un cambio de base.
+_memoria = {"df": None, "version": None, "base": None}
+_lock_memoria = threading.Lock()
+
+
+def cargar_movimientos():
+    """(DataFrame, version del registro de cambios que refleja). El DataFrame es una vista: no modificar en el lugar."""
+    with _lock_memoria:
+        base = _base()
+        df, desde = (_memoria["df"], _memoria["version"]) if _memoria["base"] == base else (None, None)
+        with db_connection() as conn:
+            c = conn.cursor()
+            delta = leer_cambios(c, desde) if df is not None else None
+            if delta is not None:
+                version, ids, meses = delta
+                if ids or meses: df = aplicar_cambios(df, conn, ids, meses)
+            else:
+                # La version se lee antes de cargar: lo que entre en el medio se vuelve a aplicar (idempotente)
+                version, df = version_actual(c), None
+        if df is None: df = compactar(_cargar_completo())
+        _memoria.update(df=df, version=version, base=base)
+        if delta is not None and (ids or meses): logger.info(f"Deltas aplicados hasta v{version}: {len(ids)} ids, {len(meses)} meses")
+        return df.copy(deep=False), version
@@ -0,0 +1,44 @@
+import streamlit as st
+import plotly.express as px
+from config import LISTA_MESES_LARGA
+from utils import formato_moneda_visual
+from consultas import buscar_movimientos
+
+
+def render(dolar_val):
+    st.header("🔎 Buscador Histórico")
+    st.caption("Busca por concepto o cuenta/contrato en todos los años, incluidos los archivados. No distingue acentos ni mayúsculas.")
+    texto = st.text_input("Concepto o contrato", key="buscador_texto", placeholder="ej: edenor, alquiler, C-22")
+    if not texto: return
+
+    df = buscar_movimientos(texto, dolar_val=dolar_val)
+    if df.empty:
+        st.info("Sin resultados."); return
+
+    df['total_ars_conv'] = df['total_ars'] + df['total_usd_ars']
+    df_match = df.groupby(['tipo_gasto', 'contrato'], as_index=False).agg(
+        score=('score', 'max'), movimientos=('movimientos', 'sum'), meses=('mes', 'nunique'),
+        total_ars=('total_ars', 'sum'), total_usd=('total_usd', 'sum'), total_conv=('total_ars_conv', 'sum')
+    ).sort_values(['score', 'movimientos'], ascending=[False, False])
+
+    st.subheader(f"{len(df_match)} coincidencias")
+    df_show = df_match.copy()
+    for col, mon in [('total_ars', 'ARS'), ('total_usd', 'USD'), ('total_conv', 'ARS')]:
+        df_show[col] = df_show[col].apply(lambda v: formato_moneda_visual(v, mon))
+    st.dataframe(df_show.rename(columns={
+        'tipo_gasto': 'Concepto', 'contrato': 'Contrato', 'score': 'Relevancia', 'movimientos': 'Movimientos',
+        'meses': 'Meses', 'total_ars': 'Total ARS', 'total_usd': 'Total USD', 'total_conv': 'Total (ARS conv.)'
+    }), hide_index=True, use_container_width=True, column_config={"Relevancia": st.column_config.ProgressColumn("Relevancia", min_value=0.0, max_value=float(max(df_match['score'].max(), 1e-9)))})
+
+    # --- TOTALES POR MES DE CADA COINCIDENCIA ---
+    etiquetas = [f"{r.tipo_gasto} · {r.contrato}" if r.contrato else r.tipo_gasto for r in df_match.itertuples()]
+    sel = st.multiselect("Ver totales por mes de", etiquetas, default=etiquetas[:1], key="buscador_sel")
+    if sel:
+        df['match'] = [f"{t} · {c}" if c else t for t, c in zip(df['tipo_gasto'], df['contrato'])]
+        df_mes = df[df['match'].isin(sel)].copy()
+        df_mes['mes_idx'] = df_mes['mes'].apply(lambda m: LISTA_MESES_LARGA.index(m) if m in LISTA_MESES_LARGA else -1)
+        df_mes = df_mes.sort_values('mes_idx')
+        fig = px.bar(df_mes, x='mes', y='total_ars_conv', color='match', barmode='group', labels={'total_ars_conv': 'Total (ARS conv.)', 'mes': 'Mes', 'match': 'Coincidencia'})
+        st.plotly_chart(fig, use_container_width=True)
+        pivot = df_mes.pivot_table(index='mes', columns='match', values='total_ars_conv', aggfunc='sum', sort=False).fillna(0)
+        st.dataframe(pivot.map(lambda v: formato_moneda_visual(v, 'ARS')), use_container_width=True)
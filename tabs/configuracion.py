@@ -1,15 +1,64 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import io
-from config import LISTA_MESES_LARGA, OPCIONES_PAGO
-from db import db_connection, generar_backup_sql
+from config import LISTA_MESES_LARGA, OPCIONES_PAGO, obtener_indice_mes_actual
+from db import db_connection, generar_backup_sql, listar_particiones, archivar_anio, desarchivar_anio
 from auth import make_hashes, check_hashes
 from utils import formato_moneda_visual, procesar_monto_input
+from logic import actualizar_saldos, generar_recurrentes, generar_excel
+from importador import leer_encabezado, sugerir_columna, importar_extracto
+from cotizaciones import leer_csv_cotizaciones, importar_cotizaciones
+from pagina import leer
+from duplicados import detectar, eliminar_duplicados, fusionar_duplicados
+from cuotas import listar_planes, cancelar_plan, vincular_cuotas
+from cierres import cerrar_mes, reabrir_mes
 
 
-def render(grupos_db):
+MAX_DUPLICADOS = 500  # filas del editor; el resto se resuelve en otra pasada
+PRESELECCION = 0.95  # los pares dudosos se tildan a mano
+
+
+def guardar_presupuesto():
+    pg, pl = st.session_state["pres_grupo"], procesar_monto_input(st.session_state["pres_limite"])
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("INSERT INTO presupuestos (grupo, limite) VALUES (%s, %s) ON CONFLICT (grupo) DO UPDATE SET limite=%s", (pg, pl, pl))
+        conn.commit()
+    st.session_state["pres_msg"] = f"Presupuesto de {pg} actualizado"; st.session_state["datos_presupuestos"] = leer("presupuestos")
+
+
+def borrar_presupuesto():
+    with db_connection() as conn:
+        c = conn.cursor(); c.execute("DELETE FROM presupuestos WHERE grupo=%s", (st.session_state["pres_borrar"],)); conn.commit()
+    st.session_state["pres_msg"] = "Eliminado"; st.session_state["datos_presupuestos"] = leer("presupuestos")
+
+
+@st.fragment
+def presupuestos(grupos_db):
+    """Alta y baja de presupuestos sin recalcular el resto de la configuracion (los callbacks escriben y releen antes de redibujar)."""
+    df_pres = st.session_state["datos_presupuestos"]
+    if "pres_msg" in st.session_state: st.success(st.session_state.pop("pres_msg"))
+    if not df_pres.empty:
+        st.dataframe(
+            df_pres[['grupo', 'limite']].rename(columns={'grupo': 'Grupo', 'limite': 'Limite ($)'}),
+            hide_index=True, use_container_width=True
+        )
+
+    with st.form("presupuesto_form"):
+        cp1, cp2 = st.columns(2)
+        cp1.selectbox("Grupo", grupos_db, key="pres_grupo")
+        cp2.text_input("Limite mensual ($)", "0,00", key="pres_limite")
+        st.form_submit_button("Guardar Presupuesto", on_click=guardar_presupuesto)
+
+    if not df_pres.empty:
+        with st.form("borrar_pres_form"):
+            st.selectbox("Eliminar presupuesto de", df_pres['grupo'].tolist(), key="pres_borrar")
+            st.form_submit_button("Eliminar Presupuesto", on_click=borrar_presupuesto)
+
+def render(datos):
     st.header("⚙️ Configuración")
+    grupos_db = datos.grupos
+    cerrados = set(datos.cierres["mes"]); abiertos = [m for m in LISTA_MESES_LARGA if m not in cerrados]
 
     # --- ADMINISTRAR GRUPOS ---
     st.subheader("📂 Administrar Grupos")
@@ -33,44 +82,12 @@ def render(grupos_db):
 
     # --- PRESUPUESTOS POR GRUPO ---
     with st.expander("📊 Presupuestos por Grupo", expanded=False):
-        with db_connection() as conn:
-            try:
-                df_pres = pd.read_sql("SELECT * FROM presupuestos ORDER BY grupo", conn)
-            except:
-                df_pres = pd.DataFrame()
-        if not df_pres.empty:
-            st.dataframe(
-                df_pres[['grupo', 'limite']].rename(columns={'grupo': 'Grupo', 'limite': 'Limite ($)'}),
-                hide_index=True, use_container_width=True
-            )
-
-        with st.form("presupuesto_form"):
-            cp1, cp2 = st.columns(2)
-            pg = cp1.selectbox("Grupo", grupos_db, key="pres_grupo")
-            pl = cp2.text_input("Limite mensual ($)", "0,00", key="pres_limite")
-            if st.form_submit_button("Guardar Presupuesto"):
-                with db_connection() as conn:
-                    c = conn.cursor()
-                    c.execute("INSERT INTO presupuestos (grupo, limite) VALUES (%s, %s) ON CONFLICT (grupo) DO UPDATE SET limite=%s",
-                              (pg, procesar_monto_input(pl), procesar_monto_input(pl)))
-                    conn.commit()
-                st.success(f"Presupuesto de {pg} actualizado"); st.rerun()
-
-        if not df_pres.empty:
-            with st.form("borrar_pres_form"):
-                pb = st.selectbox("Eliminar presupuesto de", df_pres['grupo'].tolist())
-                if st.form_submit_button("Eliminar Presupuesto"):
-                    with db_connection() as conn:
-                        c = conn.cursor(); c.execute("DELETE FROM presupuestos WHERE grupo=%s", (pb,)); conn.commit()
-                    st.success("Eliminado"); st.rerun()
+        st.session_state["datos_presupuestos"] = datos.presupuestos
+        presupuestos(grupos_db)
 
     # --- GASTOS RECURRENTES ---
     with st.expander("🔄 Gastos Recurrentes", expanded=False):
-        with db_connection() as conn:
-            try:
-                df_rec = pd.read_sql("SELECT * FROM recurrentes WHERE activo=TRUE ORDER BY grupo, tipo_gasto", conn)
-            except:
-                df_rec = pd.DataFrame()
+        df_rec = datos.recurrentes
 
         if not df_rec.empty:
             st.caption("Gastos que se generan automaticamente cada mes")
@@ -114,34 +131,72 @@ def render(grupos_db):
         st.caption("Usa 'Generar Recurrentes' para crear los movimientos del mes actual")
         mes_rec = st.selectbox("Mes destino", LISTA_MESES_LARGA, key="mes_recurrentes")
         if st.button("Generar Recurrentes en Mes"):
-            with db_connection() as conn:
-                try:
-                    df_rec_activos = pd.read_sql("SELECT * FROM recurrentes WHERE activo=TRUE", conn)
-                except:
-                    df_rec_activos = pd.DataFrame()
-                if df_rec_activos.empty:
-                    st.warning("No hay recurrentes activos")
-                else:
-                    c = conn.cursor()
-                    count = 0
-                    for _, r in df_rec_activos.iterrows():
-                        c.execute("SELECT id FROM movimientos WHERE mes=%s AND tipo_gasto=%s AND grupo=%s", (mes_rec, r['tipo_gasto'], r['grupo']))
-                        if not c.fetchone():
-                            c.execute("INSERT INTO movimientos (fecha,mes,tipo,grupo,tipo_gasto,contrato,cuota,monto,moneda,forma_pago,fecha_pago,pagado) VALUES (%s,%s,%s,%s,%s,%s,'1/1',%s,%s,%s,%s,FALSE)",
-                                      (str(datetime.date.today()), mes_rec, r['tipo'], r['grupo'], r['tipo_gasto'], r['contrato'], float(r['monto']), r['moneda'], r['forma_pago'], str(datetime.date.today())))
-                            count += 1
-                    conn.commit()
-                    st.success(f"{count} movimientos recurrentes generados en {mes_rec}")
+            count = generar_recurrentes([mes_rec])
+            if count is None: st.warning("No hay recurrentes activos")
+            else: st.success(f"{count} movimientos recurrentes generados en {mes_rec}")
 
     st.divider()
 
+    # --- IMPORTAR EXTRACTO ---
+    with st.expander("📥 Importar Extracto (CSV / XLSX)", expanded=False):
+        st.caption("Carga masiva de extractos bancarios o de tarjeta. Los movimientos ya cargados (mismo mes, fecha, concepto, monto y moneda) se omiten.")
+        archivo = st.file_uploader("Extracto", type=["csv", "txt", "xlsx"], key="imp_archivo")
+        if archivo is not None:
+            muestra = leer_encabezado(archivo, archivo.name)
+            if muestra.empty:
+                st.error("No se encontraron filas en el archivo.")
+            else:
+                st.dataframe(muestra.head(5), hide_index=True, use_container_width=True)
+                cols = list(muestra.columns); opc = ["—"] + cols
+                ic1, ic2, ic3, ic4 = st.columns(4)
+                sel = {}
+                for col_ui, campo, etiqueta in [(ic1, "fecha", "Fecha"), (ic2, "concepto", "Concepto"), (ic3, "monto", "Monto"), (ic4, "contrato", "Contrato (opcional)")]:
+                    sug = sugerir_columna(cols, campo)
+                    sel[campo] = col_ui.selectbox(etiqueta, opc, index=opc.index(sug) if sug else 0, key=f"imp_col_{campo}")
+                ic5, ic6, ic7, ic8 = st.columns(4)
+                imp_grupo = ic5.selectbox("Grupo por defecto", grupos_db, key="imp_grupo")
+                imp_moneda = ic6.selectbox("Moneda", ["ARS", "USD"], key="imp_moneda")
+                imp_pago = ic7.selectbox("Forma de Pago", OPCIONES_PAGO, index=OPCIONES_PAGO.index("Bancario"), key="imp_pago")
+                imp_signo = ic8.radio("Signo", ["Negativos = GASTO", "Todo es GASTO"], key="imp_signo")
+                imp_pagado = st.checkbox("Marcar como pagados", value=True, key="imp_pagado")
+                if st.button("Importar"):
+                    if "—" in (sel["fecha"], sel["concepto"], sel["monto"]):
+                        st.error("Elegí las columnas de fecha, concepto y monto.")
+                    else:
+                        columnas = {k: (v if v != "—" else None) for k, v in sel.items()}
+                        with st.spinner("Importando..."):
+                            try:
+                                res = importar_extracto(archivo, archivo.name, columnas, imp_grupo, imp_moneda, imp_pago, imp_signo == "Negativos = GASTO", imp_pagado)
+                            except Exception as e:
+                                res = None; st.error(f"Error al importar (no se grabó nada): {e}")
+                        if res:
+                            if res["meses"]: actualizar_saldos(res["meses"][0])
+                            st.success(f"{res['insertadas']} movimientos importados · {res['duplicadas']} duplicados omitidos · {res['cerrados']} en meses cerrados · {res['descartadas']} filas inválidas de {res['leidas']} leídas")
+
+    # --- COTIZACIONES HISTORICAS ---
+    with st.expander("💱 Cotizaciones Históricas del Dólar", expanded=False):
+        st.caption("Los montos en USD se convierten con la cotización vigente en su fecha de pago. La del día se guarda sola; el historial se carga una vez desde un CSV (fecha + valor, o fecha + compra + venta).")
+        cot = datos.cotizaciones
+        if not cot.empty: st.caption(f"{len(cot)} días cargados, del {cot['fecha'].min():%d/%m/%Y} al {cot['fecha'].max():%d/%m/%Y}.")
+        archivo_cot = st.file_uploader("CSV de cotizaciones", type=["csv", "txt"], key="cot_archivo")
+        if archivo_cot is not None:
+            try:
+                df_cot = leer_csv_cotizaciones(archivo_cot)
+            except Exception as e:
+                df_cot = None; st.error(f"No se pudo leer el CSV: {e}")
+            if df_cot is not None:
+                st.dataframe(df_cot.tail(5), hide_index=True, use_container_width=True)
+                if df_cot.empty: st.error("No se encontraron filas con fecha y valor.")
+                elif st.button(f"Cargar {len(df_cot)} cotizaciones", key="cot_cargar"):
+                    st.success(f"{importar_cotizaciones(df_cot)} días cargados ({df_cot['fecha'].iloc[0]} a {df_cot['fecha'].iloc[-1]})")
+
     # --- REPLICADOR ---
     with st.expander("🔄 REPLICADOR DE GASTOS", expanded=False):
         c1, c2 = st.columns(2); mm = c1.selectbox("Mes Modelo", LISTA_MESES_LARGA)
         with db_connection() as conn:
             dfm=pd.read_sql("SELECT * FROM movimientos WHERE mes=%s AND tipo='GASTO'", conn, params=(mm,))
         if not dfm.empty:
-            gs = st.multiselect("Gastos a copiar", dfm['tipo_gasto'].unique()); md = st.multiselect("Destino", LISTA_MESES_LARGA)
+            gs = st.multiselect("Gastos a copiar", dfm['tipo_gasto'].unique()); md = st.multiselect("Destino", abiertos)
             if st.button("Replicar"):
                 with db_connection() as conn:
                     c=conn.cursor()
@@ -152,22 +207,104 @@ def render(grupos_db):
                     conn.commit()
                 st.success("Replicado")
 
+    # --- PLANES EN CUOTAS ---
+    with st.expander("💳 Planes en Cuotas", expanded=False):
+        st.caption("Cada compra en cuotas es un plan: se generan las cuotas hasta 12 meses adelante y las siguientes a medida que pasan los meses. Al editar una cuota en el dashboard se puede aplicar el cambio a todas las pendientes del plan.")
+        if "planes_msg" in st.session_state: st.success(st.session_state.pop("planes_msg"))
+        planes = listar_planes()
+        if planes.empty: st.info("No hay planes activos.")
+        else:
+            vista = planes.assign(cuotas=planes["pagadas"].astype(int).astype(str) + "/" + planes["total"].astype(str),
+                                  monto=[formato_moneda_visual(m, mo) for m, mo in zip(planes["monto"], planes["moneda"])],
+                                  saldo=[formato_moneda_visual(s, mo) for s, mo in zip(planes["saldo"], planes["moneda"])])
+            st.dataframe(vista[["tipo_gasto", "grupo", "contrato", "cuotas", "monto", "saldo"]].rename(columns={"tipo_gasto": "Concepto", "grupo": "Grupo", "contrato": "Contrato", "cuotas": "Pagadas", "monto": "Cuota", "saldo": "Saldo"}),
+                         hide_index=True, use_container_width=True)
+            pc1, pc2 = st.columns([3, 1])
+            p_sel = pc1.selectbox("Plan", planes["id"].tolist(), format_func=lambda i: f"{planes.loc[planes['id'] == i, 'tipo_gasto'].iloc[0]} (#{i})", key="plan_cancelar")
+            if pc2.button("Cancelar cuotas pendientes", key="plan_cancelar_btn"):
+                n, meses = cancelar_plan(p_sel)
+                validos = [m for m in meses if m in LISTA_MESES_LARGA]
+                if validos: actualizar_saldos(min(validos, key=LISTA_MESES_LARGA.index))
+                st.session_state["planes_msg"] = f"Plan cancelado: {n} cuotas pendientes borradas"; st.rerun()
+        if st.button("Vincular cuotas cargadas sin plan", key="plan_vincular"):
+            p, n = vincular_cuotas()
+            st.session_state["planes_msg"] = f"{p} planes creados con {n} cuotas"; st.rerun()
+
+    # --- DUPLICADOS ---
+    with st.expander("🧹 Movimientos Duplicados", expanded=False):
+        st.caption("Busca movimientos casi iguales (mismo mes, tipo, grupo y moneda, monto y concepto parecidos). Fusionar conserva el más antiguo y le completa lo que le falte; eliminar solo borra las copias.")
+        if "dup_msg" in st.session_state: st.success(st.session_state.pop("dup_msg"))
+        if st.button("Buscar duplicados", key="dup_buscar"):
+            st.session_state["dup_pares"] = detectar(datos.movimientos[~datos.movimientos["mes"].isin(cerrados)])  # los cerrados no se tocan
+        pares = st.session_state.get("dup_pares")
+        if pares is not None:
+            if pares.empty: st.success("No se encontraron duplicados.")
+            else:
+                st.caption(f"{len(pares)} pares encontrados" + (f" (se muestran los {MAX_DUPLICADOS} más parecidos)" if len(pares) > MAX_DUPLICADOS else ""))
+                vista = pares.head(MAX_DUPLICADOS).assign(elegir=lambda p: p["puntaje"] >= PRESELECCION)
+                ed = st.data_editor(vista, hide_index=True, use_container_width=True, key="dup_editor", disabled=[c for c in vista.columns if c != "elegir"],
+                                    column_config={"elegir": st.column_config.CheckboxColumn("✔"), "puntaje": st.column_config.ProgressColumn("Parecido", min_value=0, max_value=1)})
+                elegidos = list(ed.loc[ed["elegir"], ["id_a", "id_b"]].itertuples(index=False))
+                d1, d2 = st.columns(2)
+                fusionar = d1.button(f"🔗 Fusionar {len(elegidos)}", key="dup_fusionar", disabled=not elegidos)
+                eliminar = d2.button(f"🗑️ Eliminar {len(elegidos)} copias", key="dup_eliminar", disabled=not elegidos)
+                if fusionar or eliminar:
+                    n, meses = (fusionar_duplicados if fusionar else eliminar_duplicados)(elegidos)
+                    validos = [m for m in meses if m in LISTA_MESES_LARGA]
+                    if validos: actualizar_saldos(min(validos, key=LISTA_MESES_LARGA.index))
+                    st.session_state.pop("dup_pares", None); st.session_state["dup_msg"] = f"{n} movimientos duplicados quitados"
+                    st.rerun()
+
+    # --- CIERRE DE MES ---
+    with st.expander("🔒 Cierre de Mes", expanded=False):
+        st.caption("Un mes cerrado es definitivo: sus movimientos no se pueden cargar, editar ni borrar, y sus totales y el saldo que pasa al mes siguiente quedan guardados. Saldos, automatizaciones y gráficos arrancan del último cierre. Cerrar un mes cierra los anteriores; reabrir uno reabre los posteriores.")
+        if "cierre_msg" in st.session_state: st.success(st.session_state.pop("cierre_msg"))
+        cierres = datos.cierres
+        if not cierres.empty:
+            st.dataframe(cierres.assign(**{k: [formato_moneda_visual(v, "ARS") for v in cierres[k]] for k in ["ganancias", "gastos", "saldo", "neto_usd"]})
+                         [["mes", "fecha", "ganancias", "gastos", "neto_usd", "saldo"]].rename(columns={"mes": "Mes", "fecha": "Cerrado", "ganancias": "Ganancias", "gastos": "Gastos", "neto_usd": "Neto USD (ARS)", "saldo": "Saldo"}),
+                         hide_index=True, use_container_width=True)
+        cerrables = [m for m in abiertos if LISTA_MESES_LARGA.index(m) < obtener_indice_mes_actual()]
+        cc1, cc2 = st.columns(2)
+        if cerrables:
+            hasta = cc1.selectbox("Cerrar hasta", cerrables, index=len(cerrables) - 1, key="cierre_hasta")
+            if cc1.button("🔒 Cerrar", key="cierre_btn"):
+                meses = cerrar_mes(hasta, datos.dolar_val, datos.cotizaciones)
+                st.session_state["cierre_msg"] = f"{len(meses)} meses cerrados hasta {hasta}"; st.rerun()
+        else: cc1.info("No hay meses pasados abiertos.")
+        if not cierres.empty:
+            desde = cc2.selectbox("Reabrir desde", cierres["mes"].tolist()[::-1], key="cierre_reabrir")
+            if cc2.button("🔓 Reabrir", key="cierre_reabrir_btn"):
+                meses = reabrir_mes(desde)
+                st.session_state["cierre_msg"] = f"{len(meses)} meses reabiertos desde {desde}"; st.rerun()
+
+    # --- ARCHIVO DE AÑOS CERRADOS ---
+    with st.expander("🗄️ Archivo de Años Cerrados", expanded=False):
+        st.caption("Los años archivados salen del set de trabajo (dashboard, saldos, predicciones) pero se conservan en el backup.")
+        particiones = listar_particiones()
+        if particiones:
+            st.dataframe(pd.DataFrame(particiones, columns=['Año', 'Ubicación', 'Movimientos']), hide_index=True, use_container_width=True)
+            ca1, ca2 = st.columns(2)
+            cerrables = [a for a, u, _ in particiones if u == "ACTIVA" and a < datetime.date.today().year]
+            archivados = [a for a, u, _ in particiones if u == "ARCHIVO"]
+            if cerrables:
+                a_arch = ca1.selectbox("Año a archivar", cerrables, key="anio_archivar")
+                if ca1.button("Archivar año"):
+                    archivar_anio(a_arch); st.success(f"{a_arch} archivado"); st.rerun()
+            else:
+                ca1.info("No hay años cerrados para archivar.")
+            if archivados:
+                a_rest = ca2.selectbox("Año a restaurar", archivados, key="anio_desarchivar")
+                if ca2.button("Restaurar año"):
+                    desarchivar_anio(a_rest); st.success(f"{a_rest} restaurado"); st.rerun()
+
     # --- BACKUP Y CLONACION ---
     bc1, bc2 = st.columns(2)
-    bc1.download_button("📦 BACKUP SQL", generar_backup_sql(), "backup.sql")
+    bc1.download_button("📦 BACKUP SQL", generar_backup_sql, "backup.sql")
 
-    # Export Excel
-    with db_connection() as conn:
-        df_excel = pd.read_sql("SELECT * FROM movimientos ORDER BY mes, tipo, grupo", conn)
-    if not df_excel.empty:
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df_excel.to_excel(writer, sheet_name='Todos', index=False)
-            for mes in df_excel['mes'].unique():
-                sheet_name = mes[:31]  # Excel max 31 chars
-                df_excel[df_excel['mes'] == mes].to_excel(writer, sheet_name=sheet_name, index=False)
-        bc2.download_button("📊 EXPORTAR EXCEL", output.getvalue(), "contabilidad.xlsx",
-                           mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    # Export Excel: se genera (y se importa openpyxl) solo al hacer click
+    bc2.download_button("📊 EXPORTAR EXCEL", generar_excel, "contabilidad.xlsx",
+                       mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
     c1,c2,c3 = st.columns(3); ms=c1.selectbox("Desde", LISTA_MESES_LARGA); md_clone=c2.selectbox("Hasta", ["TODO"]+LISTA_MESES_LARGA)
     if c3.button("Clonar Mes"):
@@ -176,7 +313,7 @@ def render(grupos_db):
             df=pd.read_sql("SELECT * FROM movimientos WHERE mes=%s", conn, params=(ms,))
             tgs=[m for m in LISTA_MESES_LARGA if m.split(' ')[1]==ms.split(' ')[1]] if md_clone=="TODO" else [md_clone]
             for t in tgs:
-                if t==ms: continue
+                if t==ms or t in cerrados: continue
                 c.execute("DELETE FROM movimientos WHERE mes=%s",(t,))
                 for i,r in df.iterrows(): c.execute("INSERT INTO movimientos (fecha,mes,tipo,grupo,tipo_gasto,contrato,cuota,monto,moneda,forma_pago,fecha_pago) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)", (str(datetime.date.today()),t,r['tipo'],r['grupo'],r['tipo_gasto'],r['contrato'],r['cuota'],float(r['monto']),r['moneda'],r['forma_pago'],r['fecha_pago']))
             conn.commit()
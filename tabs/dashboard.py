@@ -5,18 +5,73 @@ import plotly.express as px
 import plotly.graph_objects as go
 import datetime
 import calendar
-from config import COLOR_MAP, OPCIONES_PAGO, MESES_NOMBRES, LISTA_MESES_LARGA
-from utils import formato_moneda_visual, generar_alertas, procesar_monto_input
+from config import COLOR_MAP, OPCIONES_PAGO, MESES_NOMBRES, LISTA_MESES_LARGA, FILAS_POR_PAGINA, obtener_indice_mes_actual
+from utils import formato_moneda_visual, generar_alertas, procesar_monto_input, tasas_asof
 from logic import actualizar_saldos
+from presupuestos import tabla_presupuestos, del_mes, historial, alertas_presupuesto
+from anomalias import anomalias_al_dia, alertas_anomalias, del_mes as inusuales_del_mes
 from db import db_connection
+from cuotas import editar_plan
+from consultas import construir_filtro_movimientos, totales_por_grupo, primeras_paginas, pagina_movimientos, cursor_de
 
+# Configuracion fija de la tabla de movimientos: el estado (✅/⏳) viene calculado desde SQL
+COLUMNAS_TABLA = ["estado", "tipo_gasto", "contrato", "monto_vis", "cuota", "forma_pago", "fecha_pago", "pagado"]
+CFG_TABLA = {
+    "estado": st.column_config.TextColumn("Estado", width="small"),
+    "tipo_gasto": st.column_config.TextColumn("Tipo de Gasto"),
+    "contrato": st.column_config.TextColumn("Contrato"),
+    "monto_vis": st.column_config.TextColumn("Monto"),
+    "cuota": st.column_config.TextColumn("Cuota"),
+    "forma_pago": st.column_config.TextColumn("Forma de Pago"),
+    "fecha_pago": st.column_config.DateColumn("Fecha de Pago", format="DD/MM/YYYY"),
+    "pagado": st.column_config.CheckboxColumn("Pagado")
+}
 
-def render(df_all, df_filtrado, dolar_val, dolar_info, mes_global, grupos_db):
-    alertas, t_vencido, t_vencer, t_cobrar = generar_alertas(df_all, dolar_val)
+
+# --- AGREGADOS (sin Streamlit, los usa benchmark.py) ---
+def resultado_por_moneda(df):
+    """Ganancias menos gastos por moneda: {'ARS': x, 'USD': y}."""
+    t = df.groupby(['moneda', 'tipo'])['monto'].sum()
+    return {m: t.get((m, 'GANANCIA'), 0.0) - t.get((m, 'GASTO'), 0.0) for m in ('ARS', 'USD')}
+
+
+def monto_en_ars(df, dolar_val, cot=None):
+    """USD a la cotizacion vigente en su fecha de pago (o a `dolar_val` si no hay historial)."""
+    usd = (df['moneda'] == 'USD').to_numpy()
+    if not usd.any(): return df['monto'].to_numpy(dtype=float)
+    tasa = dolar_val if cot is None or cot.empty else tasas_asof(df['fecha_pago'], cot, dolar_val)
+    return np.where(usd, df['monto'].to_numpy(dtype=float) * tasa, df['monto'].to_numpy(dtype=float))
+
+
+def evolucion_patrimonial(df_all, dolar_val, cot=None, cierres=None):
+    """Saldo ARS, USD convertido (cotizacion historica) y patrimonio por mes, en orden cronologico (filas o resumen mensual).
+    Los meses de `cierres` salen de sus totales congelados: solo se agregan las filas de los abiertos."""
+    if cierres is None: cierres = pd.DataFrame(columns=['mes', 'filas', 'saldo', 'neto_usd'])
+    df = df_all[df_all['mes'].isin(LISTA_MESES_LARGA) & ~df_all['mes'].isin(cierres['mes'])]
+    cerrados = cierres[cierres['filas'] > 0].set_index('mes')[['saldo', 'neto_usd']].set_axis(['ARS', 'USD'], axis=1)
+    if df.empty and cerrados.empty: return pd.DataFrame(columns=['mes', 'Saldo ARS', 'Saldo USD (conv.)', 'Patrimonio'])
+    signo = np.where(df['tipo'] == 'GANANCIA', 1.0, np.where(df['tipo'] == 'GASTO', -1.0, 0.0))
+    t = pd.Series(monto_en_ars(df, dolar_val, cot) * signo, index=df.index).groupby([df['mes'].astype(object), df['moneda'].astype(object)]).sum().unstack(fill_value=0.0)
+    t = pd.concat([x for x in (cerrados, t.reindex(columns=['ARS', 'USD'], fill_value=0.0)) if not x.empty]).astype(float)
+    t = t.loc[sorted(t.index, key=LISTA_MESES_LARGA.index)]
+    return pd.DataFrame({'mes': t.index, 'Saldo ARS': t['ARS'].values, 'Saldo USD (conv.)': t['USD'].values,
+                         'Patrimonio': t['ARS'].values + t['USD'].values})
+
+
+def render(datos, df_filtrado, mes_global):
+    df_all, dolar_val, dolar_info, grupos_db, cot = datos.movimientos, datos.dolar_val, datos.dolar_info, datos.grupos, datos.cotizaciones
+    alertas, t_vencido, t_vencer, t_cobrar = generar_alertas(df_all, dolar_val, cot)
+    # Presupuestos de todos los meses en una pasada; los del mes en curso tambien avisan antes de pasarse
+    df_pres = datos.presupuestos
+    tabla_pres = tabla_presupuestos(df_all, df_pres, dolar_val, cot, datos.version_cambios)
+    alertas += alertas_presupuesto(tabla_pres, LISTA_MESES_LARGA[obtener_indice_mes_actual()])
+    # Gastos muy por encima de lo habitual (mediana y MAD de los meses anteriores) por grupo y concepto
+    inusuales = anomalias_al_dia(dolar_val, cot, datos.version_cambios)
+    alertas += alertas_anomalias(inusuales, LISTA_MESES_LARGA[obtener_indice_mes_actual()])
     if alertas:
         with st.expander(f"🔔 Tienes {len(alertas)} Avisos Importantes", expanded=True):
             for a in alertas:
-                if "VENCIDO" in a: st.error(a)
+                if "VENCIDO" in a or "excedido" in a: st.error(a)
                 elif "Cobras" in a or "Cobro Atrasado" in a: st.success(a)
                 else: st.warning(a)
             st.markdown("---")
@@ -26,24 +81,30 @@ def render(df_all, df_filtrado, dolar_val, dolar_info, mes_global, grupos_db):
             k3.metric("💵 Total a Cobrar", formato_moneda_visual(t_cobrar, "ARS"))
 
     st.info(f"Dolar Blue: {formato_moneda_visual(dolar_val, 'ARS')} {dolar_info}")
+    cierre = datos.cierres[datos.cierres['mes'] == mes_global]
+    if not cierre.empty: st.caption(f"🔒 Mes cerrado el {cierre['fecha'].iloc[0]} · saldo que pasó al mes siguiente: {formato_moneda_visual(cierre['saldo'].iloc[0], 'ARS')}")
 
+    # KPIs, torta y flujo de caja salen del resumen mensual (pocas filas); el calendario usa las filas del mes
+    resumen = datos.resumen
+    res_mes = resumen[resumen['mes'] == mes_global]
     if not df_filtrado.empty:
-        r_ars = df_filtrado[(df_filtrado['moneda']=="ARS")&(df_filtrado['tipo']=="GANANCIA")]['monto'].sum() - df_filtrado[(df_filtrado['moneda']=="ARS")&(df_filtrado['tipo']=="GASTO")]['monto'].sum()
-        r_usd = df_filtrado[(df_filtrado['moneda']=="USD")&(df_filtrado['tipo']=="GANANCIA")]['monto'].sum() - df_filtrado[(df_filtrado['moneda']=="USD")&(df_filtrado['tipo']=="GASTO")]['monto'].sum()
+        res = resultado_por_moneda(res_mes); r_ars, r_usd = res['ARS'], res['USD']
         c1, c2, c3 = st.columns(3)
         c1.metric("RESULTADO (ARS)", formato_moneda_visual(r_ars, "ARS"))
         c2.metric("RESULTADO (USD)", formato_moneda_visual(r_usd, "USD"))
-        c3.metric("PATRIMONIO", formato_moneda_visual(r_ars + (r_usd * dolar_val), "ARS"))
+        df_filtrado['m_ars_v'] = monto_en_ars(df_filtrado, dolar_val, cot)
+        res_mes['m_ars_v'] = monto_en_ars(res_mes, dolar_val, cot)
+        signo = np.where(res_mes['tipo'] == 'GANANCIA', 1.0, np.where(res_mes['tipo'] == 'GASTO', -1.0, 0.0))
+        c3.metric("PATRIMONIO", formato_moneda_visual((res_mes['m_ars_v'] * signo).sum(), "ARS"))
         st.divider()
 
-        df_filtrado['m_ars_v'] = df_filtrado.apply(lambda x: x['monto'] * dolar_val if x['moneda'] == 'USD' else x['monto'], axis=1)
         c_g1, c_g2 = st.columns(2)
 
         with c_g1:
             st.caption("Distribución de Gastos (Click para filtrar)")
             df_gastos = df_filtrado[df_filtrado['tipo']=="GASTO"]
             if not df_gastos.empty:
-                fig_pie = px.pie(df_gastos, values='m_ars_v', names='grupo', hole=0.4)
+                fig_pie = px.pie(res_mes[res_mes['tipo']=="GASTO"], values='m_ars_v', names='grupo', hole=0.4)
                 fig_pie.update_traces(textposition='inside', textinfo='percent+label')
                 sel_pie = st.plotly_chart(fig_pie, on_select="rerun", selection_mode="points", use_container_width=True)
                 filtro_grupo = sel_pie["selection"]["points"][0]["label"] if sel_pie and sel_pie["selection"]["points"] else None
@@ -52,15 +113,15 @@ def render(df_all, df_filtrado, dolar_val, dolar_info, mes_global, grupos_db):
 
         with c_g2:
             st.caption("Flujo de Caja")
-            if not df_filtrado.empty:
-                st.plotly_chart(px.bar(df_filtrado.groupby(['moneda', 'tipo'])['monto'].sum().reset_index(), x='moneda', y='monto', color='tipo', barmode='group', color_discrete_map=COLOR_MAP), use_container_width=True)
+            if not res_mes.empty:
+                st.plotly_chart(px.bar(res_mes.groupby(['moneda', 'tipo'])['monto'].sum().reset_index(), x='moneda', y='monto', color='tipo', barmode='group', color_discrete_map=COLOR_MAP), use_container_width=True)
 
         # --- MAPA DE CALOR CALENDARIO + GASTOS POR FORMA DE PAGO ---
         c_h1, c_h2 = st.columns(2)
 
         with c_h1:
             st.caption("📅 Mapa de Calor de Gastos")
-            df_gastos_cal = df_filtrado[df_filtrado['tipo'] == 'GASTO'].copy()
+            df_gastos_cal = df_filtrado[df_filtrado['tipo'] == 'GASTO']
             if not df_gastos_cal.empty:
                 partes_mes = mes_global.split(" ")
                 mes_num = MESES_NOMBRES.index(partes_mes[0]) + 1
@@ -68,9 +129,7 @@ def render(df_all, df_filtrado, dolar_val, dolar_info, mes_global, grupos_db):
                 num_dias = calendar.monthrange(anio_num, mes_num)[1]
                 primer_dia_semana = calendar.monthrange(anio_num, mes_num)[0]
 
-                df_gastos_cal['fecha_dt'] = pd.to_datetime(df_gastos_cal['fecha_pago'], errors='coerce')
-                df_gastos_cal['dia'] = df_gastos_cal['fecha_dt'].dt.day
-                gasto_por_dia = df_gastos_cal.groupby('dia')['m_ars_v'].sum().to_dict()
+                gasto_por_dia = df_gastos_cal.groupby(pd.to_datetime(df_gastos_cal['fecha_pago'], errors='coerce').dt.day)['m_ars_v'].sum().to_dict()
 
                 semanas = []
                 semana_actual = [None] * primer_dia_semana
@@ -147,47 +206,42 @@ def render(df_all, df_filtrado, dolar_val, dolar_info, mes_global, grupos_db):
                 st.info("No hay gastos para mostrar por forma de pago.")
 
         # --- PRESUPUESTOS POR GRUPO ---
-        with db_connection() as conn:
-            try:
-                df_pres = pd.read_sql("SELECT * FROM presupuestos", conn)
-            except:
-                df_pres = pd.DataFrame()
         if not df_pres.empty and not df_gastos.empty:
             st.caption("📊 Presupuestos por Grupo")
-            gastos_grupo = df_gastos.groupby('grupo')['m_ars_v'].sum().to_dict()
-            cols_pres = st.columns(min(len(df_pres), 4))
-            for idx, (_, p) in enumerate(df_pres.iterrows()):
+            tarjetas = del_mes(tabla_pres, df_pres, mes_global, dolar_val).to_dict('records')
+            cols_pres = st.columns(min(len(tarjetas), 4))
+            for idx, r in enumerate(tarjetas):
                 with cols_pres[idx % len(cols_pres)]:
-                    gastado = gastos_grupo.get(p['grupo'], 0)
-                    limite = p['limite']
-                    pct = min(gastado / limite, 1.0) if limite > 0 else 0
-                    color = "🟢" if pct < 0.8 else ("🟡" if pct < 1.0 else "🔴")
-                    st.markdown(f"**{color} {p['grupo']}**")
-                    st.progress(pct)
-                    st.caption(f"{formato_moneda_visual(gastado, 'ARS')} / {formato_moneda_visual(limite, 'ARS')}")
-                    if pct >= 0.8 and pct < 1.0:
-                        st.warning(f"Cerca del limite ({pct:.0%})")
-                    elif pct >= 1.0:
-                        st.error(f"Excedido ({formato_moneda_visual(gastado - limite, 'ARS')} de mas)")
+                    color = {"OK": "🟢", "CERCA": "🟡", "EN RIESGO": "🟠"}.get(r['estado'], "🔴")
+                    st.markdown(f"**{color} {r['grupo']}**")
+                    st.progress(min(float(r['pct']), 1.0))
+                    st.caption(f"{formato_moneda_visual(r['gastado'], 'ARS')} / {formato_moneda_visual(r['limite'], 'ARS')}")
+                    if r['estado'] == "EXCEDIDO": st.error(f"Excedido ({formato_moneda_visual(r['gastado'] - r['limite'], 'ARS')} de mas)")
+                    elif r['estado'] == "EN RIESGO": st.warning(f"Proyecta {formato_moneda_visual(r['proyectado'], 'ARS')} al cierre")
+                    elif r['estado'] == "CERCA": st.warning(f"Cerca del limite ({r['pct']:.0%})")
+
+            with st.expander("🗓️ Historial de Presupuestos", expanded=False):
+                h = historial(tabla_pres)
+                if not h.empty:
+                    fig_h = px.imshow(h * 100, color_continuous_scale="RdYlGn_r", zmin=0, zmax=150, aspect="auto", labels=dict(color="% del límite"))
+                    fig_h.update_layout(height=max(200, 40 * len(h) + 80), margin=dict(l=10, r=10, t=10, b=10))
+                    st.plotly_chart(fig_h, use_container_width=True)
+
+        # --- GASTOS INUSUALES ---
+        with st.expander("🚨 Gastos Inusuales", expanded=False):
+            t_inus = inusuales_del_mes(inusuales, mes_global)
+            if t_inus.empty: st.caption("Ningún grupo ni concepto gastó muy por encima de lo habitual este mes.")
+            else:
+                st.dataframe(pd.DataFrame({"Nivel": t_inus["nivel"], "Grupo / Concepto": t_inus["clave"], "Gastado": t_inus["monto"].map(lambda v: formato_moneda_visual(v, "ARS")),
+                                           "Habitual": t_inus["mediana"].map(lambda v: formato_moneda_visual(v, "ARS")), "Veces": (t_inus["monto"] / t_inus["mediana"]).round(1), "z": t_inus["z"]}),
+                             hide_index=True, use_container_width=True)
+            st.caption("Comparado con la mediana de los últimos meses con gasto (desvío robusto, MAD).")
 
         # --- EVOLUCION PATRIMONIAL ---
         with st.expander("📈 Evolución Patrimonial", expanded=False):
-            if not df_all.empty:
-                meses_con_datos = sorted(df_all['mes'].unique(), key=lambda m: LISTA_MESES_LARGA.index(m) if m in LISTA_MESES_LARGA else 999)
-                evol_data = []
-                for m in meses_con_datos:
-                    if m not in LISTA_MESES_LARGA: continue
-                    dfm = df_all[df_all['mes'] == m]
-                    g_ars = dfm[(dfm['moneda']=='ARS')&(dfm['tipo']=='GANANCIA')]['monto'].sum()
-                    e_ars = dfm[(dfm['moneda']=='ARS')&(dfm['tipo']=='GASTO')]['monto'].sum()
-                    g_usd = dfm[(dfm['moneda']=='USD')&(dfm['tipo']=='GANANCIA')]['monto'].sum()
-                    e_usd = dfm[(dfm['moneda']=='USD')&(dfm['tipo']=='GASTO')]['monto'].sum()
-                    saldo_ars = g_ars - e_ars
-                    saldo_usd = g_usd - e_usd
-                    patrimonio = saldo_ars + (saldo_usd * dolar_val)
-                    evol_data.append({'mes': m, 'Saldo ARS': saldo_ars, 'Saldo USD (conv.)': saldo_usd * dolar_val, 'Patrimonio': patrimonio})
-                if evol_data:
-                    df_evol = pd.DataFrame(evol_data)
+            if not resumen.empty:
+                df_evol = evolucion_patrimonial(resumen, dolar_val, cot, datos.cierres)
+                if not df_evol.empty:
                     fig_evol = go.Figure()
                     fig_evol.add_trace(go.Scatter(x=df_evol['mes'], y=df_evol['Patrimonio'], name='Patrimonio', mode='lines+markers', line=dict(color='#ffc107', width=3), fill='tozeroy', fillcolor='rgba(255,193,7,0.1)'))
                     fig_evol.add_trace(go.Bar(x=df_evol['mes'], y=df_evol['Saldo ARS'], name='Saldo ARS', marker_color='#28a745', opacity=0.6))
@@ -203,96 +257,108 @@ def render(df_all, df_filtrado, dolar_val, dolar_info, mes_global, grupos_db):
             filtro_fpago = fc3.selectbox("Forma de Pago", ["Todas"] + OPCIONES_PAGO, key="dash_fpago")
             filtro_estado = fc4.selectbox("Estado", ["Todos", "Pagado", "Pendiente"], key="dash_estado")
 
-        df_tabla = df_filtrado.copy()
-        if filtro_grupo: df_tabla = df_tabla[df_tabla['grupo'] == filtro_grupo]
-        if busqueda: df_tabla = df_tabla[df_tabla['tipo_gasto'].str.contains(busqueda, case=False, na=False)]
-        if filtro_moneda != "Todas": df_tabla = df_tabla[df_tabla['moneda'] == filtro_moneda]
-        if filtro_fpago != "Todas": df_tabla = df_tabla[df_tabla['forma_pago'] == filtro_fpago]
-        if filtro_estado == "Pagado": df_tabla = df_tabla[df_tabla['pagado'] == True]
-        elif filtro_estado == "Pendiente": df_tabla = df_tabla[df_tabla['pagado'] != True]
-
-        df_tabla['monto_vis'] = df_tabla.apply(lambda x: formato_moneda_visual(x['monto'], x['moneda']), axis=1)
-        df_tabla['pagado'] = df_tabla['pagado'].fillna(False).astype(bool)
-        df_tabla['estado'] = df_tabla['pagado'].apply(lambda x: "✅" if x else "⏳")
-
-        cols = ["estado", "tipo_gasto", "contrato", "monto_vis", "cuota", "forma_pago", "fecha_pago", "pagado"]
-        cfg = {
-            "estado": st.column_config.TextColumn("Estado", width="small"),
-            "tipo_gasto": st.column_config.TextColumn("Tipo de Gasto"),
-            "contrato": st.column_config.TextColumn("Contrato"),
-            "monto_vis": st.column_config.TextColumn("Monto"),
-            "cuota": st.column_config.TextColumn("Cuota"),
-            "forma_pago": st.column_config.TextColumn("Forma de Pago"),
-            "fecha_pago": st.column_config.DateColumn("Fecha de Pago", format="DD/MM/YYYY"),
-            "pagado": st.column_config.CheckboxColumn("Pagado")
-        }
-
-        def style_fn(row): return ['background-color: #1c3323' if row['pagado'] else ''] * len(row)
+        # Filtros y paginacion se resuelven en SQL: solo se traen las filas de la pagina visible de cada grupo
+        where, params = construir_filtro_movimientos(mes_global, filtro_grupo, busqueda, filtro_moneda, filtro_fpago, filtro_estado)
+        firma_filtro = (where, tuple(params))
+        if st.session_state.get('dash_firma_filtro') != firma_filtro:
+            st.session_state['dash_firma_filtro'] = firma_filtro
+            st.session_state['dash_cursores'] = {}
+        cursores = st.session_state['dash_cursores']
+        df_totales = totales_por_grupo(where, params, dolar_val)
+        df_primeras = primeras_paginas(where, params) if not df_totales.empty else pd.DataFrame()
         selected = []
 
         for gt in ["GANANCIA", "GASTO"]:
-            dft = df_tabla[df_tabla['tipo'] == gt]
+            dft = df_totales[df_totales['tipo'] == gt]
             if not dft.empty:
                 st.markdown(f"## {('🟢' if gt=='GANANCIA' else '🔴')} {gt}S")
-                for grp in sorted(dft['grupo'].unique()):
+                for _, tg in dft.iterrows():
+                    grp = tg['grupo']; pila = cursores.setdefault(f"{gt}|{grp}", [])
                     with st.container():
                         st.subheader(f"📂 {grp}")
-                        dfg = dft[dft['grupo'] == grp].sort_values(by=['pagado', 'fecha_pago'], ascending=[True, True])
-                        s = st.dataframe(dfg[cols].style.apply(style_fn, axis=1), column_config=cfg, use_container_width=True, hide_index=True, on_select="rerun", selection_mode="multi-row", key=f"t_{gt}_{grp}")
-                        st.markdown(f"**📉 Total {grp}: {formato_moneda_visual(dfg['m_ars_v'].sum(), 'ARS')}**")
+                        if pila: dfg = pagina_movimientos(where, params, gt, grp, pila[-1])
+                        else: dfg = df_primeras[(df_primeras['tipo'] == gt) & (df_primeras['grupo'] == grp)]
+                        hay_mas = len(dfg) > FILAS_POR_PAGINA
+                        dfg = dfg.head(FILAS_POR_PAGINA).reset_index(drop=True)
+                        dfg['monto_vis'] = [formato_moneda_visual(m, mo) for m, mo in zip(dfg['monto'], dfg['moneda'])]
+                        s = st.dataframe(dfg[COLUMNAS_TABLA], column_config=CFG_TABLA, use_container_width=True, hide_index=True, on_select="rerun", selection_mode="multi-row", key=f"t_{gt}_{grp}_{len(pila)}")
+                        st.markdown(f"**📉 Total {grp}: {formato_moneda_visual(tg['total_ars'], 'ARS')}**")
+                        if pila or hay_mas:
+                            cpa, cpb, cpc = st.columns([1, 2, 1])
+                            if pila and cpa.button("◀ Anterior", key=f"prev_{gt}_{grp}"): pila.pop(); st.rerun()
+                            cpb.caption(f"Página {len(pila) + 1} de {-(-int(tg['filas']) // FILAS_POR_PAGINA)} · {int(tg['filas'])} movimientos")
+                            if hay_mas and cpc.button("Siguiente ▶", key=f"next_{gt}_{grp}"): pila.append(cursor_de(dfg.iloc[-1])); st.rerun()
                         if s.selection.rows:
                             for i in s.selection.rows: selected.append(dfg.iloc[i])
 
-        if len(selected) == 1:
-            r = selected[0]; idm = int(r['id'])
-            st.markdown(f"### ✏️ Editar: {r['tipo_gasto']}")
-            with st.form("edit"):
-                c1,c2,c3,c4 = st.columns(4)
-                nt = c1.selectbox("Tipo", ["GASTO", "GANANCIA"], index=["GASTO", "GANANCIA"].index(r['tipo']))
-                ng = c2.selectbox("Grupo", grupos_db, index=grupos_db.index(r['grupo']) if r['grupo'] in grupos_db else 0)
-                nc = c3.text_input("Concepto", value=r['tipo_gasto']); nct = c4.text_input("Contrato", value=r['contrato'])
-                c5,c6,c7 = st.columns(3)
-                nm = c5.text_input("Monto", value=str(r['monto']).replace('.', ',')); nmo = c6.selectbox("Moneda", ["ARS", "USD"], index=["ARS", "USD"].index(r['moneda']))
-                ncu = c7.text_input("Cuota", value=str(r['cuota']))
-                c8,c9,c10 = st.columns(3)
-                npg = c8.selectbox("Pago", OPCIONES_PAGO, index=OPCIONES_PAGO.index(r['forma_pago']) if r['forma_pago'] in OPCIONES_PAGO else 0)
-                try: fd = pd.to_datetime(r['fecha_pago']).date()
-                except: fd = datetime.date.today()
-                nf = c9.date_input("Fecha", value=fd); npa = c10.checkbox("PAGADO", value=bool(r['pagado']))
-                if st.form_submit_button("💾 Guardar"):
-                    with db_connection() as conn:
-                        c = conn.cursor()
-                        c.execute("UPDATE movimientos SET tipo=%s, grupo=%s, tipo_gasto=%s, contrato=%s, monto=%s, moneda=%s, cuota=%s, forma_pago=%s, fecha_pago=%s, pagado=%s WHERE id=%s", (nt, ng, nc, nct, procesar_monto_input(nm), nmo, ncu, npg, str(nf), npa, idm))
-                        conn.commit()
-                    actualizar_saldos(mes_global); st.success("Ok"); st.rerun()
-                if st.form_submit_button("❌ Eliminar"):
-                    st.session_state['confirmar_eliminar_id'] = idm
-
-            # Confirmacion fuera del form
-            if st.session_state.get('confirmar_eliminar_id') == idm:
-                st.warning(f"¿Seguro que queres eliminar **{r['tipo_gasto']}**?")
-                ce1, ce2 = st.columns(2)
-                if ce1.button("Si, eliminar", key="conf_del_si"):
-                    with db_connection() as conn:
-                        c = conn.cursor(); c.execute("DELETE FROM movimientos WHERE id=%s", (idm,)); conn.commit()
-                    st.session_state.pop('confirmar_eliminar_id', None)
-                    actualizar_saldos(mes_global); st.rerun()
-                if ce2.button("Cancelar", key="conf_del_no"):
-                    st.session_state.pop('confirmar_eliminar_id', None); st.rerun()
-
+        if selected and not cierre.empty:
+            st.info(f"🔒 {mes_global} está cerrado: sus movimientos no se pueden editar (se reabre en Configuración).")
+        elif len(selected) == 1:
+            editor_movimiento(selected[0], grupos_db, mes_global)
         elif len(selected) > 1:
-            st.warning(f"Seleccionaste {len(selected)} movimientos.")
-            if st.button("🗑️ Eliminar seleccionados"):
-                st.session_state['confirmar_eliminar_multi'] = True
-            if st.session_state.get('confirmar_eliminar_multi'):
-                st.error(f"¿Seguro que queres eliminar **{len(selected)}** movimientos?")
-                cm1, cm2 = st.columns(2)
-                if cm1.button("Si, eliminar todos", key="conf_multi_si"):
-                    with db_connection() as conn:
-                        c = conn.cursor()
-                        c.execute("DELETE FROM movimientos WHERE id IN %s", (tuple([int(x['id']) for x in selected]),))
-                        conn.commit()
-                    st.session_state.pop('confirmar_eliminar_multi', None)
-                    actualizar_saldos(mes_global); st.rerun()
-                if cm2.button("Cancelar", key="conf_multi_no"):
-                    st.session_state.pop('confirmar_eliminar_multi', None); st.rerun()
+            eliminar_seleccionados([int(x['id']) for x in selected], mes_global)
+
+
+# --- EDICION DE MOVIMIENTOS ---
+# Fragmentos: abrir o cancelar una confirmacion no recalcula el dashboard; guardar o borrar si (cambian los datos).
+@st.fragment
+def editor_movimiento(r, grupos_db, mes_global):
+    idm = int(r['id'])
+    st.markdown(f"### ✏️ Editar: {r['tipo_gasto']}")
+    with st.form("edit"):
+        c1,c2,c3,c4 = st.columns(4)
+        nt = c1.selectbox("Tipo", ["GASTO", "GANANCIA"], index=["GASTO", "GANANCIA"].index(r['tipo']))
+        ng = c2.selectbox("Grupo", grupos_db, index=grupos_db.index(r['grupo']) if r['grupo'] in grupos_db else 0)
+        nc = c3.text_input("Concepto", value=r['tipo_gasto']); nct = c4.text_input("Contrato", value=r['contrato'])
+        c5,c6,c7 = st.columns(3)
+        nm = c5.text_input("Monto", value=str(r['monto']).replace('.', ',')); nmo = c6.selectbox("Moneda", ["ARS", "USD"], index=["ARS", "USD"].index(r['moneda']))
+        ncu = c7.text_input("Cuota", value=str(r['cuota']))
+        c8,c9,c10 = st.columns(3)
+        npg = c8.selectbox("Pago", OPCIONES_PAGO, index=OPCIONES_PAGO.index(r['forma_pago']) if r['forma_pago'] in OPCIONES_PAGO else 0)
+        try: fd = pd.to_datetime(r['fecha_pago']).date()
+        except: fd = datetime.date.today()
+        nf = c9.date_input("Fecha", value=fd); npa = c10.checkbox("PAGADO", value=bool(r['pagado']))
+        plan = r.get('plan_id')
+        en_plan = pd.notna(plan) and st.checkbox("Aplicar también a las cuotas pendientes del plan", key="edit_plan")
+        if st.form_submit_button("💾 Guardar"):
+            with db_connection() as conn:
+                c = conn.cursor()
+                c.execute("UPDATE movimientos SET tipo=%s, grupo=%s, tipo_gasto=%s, contrato=%s, monto=%s, moneda=%s, cuota=%s, forma_pago=%s, fecha_pago=%s, pagado=%s WHERE id=%s", (nt, ng, nc, nct, procesar_monto_input(nm), nmo, ncu, npg, str(nf), npa, idm))
+                conn.commit()
+            desde = mes_global
+            if en_plan:
+                # Una sentencia para todas las cuotas pendientes y el plan (las siguientes salen con el monto nuevo)
+                _, meses = editar_plan(int(plan), tipo=nt, grupo=ng, tipo_gasto=nc, contrato=nct, monto=procesar_monto_input(nm), moneda=nmo, forma_pago=npg)
+                desde = min([m for m in meses if m in LISTA_MESES_LARGA] + [mes_global], key=LISTA_MESES_LARGA.index)
+            actualizar_saldos(desde); st.success("Ok"); st.rerun()
+        if st.form_submit_button("❌ Eliminar"):
+            st.session_state['confirmar_eliminar_id'] = idm
+
+    # Confirmacion fuera del form
+    if st.session_state.get('confirmar_eliminar_id') == idm:
+        st.warning(f"¿Seguro que queres eliminar **{r['tipo_gasto']}**?")
+        ce1, ce2 = st.columns(2)
+        if ce1.button("Si, eliminar", key="conf_del_si"):
+            with db_connection() as conn:
+                c = conn.cursor(); c.execute("DELETE FROM movimientos WHERE id=%s", (idm,)); conn.commit()
+            st.session_state.pop('confirmar_eliminar_id', None)
+            actualizar_saldos(mes_global); st.rerun()
+        ce2.button("Cancelar", key="conf_del_no", on_click=st.session_state.pop, args=('confirmar_eliminar_id', None))
+
+
+@st.fragment
+def eliminar_seleccionados(ids, mes_global):
+    st.warning(f"Seleccionaste {len(ids)} movimientos.")
+    if st.button("🗑️ Eliminar seleccionados"):
+        st.session_state['confirmar_eliminar_multi'] = True
+    if st.session_state.get('confirmar_eliminar_multi'):
+        st.error(f"¿Seguro que queres eliminar **{len(ids)}** movimientos?")
+        cm1, cm2 = st.columns(2)
+        if cm1.button("Si, eliminar todos", key="conf_multi_si"):
+            with db_connection() as conn:
+                c = conn.cursor()
+                c.execute("DELETE FROM movimientos WHERE id IN %s", (tuple(ids),))
+                conn.commit()
+            st.session_state.pop('confirmar_eliminar_multi', None)
+            actualizar_saldos(mes_global); st.rerun()
+        cm2.button("Cancelar", key="conf_multi_no", on_click=st.session_state.pop, args=('confirmar_eliminar_multi', None))
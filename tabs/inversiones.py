@@ -3,12 +3,18 @@ import pandas as pd
 import datetime
 from utils import formato_moneda_visual, procesar_monto_input
 from db import db_connection
+from valuacion import valuar, serie_diaria
 
 
-def render(dolar_val):
+@st.cache_data(max_entries=8)
+def serie_portafolio(df_inv, hoy, dolar_val):
+    # La clave incluye el contenido de df_inv: solo se recalcula si cambian las inversiones (o el dia / el dolar)
+    return serie_diaria(df_inv, hasta=hoy, dolar_val=dolar_val)
+
+
+def render(datos):
     st.header("💰 Inversiones")
-    with db_connection() as conn:
-        df_inv = pd.read_sql("SELECT * FROM inversiones WHERE estado='ACTIVA' ORDER BY fecha_inicio DESC", conn)
+    dolar_val, df_inv = datos.dolar_val, datos.inversiones
 
     with st.form("nueva_inversion"):
         st.subheader("➕ Nueva Inversión")
@@ -25,8 +31,8 @@ def render(dolar_val):
         if st.form_submit_button("💾 Agregar Inversión"):
             with db_connection() as conn:
                 c = conn.cursor()
-                c.execute("INSERT INTO inversiones (tipo, entidad, monto_inicial, tna, fecha_inicio, plazo_dias, estado) VALUES (%s,%s,%s,%s,%s,%s,'ACTIVA')",
-                          (tipo_inv, entidad_inv, procesar_monto_input(monto_inv), tna_inv, str(fecha_inv), int(plazo_inv)))
+                c.execute("INSERT INTO inversiones (tipo, entidad, monto_inicial, tna, fecha_inicio, plazo_dias, estado, moneda) VALUES (%s,%s,%s,%s,%s,%s,'ACTIVA',%s)",
+                          (tipo_inv, entidad_inv, procesar_monto_input(monto_inv), tna_inv, str(fecha_inv), int(plazo_inv), moneda_inv))
                 conn.commit()
             st.success("Inversión agregada"); st.rerun()
 
@@ -35,26 +41,29 @@ def render(dolar_val):
         st.info("No hay inversiones activas registradas.")
     else:
         hoy_inv = datetime.date.today()
-        total_capital = 0.0; total_ganancia = 0.0
-        for _, inv in df_inv.iterrows():
-            moneda_i = "ARS"
-            ganancia = inv['monto_inicial'] * (inv['tna'] / 100) * (inv['plazo_dias'] / 365) if inv['tna'] > 0 else 0.0
-            total_capital += inv['monto_inicial'] * (dolar_val if moneda_i == 'USD' else 1)
-            total_ganancia += ganancia * (dolar_val if moneda_i == 'USD' else 1)
-            try:
-                fecha_fin_inv = (pd.to_datetime(inv['fecha_inicio']) + datetime.timedelta(days=int(inv['plazo_dias']))).date()
-                dias_rest = (fecha_fin_inv - hoy_inv).days
-            except:
-                fecha_fin_inv = None; dias_rest = None
-            vencida = dias_rest is not None and dias_rest < 0
-            emoji = "⏰" if vencida else "🔄"
-            with st.expander(f"{emoji} {inv['tipo']} — {inv['entidad']}  |  Capital: {formato_moneda_visual(inv['monto_inicial'], 'ARS')}  |  TNA: {inv['tna']}%", expanded=True):
+        val = valuar(df_inv, hoy_inv, dolar_val)
+        sm1, sm2, sm3, sm4 = st.columns(4)
+        sm1.metric("Total Capital (ARS)", formato_moneda_visual(val['monto_inicial_ars'].sum(), 'ARS'))
+        sm2.metric("Devengado a Hoy (ARS)", formato_moneda_visual(val['ganancia_actual_ars'].sum(), 'ARS'))
+        sm3.metric("Ganancia al Vencimiento (ARS)", formato_moneda_visual(val['ganancia_final_ars'].sum(), 'ARS'))
+        sm4.metric("Total Portafolio Hoy (ARS)", formato_moneda_visual(val['valor_actual_ars'].sum(), 'ARS'))
+        serie = serie_portafolio(df_inv, hoy_inv, dolar_val)
+        if len(serie) > 1:
+            st.caption("📈 Valor diario del portafolio (ARS, USD al dólar de hoy)")
+            st.area_chart(serie, height=220)
+        st.divider()
+
+        for inv in val.to_dict('records'):
+            mon = inv['moneda'] or 'ARS'
+            dias_rest = None if pd.isna(inv['dias_restantes']) else int(inv['dias_restantes'])
+            emoji = "⏰" if inv['vencida'] else "🔄"
+            with st.expander(f"{emoji} {inv['tipo']} — {inv['entidad']}  |  Capital: {formato_moneda_visual(inv['monto_inicial'], mon)}  |  TNA: {inv['tna']}%", expanded=True):
                 ki1, ki2, ki3, ki4 = st.columns(4)
-                ki1.metric("Capital", formato_moneda_visual(inv['monto_inicial'], 'ARS'))
-                ki2.metric("Ganancia Est.", formato_moneda_visual(ganancia, 'ARS'))
-                ki3.metric("Total Est.", formato_moneda_visual(inv['monto_inicial'] + ganancia, 'ARS'))
-                ki4.metric("Vencimiento", str(fecha_fin_inv) if fecha_fin_inv else "N/A",
-                           delta=f"{'Vencida hace' if vencida else 'Faltan'} {abs(dias_rest)} días" if dias_rest is not None else "")
+                ki1.metric("Capital", formato_moneda_visual(inv['monto_inicial'], mon))
+                ki2.metric("Devengado a Hoy", formato_moneda_visual(inv['ganancia_actual'], mon))
+                ki3.metric("Total al Vencimiento", formato_moneda_visual(inv['valor_final'], mon), delta=formato_moneda_visual(inv['ganancia_final'], mon))
+                ki4.metric("Vencimiento", str(inv['fecha_fin']) if dias_rest is not None else "N/A",
+                           delta=f"{'Vencida hace' if inv['vencida'] else 'Faltan'} {abs(dias_rest)} días" if dias_rest is not None else "")
                 ka1, ka2 = st.columns(2)
                 if ka1.button("Archivar como Cobrada", key=f"arch_inv_{inv['id']}"):
                     with db_connection() as conn:
@@ -68,8 +77,3 @@ def render(dolar_val):
                         c.execute("DELETE FROM inversiones WHERE id=%s", (inv['id'],))
                         conn.commit()
                     st.rerun()
-        st.divider()
-        sm1, sm2, sm3 = st.columns(3)
-        sm1.metric("Total Capital (ARS)", formato_moneda_visual(total_capital, 'ARS'))
-        sm2.metric("Total Ganancia Est. (ARS)", formato_moneda_visual(total_ganancia, 'ARS'))
-        sm3.metric("Total Portafolio (ARS)", formato_moneda_visual(total_capital + total_ganancia, 'ARS'))
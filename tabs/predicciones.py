@@ -2,54 +2,58 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.pipeline import make_pipeline
 from config import LISTA_MESES_LARGA
 from utils import formato_moneda_visual
+from cache_disco import cacheado
 
 
-def render(df_all):
+def serie_mensual(df_all, cierres=None):
+    """Ganancias, gastos y saldo en ARS por mes (mes_idx = posicion en LISTA_MESES_LARGA). Acepta filas o resumen mensual;
+    los meses de `cierres` salen de sus totales congelados."""
+    cerrados = cierres['mes'] if cierres is not None else []
+    df_pred = df_all[(df_all['moneda'] == 'ARS') & df_all['mes'].isin(LISTA_MESES_LARGA) & ~df_all['mes'].isin(cerrados)]
+    monthly = pd.DataFrame({
+        'mes': df_pred['mes'].astype(object),
+        'ganancias': df_pred['monto'].where(df_pred['tipo'] == 'GANANCIA', 0.0),
+        'gastos': df_pred['monto'].where(df_pred['tipo'] == 'GASTO', 0.0),
+    }).groupby('mes', sort=False).sum().reset_index()
+    if cierres is not None and not cierres.empty:
+        monthly = pd.concat([cierres.loc[(cierres['ganancias'] != 0) | (cierres['gastos'] != 0), ['mes', 'ganancias', 'gastos']].astype({'mes': object}), monthly], ignore_index=True)
+    monthly.insert(0, 'mes_idx', monthly['mes'].map(LISTA_MESES_LARGA.index).astype(int))
+    monthly = monthly.sort_values('mes_idx').reset_index(drop=True)
+    monthly['saldo'] = monthly['ganancias'] - monthly['gastos']
+    return monthly
+
+
+@cacheado("predicciones", ttl=86400)
+def proyectar(monthly, grado, future_idx):
+    """Minimos cuadrados con numpy (mismo ajuste que LinearRegression + PolynomialFeatures, sin importar sklearn)."""
+    X = monthly['mes_idx'].to_numpy(dtype=float)
+    return {col: np.maximum(np.polyval(np.polyfit(X, monthly[col].values, min(grado, len(X) - 1)), future_idx), 0)
+            for col in ['ganancias', 'gastos', 'saldo']}
+
+
+def render(datos):
     st.header("🔮 Predicciones de Tendencia")
-    if df_all.empty:
+    resumen = datos.resumen
+    if resumen.empty:
         st.info("No hay datos suficientes para hacer predicciones.")
         return
 
-    df_pred = df_all[df_all['moneda'] == 'ARS'].copy()
-    df_pred['mes_idx'] = df_pred['mes'].apply(lambda m: LISTA_MESES_LARGA.index(m) if m in LISTA_MESES_LARGA else -1)
-    df_pred = df_pred[df_pred['mes_idx'] >= 0]
-    monthly = df_pred.groupby(['mes_idx', 'mes']).apply(
-        lambda g: pd.Series({
-            'ganancias': g[g['tipo'] == 'GANANCIA']['monto'].sum(),
-            'gastos': g[g['tipo'] == 'GASTO']['monto'].sum(),
-        })
-    ).reset_index().sort_values('mes_idx')
-    monthly['saldo'] = monthly['ganancias'] - monthly['gastos']
+    monthly = serie_mensual(resumen, datos.cierres)
 
     if len(monthly) < 2:
         st.warning("Se necesitan al menos 2 meses de datos historicos en ARS para generar predicciones.")
         return
 
-    X = monthly['mes_idx'].values.reshape(-1, 1)
     pc1, pc2 = st.columns(2)
     n_fut = pc1.slider("Meses a predecir:", 3, 12, 6)
     modelo_tipo = pc2.selectbox("Modelo", ["Lineal", "Polinomico (grado 2)", "Polinomico (grado 3)"])
 
     last_idx = int(monthly['mes_idx'].max())
     future_idx = [i for i in range(last_idx + 1, last_idx + n_fut + 1) if i < len(LISTA_MESES_LARGA)]
-    future_meses = [LISTA_MESES_LARGA[i] for i in future_idx]
-    X_future = np.array(future_idx).reshape(-1, 1)
-    pred_data = {'mes': future_meses}
-
-    for col in ['ganancias', 'gastos', 'saldo']:
-        if modelo_tipo == "Lineal":
-            model = LinearRegression()
-        elif modelo_tipo == "Polinomico (grado 2)":
-            model = make_pipeline(PolynomialFeatures(degree=2), LinearRegression())
-        else:
-            model = make_pipeline(PolynomialFeatures(degree=3), LinearRegression())
-        model.fit(X, monthly[col].values)
-        pred_data[col] = np.maximum(model.predict(X_future), 0)
+    grado = {"Lineal": 1, "Polinomico (grado 2)": 2}.get(modelo_tipo, 3)
+    pred_data = {'mes': [LISTA_MESES_LARGA[i] for i in future_idx], **proyectar(monthly, grado, np.array(future_idx, dtype=float))}
 
     df_future = pd.DataFrame(pred_data)
     modelo_label = modelo_tipo.replace("Polinomico", "Polinómica")
@@ -47,6 +47,52 @@ class TestFormatoMoneda(unittest.TestCase):
         self.assertEqual(self.proc(None), 0.0)
 
 
+class TestLottie(unittest.TestCase):
+    def test_no_cachea_fallos(self):
+        from unittest import mock
+        import utils
+        utils._bajar_lottie.cache_clear()
+        ok = mock.Mock(json=lambda: {"v": 1})
+        with mock.patch.object(utils.requests, "get", side_effect=[Exception("red"), ok]) as get:
+            self.assertIsNone(utils.load_lottieurl("u"))
+            self.assertEqual(utils.load_lottieurl("u"), {"v": 1})
+            self.assertEqual(utils.load_lottieurl("u"), {"v": 1})
+            self.assertEqual(get.call_count, 2)
+        utils._bajar_lottie.cache_clear()
+
+
+class TestImportador(unittest.TestCase):
+    def test_montos_vectorizado_igual_a_escalar(self):
+        import pandas as pd
+        from utils import procesar_montos_serie, procesar_monto_input
+        valores = ["1.500,50", "$ 2.000,00", "US$ 100,00", "", None, "abc", " -3.250,5 ", 100, 99.5]
+        res = procesar_montos_serie(pd.Series(valores, dtype=object)).tolist()
+        self.assertEqual(res, [procesar_monto_input(v) for v in valores])
+
+    def test_mapear_bloque(self):
+        import pandas as pd
+        from importador import mapear_bloque
+        df = pd.DataFrame({"F": ["05/03/2026", "31/12/2026", "xx", "01/01/2040"], "D": ["Café", "Sueldo", "a", "b"],
+                           "I": ["-1.000,50", "250.000,00", "1", "1"]})
+        out, descartadas = mapear_bloque(df, {"fecha": "F", "concepto": "D", "monto": "I"}, "VARIOS", {"CAFÉ": "CASA"}, "ARS", "Bancario")
+        self.assertEqual(descartadas, 2)
+        self.assertEqual(out["mes"].tolist(), ["Marzo 2026", "Diciembre 2026"])
+        self.assertEqual(out["tipo"].tolist(), ["GASTO", "GANANCIA"])
+        self.assertEqual(out["grupo"].tolist(), ["CASA", "VARIOS"])
+        self.assertEqual(out["monto"].tolist(), [1000.5, 250000.0])
+        self.assertEqual(out["fecha_pago"].tolist(), ["2026-03-05", "2026-12-31"])
+
+    def test_hash_ignora_mayusculas_y_precision_real(self):
+        import pandas as pd
+        from importador import hash_contenido
+        base = {"mes": "Enero 2026", "fecha_pago": "2026-01-05", "tipo": "GASTO", "moneda": "ARS"}
+        a = pd.DataFrame([{**base, "tipo_gasto": "Café ", "monto": 1234.57}])
+        b = pd.DataFrame([{**base, "tipo_gasto": "CAFÉ", "monto": 1234.5699462890625}])
+        c = pd.DataFrame([{**base, "tipo_gasto": "CAFÉ", "monto": 1234.58}])
+        self.assertEqual(hash_contenido(a)[0], hash_contenido(b)[0])
+        self.assertNotEqual(hash_contenido(a)[0], hash_contenido(c)[0])
+
+
 class TestConfig(unittest.TestCase):
     def test_meses_nombres_len(self):
         from config import MESES_NOMBRES
@@ -89,6 +135,630 @@ class TestSalarios(unittest.TestCase):
         self.assertIsNone(result)
 
 
+class TestParticiones(unittest.TestCase):
+    def test_un_anio_por_particion(self):
+        from db import particiones_movimientos
+        from config import LISTA_MESES_LARGA
+        parts = particiones_movimientos()
+        self.assertEqual(len(parts), 10)
+        self.assertEqual(sum(len(m) for m in parts.values()), len(LISTA_MESES_LARGA))
+        self.assertEqual(parts[2026][0], "Enero 2026")
+        self.assertEqual(parts[2035][-1], "Diciembre 2035")
+
+    def test_sql_mover_particion(self):
+        from db import _sql_mover_particion
+        detach, attach = _sql_mover_particion(2027, "movimientos", "movimientos_archivo")
+        self.assertIn("DETACH PARTITION movimientos_2027", detach)
+        self.assertIn("'Diciembre 2027'", attach)
+
+
+class TestCotizaciones(unittest.TestCase):
+    def test_tasas_asof(self):
+        import pandas as pd
+        from utils import tasas_asof
+        cot = pd.DataFrame({"fecha": pd.to_datetime(["2026-01-01", "2026-02-01"]), "valor": [1000.0, 1100.0]})
+        fechas = ["2026-01-15", "2025-12-31", None, "2026-03-01", "2026-02-01"]
+        self.assertEqual(tasas_asof(fechas, cot, 1500.0).tolist(), [1000.0, 1000.0, 1000.0, 1100.0, 1100.0])
+        self.assertEqual(tasas_asof(fechas, cot.iloc[:0], 1500.0).tolist(), [1500.0] * 5)
+
+
+class TestFiltroMovimientos(unittest.TestCase):
+    def test_solo_mes(self):
+        from consultas import construir_filtro_movimientos
+        where, params = construir_filtro_movimientos("Enero 2026")
+        self.assertEqual(where, "mes = %s")
+        self.assertEqual(params, ["Enero 2026"])
+
+    def test_todos_los_filtros(self):
+        from consultas import construir_filtro_movimientos
+        where, params = construir_filtro_movimientos("Enero 2026", "CASA", "luz", "USD", "Efectivo", "Pendiente")
+        self.assertIn("tipo_gasto ILIKE %s", where)
+        self.assertIn("pagado IS NOT TRUE", where)
+        self.assertEqual(params, ["Enero 2026", "CASA", "%luz%", "USD", "Efectivo"])
+
+    def test_busqueda_escapa_comodines(self):
+        from consultas import construir_filtro_movimientos
+        _, params = construir_filtro_movimientos("Enero 2026", busqueda="10%_off")
+        self.assertEqual(params[-1], "%10\\%\\_off%")
+
+    def test_normalizar_busqueda(self):
+        from consultas import normalizar_busqueda
+        self.assertEqual(normalizar_busqueda("  Café  Ñandú "), "cafe nandu")
+        self.assertEqual(normalizar_busqueda("Contrato C-22/B"), "contrato c 22 b")
+        self.assertEqual(normalizar_busqueda(None), "")
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_escribir_y_abrir(self):
+        import os
+        import tempfile
+        from unittest import mock
+        import pandas as pd
+        import snapshot
+        if not snapshot.HAS_ARROW: self.skipTest("pyarrow not installed")
+        df = pd.DataFrame({"id": [1, 2], "mes": ["Enero 2026", "Febrero 2026"], "monto": [10.5, 20.0], "pagado": [True, False], "cuota": [None, "1/3"]})
+        self.addCleanup(setattr, snapshot, "SNAPSHOT_DIR", snapshot.SNAPSHOT_DIR)
+        with tempfile.TemporaryDirectory() as d:
+            snapshot.SNAPSHOT_DIR = d
+            snapshot._escribir(snapshot._a_tabla(df), {"Enero 2026": "1"})
+            ruta = snapshot._escribir(snapshot._a_tabla(df.iloc[:1]), {"Enero 2026": "2"})
+            self.assertEqual(snapshot._ruta_actual(), ruta)
+            with mock.patch.dict(os.environ, {"DATABASE_URL": "sqlite:///otra.db"}):
+                self.assertIsNone(snapshot._ruta_actual())  # otra base, aunque tenga las mismas versiones
+            tabla, versiones = snapshot._abrir(ruta)
+            self.assertEqual(versiones, {"Enero 2026": "2"})
+            self.assertEqual(tabla.schema.field("pagado").type, snapshot.pa.bool_())
+            self.assertEqual(tabla.to_pandas()["monto"].tolist(), [10.5])
+            del tabla
+
+
+class TestEscucha(unittest.TestCase):
+    def test_reconexion_cierra_la_conexion_cortada(self):
+        from unittest import mock
+        import cambios
+        conn = mock.MagicMock(); conn.cursor.return_value.execute.side_effect = OSError("corte")
+        with mock.patch.object(cambios.psycopg2, "connect", return_value=conn), mock.patch.object(cambios.time, "sleep", side_effect=StopIteration), \
+                self.assertLogs("cambios", "ERROR"), self.assertRaises(StopIteration):
+            cambios.Escucha("postgresql://x").run()  # sale en la espera antes de reconectar
+        conn.close.assert_called_once()
+
+
+class TestSQLite(unittest.TestCase):
+    """Esquema, consultas e importador contra una base SQLite temporal (sin servidor)."""
+    def setUp(self):
+        import os
+        import tempfile
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = os.environ.get("DATABASE_URL")
+        os.environ["DATABASE_URL"] = f"sqlite:///{self.tmp.name}/test.db"
+        import categorizador  # los modelos que entrenan el importador y el alta van al directorio temporal
+        self.addCleanup(setattr, categorizador, "MODELO_DIR", categorizador.MODELO_DIR)
+        self.addCleanup(categorizador._estado.update, ruta=None, modelo=None, cargando=None)
+        categorizador.MODELO_DIR = self.tmp.name; categorizador._estado.update(ruta=None, modelo=None, cargando=None)
+        import cache_disco
+        import snapshot  # cache y snapshot de la app, tambien fuera del home
+        for mod, nombre in [(cache_disco, "CACHE_DIR"), (snapshot, "SNAPSHOT_DIR")]:
+            self.addCleanup(setattr, mod, nombre, getattr(mod, nombre)); setattr(mod, nombre, os.path.join(self.tmp.name, nombre.lower()))
+        from db import init_db, db_connection
+        init_db()
+        with db_connection() as conn:
+            c = conn.cursor()
+            c.executemany("INSERT INTO movimientos (fecha, mes, tipo, grupo, tipo_gasto, contrato, cuota, monto, moneda, forma_pago, fecha_pago, pagado) VALUES (%s,%s,%s,%s,%s,%s,'',%s,%s,'Efectivo',%s,%s)", [
+                ("2026-01-01", "Enero 2026", "GASTO", "CASA", "Café Martínez", "", 100.0, "ARS", "2026-01-05", True),
+                ("2026-01-01", "Enero 2026", "GASTO", "CASA", "Luz 100%", "C-22", 50.0, "USD", "2026-01-10", False),
+                ("2026-01-01", "Febrero 2026", "GANANCIA", "VARIOS", "Sueldo", "", 1000.0, "ARS", "2026-02-01", False)])
+            conn.commit()
+
+    def tearDown(self):
+        import os
+        import db_sqlite
+        db_sqlite.cerrar()
+        if self.env is None: os.environ.pop("DATABASE_URL", None)
+        else: os.environ["DATABASE_URL"] = self.env
+        self.tmp.cleanup()
+
+    def test_traducir(self):
+        from db_sqlite import traducir
+        sql, params = traducir("SELECT * FROM t WHERE mes = ANY(%s) AND x ILIKE %s AND y %% 2 = 0", (["a", "b"], "%q%"))
+        self.assertEqual(sql, "SELECT * FROM t WHERE mes IN (?, ?) AND x LIKE ? ESCAPE '\\' AND y % 2 = 0")
+        self.assertEqual(params, ["a", "b", "%q%"])
+        self.assertEqual(traducir("DELETE FROM t WHERE id IN %s", ((),))[0], "DELETE FROM t WHERE id IN (NULL)")
+
+    def test_filtros_y_totales(self):
+        from consultas import construir_filtro_movimientos, totales_por_grupo, primeras_paginas
+        where, params = construir_filtro_movimientos("Enero 2026", busqueda="100%", estado="Pendiente")
+        tot = totales_por_grupo(where, params, 1000.0)
+        self.assertEqual(tot["total_ars"].tolist(), [50000.0])
+        pag = primeras_paginas(*construir_filtro_movimientos("Enero 2026"))
+        self.assertEqual(pag["pagado"].tolist(), [False, True])
+
+    def test_buscar_sin_acentos(self):
+        from consultas import buscar_movimientos
+        self.assertEqual(buscar_movimientos("cafe martinez")["tipo_gasto"].tolist(), ["Café Martínez"])
+        self.assertEqual(buscar_movimientos("c 22")["contrato"].tolist(), ["C-22"])
+
+    def test_version_por_mes(self):
+        from db import versiones_movimientos, db_connection
+        antes = versiones_movimientos()
+        with db_connection() as conn:
+            conn.cursor().execute("UPDATE movimientos SET monto = monto WHERE mes = %s", ("Enero 2026",))
+            conn.cursor().execute("UPDATE movimientos SET monto = 1 WHERE mes = %s", ("Febrero 2026",)); conn.commit()
+        despues = versiones_movimientos()
+        self.assertEqual(despues["Enero 2026"], antes["Enero 2026"])
+        self.assertGreater(despues["Febrero 2026"], antes["Febrero 2026"])
+
+    def test_deltas_igual_a_recarga(self):
+        import pandas as pd
+        from cambios import version_actual, leer_cambios, aplicar_cambios
+        from memoria import compactar
+        from db import db_connection
+        with db_connection() as conn:
+            c = conn.cursor()
+            df, v = compactar(pd.read_sql("SELECT * FROM movimientos", conn)), version_actual(c)
+            c.execute("UPDATE movimientos SET monto = 7, mes = 'Marzo 2026' WHERE tipo_gasto = 'Sueldo'")
+            c.execute("UPDATE movimientos SET monto = monto")
+            c.execute("DELETE FROM movimientos WHERE contrato = 'C-22'")
+            c.execute("INSERT INTO movimientos (mes, tipo, monto, moneda, pagado) VALUES ('Enero 2026', 'GASTO', 3, 'ARS', FALSE)"); conn.commit()
+            version, ids, meses = leer_cambios(c, v)
+            self.assertEqual((version - v, len(ids), meses), (3, 3, []))
+            delta = aplicar_cambios(df, conn, ids, meses).sort_values("id", ignore_index=True)
+            completo = compactar(pd.read_sql("SELECT * FROM movimientos ORDER BY id", conn))
+        pd.testing.assert_frame_equal(delta, completo, check_dtype=False, check_categorical=False)
+
+    def test_cli_sin_streamlit(self):
+        import os
+        import subprocess
+        import sys
+        from db import db_connection
+        with db_connection() as conn:
+            conn.cursor().execute("INSERT INTO recurrentes (tipo, grupo, tipo_gasto, contrato, monto, moneda, forma_pago) VALUES ('GASTO', 'CASA', 'Expensas', '', 10, 'ARS', 'Efectivo')"); conn.commit()
+        codigo = "import sys, cli; cli.main(sys.argv[1:]); print('streamlit' in sys.modules)"
+        correr = lambda *a: subprocess.run([sys.executable, "-c", codigo, *a], capture_output=True, text=True, check=True,
+                                           cwd=os.path.dirname(os.path.abspath(__file__))).stdout.splitlines()
+        salida = correr("recurrentes", "--mes", "Enero 2026", "Febrero 2026")
+        self.assertTrue(salida[0].startswith("2 movimientos recurrentes generados en 2 meses"))
+        self.assertEqual(salida[-1], "False")
+        self.assertTrue(correr("recurrentes", "--mes", "Enero 2026")[0].startswith("0 movimientos"))
+
+    def test_duplicados(self):
+        import pandas as pd
+        from db import db_connection
+        from duplicados import detectar, fusionar_duplicados
+        with db_connection() as conn:
+            c = conn.cursor()
+            c.executemany("INSERT INTO movimientos (fecha, mes, tipo, grupo, tipo_gasto, contrato, cuota, monto, moneda, forma_pago, fecha_pago, pagado) VALUES (%s,%s,%s,%s,%s,%s,'',%s,%s,'Efectivo',%s,%s)", [
+                ("2026-01-02", "Enero 2026", "GASTO", "CASA", "CAFE MARTINEZ ", "T-1", 100.3, "ARS", "2026-01-05", False),
+                ("2026-01-02", "Enero 2026", "GASTO", "CASA", "Luz 100%", "C-23", 50.0, "USD", "2026-01-10", False)])  # otro contrato: no es copia
+            conn.commit()
+            pares = detectar(pd.read_sql("SELECT * FROM movimientos", conn))
+        self.assertEqual(len(pares), 1)
+        self.assertEqual(pares["concepto_a"].iloc[0], "Café Martínez")
+        self.assertGreater(pares["puntaje"].iloc[0], 0.9)
+        self.assertEqual(fusionar_duplicados(pares[["id_a", "id_b"]].itertuples(index=False)), (1, ["Enero 2026"]))
+        with db_connection() as conn:
+            c = conn.cursor(); c.execute("SELECT tipo_gasto, contrato, monto, pagado FROM movimientos WHERE tipo_gasto LIKE 'C%'")
+            self.assertEqual([tuple(r[:3]) + (bool(r[3]),) for r in c.fetchall()], [("Café Martínez", "T-1", 100.0, True)])
+
+    def test_categorizador(self):
+        from unittest import mock
+        import pickle
+        import categorizador
+        from db import db_connection
+        def cargar(filas):
+            with db_connection() as conn:
+                conn.cursor().executemany("INSERT INTO movimientos (fecha, mes, tipo, grupo, tipo_gasto, contrato, cuota, monto, moneda, forma_pago, fecha_pago, pagado) VALUES ('2026-01-01','Enero 2026','GASTO',%s,%s,'','',1,'ARS','Efectivo','2026-01-01',FALSE)", [(g, t) for t, g in filas])
+                conn.commit()
+        cargar([("Supermercado Coto", "CASA"), ("Farmacia del Pueblo", "CASA"), ("Nafta YPF", "AUTO"), ("Seguro La Caja", "AUTO"), ("Cine Hoyts", "VARIOS")] * 4)
+        grupo, confianza = categorizador.sugerir("SUPERMERCADO  coto")
+        self.assertEqual(grupo, "CASA")
+        m = categorizador._modelo()  # el hash a mano da lo mismo que HashingVectorizer + predict_proba
+        self.assertAlmostEqual(confianza, m["clf"].predict_proba(m["vec"].transform([categorizador._texto("SUPERMERCADO  coto")])).max())
+        self.assertEqual(categorizador.categorizar_lote(["Nafta YPF ruta 2", "cine hoyts"])[0].tolist(), ["AUTO", "VARIOS"])
+        self.assertNotEqual(categorizador.sugerir("Gimnasio Megatlon")[0], "DEUDAS")
+        cargar([("Gimnasio Megatlon", "DEUDAS")] * 3)
+        with mock.patch.object(categorizador, "entrenar", side_effect=AssertionError):
+            categorizador.aprender()  # incremental: partial_fit con las filas nuevas
+            self.assertEqual(categorizador.sugerir("Gimnasio Megatlon")[0], "DEUDAS")
+            def version():
+                with open(categorizador._ruta(), "rb") as f: return pickle.load(f)["version"]
+            self.assertLess(version(), categorizador._modelo()["version"])  # el archivo se reescribe despues
+            categorizador._guardar_si_toca(forzar=True)
+            self.assertEqual(version(), categorizador._modelo()["version"])
+            categorizador._estado.update(ruta=None, modelo=None, cargando=None)  # otro proceso: lo lee de disco, en un hilo
+            self.assertEqual(categorizador.sugerir("Gimnasio Megatlon", esperar=False), (None, 0.0))
+            categorizador._estado["hilo"].join()
+            self.assertEqual(categorizador.sugerir("Gimnasio Megatlon", esperar=False)[0], "DEUDAS")
+
+    def test_anomalias_incremental(self):
+        import tempfile
+        import pandas as pd
+        import cache_disco
+        from db import db_connection
+        from anomalias import actualizar_anomalias, puntuar, totales, _leer
+        d = tempfile.TemporaryDirectory(); self.addCleanup(d.cleanup)
+        self.addCleanup(setattr, cache_disco, "CACHE_DIR", cache_disco.CACHE_DIR); cache_disco.CACHE_DIR = d.name
+        with db_connection() as conn:
+            conn.cursor().executemany("INSERT INTO movimientos (fecha, mes, tipo, grupo, tipo_gasto, contrato, cuota, monto, moneda, forma_pago, fecha_pago, pagado) VALUES ('2026-01-01',%s,'GASTO','SERVICIOS','Gas','','',%s,'ARS','Efectivo','2026-01-01',FALSE)",
+                                      [(m, 80.0) for m in ("Febrero 2026", "Marzo 2026", "Abril 2026")] + [("Mayo 2026", 81.0)])
+            conn.commit()
+        res, n = actualizar_anomalias(1.0)
+        self.assertFalse(res["anomalia"].any())
+        self.assertEqual(actualizar_anomalias(1.0)[1], 0)  # sin cambios: nada que recalcular
+        with db_connection() as conn:
+            conn.cursor().execute("UPDATE movimientos SET monto = 400 WHERE mes = 'Mayo 2026'"); conn.commit()
+        res, n = actualizar_anomalias(1.0)
+        self.assertEqual(n, 2)  # solo las series con gasto en mayo: grupo SERVICIOS y concepto GAS
+        self.assertEqual(sorted(res[res["anomalia"]]["clave"]), ["GAS", "SERVICIOS"])
+        orden = ["nivel", "clave", "mes"]
+        pd.testing.assert_frame_equal(res.sort_values(orden, ignore_index=True), puntuar(totales(_leer(), 1.0)).sort_values(orden, ignore_index=True))
+
+    def test_planes_cuotas(self):
+        from db import db_connection
+        from config import LISTA_MESES_LARGA
+        from unittest import mock
+        import cuotas as mod
+        from cuotas import crear_plan, materializar, editar_plan, cancelar_plan, listar_planes, vincular_cuotas
+        def cuotas(plan_id):
+            with db_connection() as conn:
+                c = conn.cursor(); c.execute("SELECT mes, cuota, monto, pagado FROM movimientos WHERE plan_id = %s ORDER BY id", (plan_id,))
+                return [(m, q, mo, bool(p)) for m, q, mo, p in c.fetchall()]
+        with db_connection() as conn, mock.patch.object(mod, "horizonte", return_value=LISTA_MESES_LARGA.index("Diciembre 2026")):
+            c = conn.cursor()
+            plan = crear_plan(c, "Marzo 2026", "GASTO", "CASA", "Heladera", "", 100.0, "ARS", "Tarjeta de Credito", "2026-03-10", True, 2, 12)
+            self.assertEqual(materializar(c, LISTA_MESES_LARGA.index("Mayo 2026")), (0, []))  # ya estaban hasta el horizonte
+            conn.commit()
+        self.assertEqual(cuotas(plan)[0], ("Marzo 2026", "2/12", 100.0, True))
+        self.assertEqual(cuotas(plan)[-1][:2], ("Diciembre 2026", "11/12"))
+        self.assertEqual(editar_plan(plan, monto=150.0)[0], 9)  # una sentencia; la pagada no cambia
+        with db_connection() as conn:
+            c = conn.cursor(); c.execute("DELETE FROM movimientos WHERE plan_id = %s AND cuota = '3/12'", (plan,))
+            self.assertEqual(materializar(c, LISTA_MESES_LARGA.index("Diciembre 2027")), (1, ["Enero 2027"]))  # la borrada no vuelve
+            conn.commit()
+        self.assertEqual([q[1:3] for q in cuotas(plan)[-2:]], [("11/12", 150.0), ("12/12", 150.0)])
+        planes = listar_planes()
+        self.assertEqual((planes["pagadas"].iloc[0], planes["saldo"].iloc[0]), (2, 1350.0))
+        self.assertEqual(cancelar_plan(plan)[0], 9)
+        self.assertEqual(cuotas(plan), [("Marzo 2026", "2/12", 100.0, True)])
+        with db_connection() as conn:  # cuotas cargadas antes de los planes: dos compras iguales en meses distintos
+            conn.cursor().executemany("INSERT INTO movimientos (fecha, mes, tipo, grupo, tipo_gasto, contrato, cuota, monto, moneda, forma_pago, fecha_pago, pagado) VALUES ('2026-01-01',%s,'GASTO','AUTO','Cubiertas','',%s,50,'ARS','Efectivo','2026-01-01',FALSE)",
+                                      [("Enero 2026", "1/3"), ("Febrero 2026", "2/3"), ("Marzo 2026", "3/3"), ("Febrero 2026", "1/3"), ("Marzo 2026", "2/3")])
+            conn.commit()
+        self.assertEqual(vincular_cuotas(), (2, 5))
+        self.assertEqual(vincular_cuotas(), (0, 0))
+        self.assertEqual(listar_planes()["saldo"].tolist(), [150.0, 150.0])  # al segundo le falta generar la 3/3: va al monto del plan
+
+    def test_cierre_de_mes(self):
+        import pandas as pd
+        from db import db_connection
+        from logic import actualizar_saldos
+        from cierres import cerrar_mes, reabrir_mes, leer_cierres
+        from tabs.predicciones import serie_mensual
+        from tabs.dashboard import evolucion_patrimonial
+        def escribir(sql, params=()):
+            with db_connection() as conn: conn.cursor().execute(sql, params); conn.commit()
+        alta = "INSERT INTO movimientos (fecha, mes, tipo, grupo, tipo_gasto, cuota, monto, moneda, forma_pago, fecha_pago, pagado) VALUES ('2026-01-01',%s,'GASTO','CASA','Gas','',10,'ARS','Efectivo','2026-01-01',FALSE)"
+        self.assertEqual(cerrar_mes("Febrero 2026", 1000.0), ["Enero 2026", "Febrero 2026"])  # cierra tambien los anteriores
+        self.assertEqual(cerrar_mes("Enero 2026", 1000.0), [])
+        c = leer_cierres().set_index("mes")
+        self.assertEqual((c.loc["Enero 2026", "saldo"], c.loc["Enero 2026", "neto_usd"], c.loc["Enero 2026", "filas"]), (-100.0, -50000.0, 2))
+        self.assertEqual(c.loc["Febrero 2026", "saldo"], 900.0)  # el Ahorro Mes Anterior se actualizo antes de cerrar
+        for sql, params in [(alta, ("Febrero 2026",)), ("UPDATE movimientos SET monto = 1 WHERE mes = %s", ("Enero 2026",)),
+                            ("DELETE FROM movimientos WHERE mes = %s", ("Febrero 2026",)), ("UPDATE movimientos SET mes = %s WHERE mes = 'Marzo 2026'", ("Enero 2026",))]:
+            with self.assertRaises(Exception): escribir(sql, params)
+        escribir(alta, ("Marzo 2026",))
+        actualizar_saldos("Enero 2026")  # arranca del ultimo cierre con su saldo guardado
+        with db_connection() as conn:
+            df = pd.read_sql("SELECT * FROM movimientos", conn)
+        self.assertEqual(df.loc[(df["mes"] == "Marzo 2026") & (df["tipo_gasto"] == "Ahorro Mes Anterior"), "monto"].tolist(), [900.0])
+        self.assertEqual(len(df[df["mes"] == "Febrero 2026"]), 2)
+        # Los totales congelados dan lo mismo que agregar las filas
+        pd.testing.assert_frame_equal(serie_mensual(df, leer_cierres()), serie_mensual(df), check_dtype=False)
+        pd.testing.assert_frame_equal(evolucion_patrimonial(df, 1000.0, cierres=leer_cierres()), evolucion_patrimonial(df, 1000.0), check_dtype=False)
+        self.assertEqual(reabrir_mes("Febrero 2026"), ["Febrero 2026"])
+        escribir(alta, ("Febrero 2026",))
+        with self.assertRaises(Exception): escribir(alta, ("Enero 2026",))
+        self.assertEqual(leer_cierres()["mes"].tolist(), ["Enero 2026"])
+        # Archivar mueve las filas del año aunque tenga meses cerrados; despues el bloqueo sigue
+        from db import _mover_anio_sqlite
+        for origen, destino in [("movimientos", "movimientos_archivo"), ("movimientos_archivo", "movimientos")]:
+            with db_connection() as conn: _mover_anio_sqlite(conn.cursor(), 2026, origen, destino); conn.commit()
+        with db_connection() as conn:
+            df2 = pd.read_sql("SELECT * FROM movimientos", conn)
+        self.assertEqual(len(df2[df2["mes"] == "Enero 2026"]), len(df[df["mes"] == "Enero 2026"]))
+        with self.assertRaises(Exception): escribir("DELETE FROM movimientos WHERE mes = %s", ("Enero 2026",))
+
+    def test_archivar_anio_previo_a_la_lista(self):
+        from db import db_connection, listar_particiones, archivar_anio, desarchivar_anio
+        with db_connection() as conn:
+            conn.cursor().execute("INSERT INTO movimientos (fecha, mes, tipo, grupo, tipo_gasto, cuota, monto, moneda, forma_pago, fecha_pago, pagado) VALUES ('2024-03-01','Marzo 2024','GASTO','CASA','Viejo','',7,'ARS','Efectivo','2024-03-01',TRUE)")
+            conn.commit()
+        self.assertIn((2024, "ACTIVA", 1), listar_particiones())
+        self.assertTrue(archivar_anio(2024))
+        self.assertIn((2024, "ARCHIVO", 1), listar_particiones())
+        desarchivar_anio(2024)
+        self.assertIn((2024, "ACTIVA", 1), listar_particiones())
+
+    def test_conexion_anidada_no_descarta_lo_pendiente(self):
+        from db import db_connection
+        with db_connection() as conn:
+            c = conn.cursor(); c.execute("DELETE FROM movimientos WHERE tipo_gasto = 'Sueldo'")
+            with db_connection() as interna:
+                interna.cursor().execute("SELECT count(*) FROM movimientos")  # el bloque interno termina sin commit
+            conn.commit()
+        with db_connection() as conn:
+            c = conn.cursor(); c.execute("SELECT count(*) FROM movimientos WHERE tipo_gasto = 'Sueldo'")
+            self.assertEqual(c.fetchone()[0], 0)
+        with db_connection() as conn:  # el bloque externo sin commit si se descarta
+            conn.cursor().execute("DELETE FROM movimientos")
+        with db_connection() as conn:
+            c = conn.cursor(); c.execute("SELECT count(*) FROM movimientos")
+            self.assertEqual(c.fetchone()[0], 2)
+
+    def test_estadisticas_pool_e_init_una_vez(self):
+        from unittest import mock
+        import db
+        from db import db_connection, estadisticas_pool, init_db_una_vez
+        estadisticas_pool(reiniciar=True)
+        with db_connection():
+            with db_connection(): self.assertEqual(estadisticas_pool()["en_uso"], 2)
+        e = estadisticas_pool(reiniciar=True)
+        self.assertEqual((e["pedidas"], e["agotado"], e["en_uso"], e["pico"]), (2, 0, 0, 2))
+        self.assertEqual(estadisticas_pool()["pedidas"], 0)
+        # El esquema se crea una vez por base: los reruns siguientes no corren DDL
+        with mock.patch.object(db, "init_db", return_value=True) as init:
+            db._esquema["clave"] = None
+            init_db_una_vez(); init_db_una_vez()
+            self.assertEqual(init.call_count, 1)
+            # Al dia siguiente solo se poda el registro de cambios
+            db._esquema["podado"] = (db.base_actual(), datetime.date.today() - datetime.timedelta(days=1))
+            with mock.patch.object(db, "podar_cambios", return_value=0) as podar:
+                init_db_una_vez(); init_db_una_vez()
+            self.assertEqual((init.call_count, podar.call_count), (1, 1))
+
+    def test_resumen_mensual(self):
+        from resumen import leer_resumen, diferencias_resumen, reconstruir
+        from db import db_connection
+        with db_connection() as conn:
+            c = conn.cursor()
+            c.execute("UPDATE movimientos SET grupo = 'AUTO', monto = 40 WHERE contrato = 'C-22'")
+            c.execute("DELETE FROM movimientos WHERE tipo_gasto = 'Sueldo'")
+            c.execute("INSERT INTO movimientos (mes, tipo, grupo, monto, moneda, pagado) VALUES ('Enero 2026', 'GASTO', 'CASA', 25, 'ARS', FALSE)"); conn.commit()
+        self.assertTrue(diferencias_resumen().empty)
+        r = leer_resumen().set_index(["mes", "grupo", "moneda"]).sort_index()
+        self.assertEqual(r["monto"].tolist(), [40.0, 125.0])
+        self.assertEqual(r.loc[("Enero 2026", "AUTO", "USD"), "fecha_pago"], "2026-01-10")
+        self.assertEqual(r.loc[("Enero 2026", "CASA", "ARS"), ["fecha_pago", "n"]].tolist(), ["", 2])
+        with db_connection() as conn: conn.cursor().execute("UPDATE resumen_mensual SET monto = 0"); conn.commit()
+        self.assertEqual(len(diferencias_resumen()), 2)
+        reconstruir()
+        self.assertTrue(diferencias_resumen().empty)
+
+    def test_prefetch_paralelo_igual_a_serie(self):
+        import pandas as pd
+        from unittest import mock
+        from pagina import prefetch
+        pedidos = ["resumen", "presupuestos", "deudas", "pagos_deudas"]
+        with mock.patch("pagina.get_dolar", return_value=(1000.0, "(Ref)")):  # sin pedir el dolar a la API
+            par, ser = prefetch(pedidos, en_paralelo=True), prefetch(pedidos, en_paralelo=False)
+        self.assertEqual((len(par.movimientos), par.grupos, par.version_cambios, par.dolar_val), (3, ser.grupos, ser.version_cambios, 1000.0))
+        pd.testing.assert_frame_equal(par.resumen, ser.resumen)
+        self.assertIsNone(par.inversiones)
+
+    def test_conversion_asof(self):
+        import io
+        import pandas as pd
+        from cotizaciones import leer_csv_cotizaciones, importar_cotizaciones, leer_cotizaciones
+        from consultas import construir_filtro_movimientos, totales_por_grupo
+        from tabs.dashboard import monto_en_ars
+        from db import db_connection
+        csv_txt = "Fecha;Compra;Venta\n01/01/2026;900;1100\n2026-01-08;1190,00;1210,00\n".encode()
+        self.assertEqual(importar_cotizaciones(leer_csv_cotizaciones(io.BytesIO(csv_txt))), 2)
+        cot = leer_cotizaciones()
+        self.assertEqual(cot["valor"].tolist(), [1000.0, 1200.0])
+        # USD pagado el 10/01 -> cotizacion del 08/01
+        tot = totales_por_grupo(*construir_filtro_movimientos("Enero 2026", moneda="USD"), 1.0)
+        self.assertEqual(tot["total_ars"].tolist(), [60000.0])
+        with db_connection() as conn: df = pd.read_sql("SELECT * FROM movimientos WHERE mes = 'Enero 2026' ORDER BY id", conn)
+        self.assertEqual(monto_en_ars(df, 1.0, cot).tolist(), [100.0, 60000.0])
+
+    def test_agregar_columna_idempotente(self):
+        from db import db_connection
+        with db_connection() as conn:
+            c = conn.cursor()
+            c.execute("ALTER TABLE inversiones ADD COLUMN IF NOT EXISTS moneda TEXT DEFAULT 'ARS'")
+            c.execute("PRAGMA table_info(inversiones)")
+            self.assertEqual([f[1] for f in c.fetchall()].count("moneda"), 1)
+
+    def test_importar_sin_duplicados(self):
+        import io
+        from importador import importar_extracto
+        datos = "Fecha;Descripcion;Importe\n05/03/2026;Cafe;-1.500,00\n06/03/2026;Sueldo;900.000,00\n".encode()
+        columnas = {"fecha": "Fecha", "concepto": "Descripcion", "monto": "Importe"}
+        self.assertEqual(importar_extracto(io.BytesIO(datos), "e.csv", columnas, "VARIOS")["insertadas"], 2)
+        res = importar_extracto(io.BytesIO(datos), "e.csv", columnas, "VARIOS")
+        self.assertEqual((res["insertadas"], res["duplicadas"]), (0, 2))
+        # Las filas de un mes cerrado se cuentan aparte y el resto se carga
+        from cierres import cerrar_mes
+        cerrar_mes("Enero 2026", 1000.0)
+        datos = "Fecha;Descripcion;Importe\n10/01/2026;Kiosco;-200,00\n10/02/2026;Kiosco;-300,00\n".encode()
+        res = importar_extracto(io.BytesIO(datos), "e.csv", columnas, "VARIOS")
+        self.assertEqual((res["insertadas"], res["cerrados"], res["meses"]), (1, 1, ["Febrero 2026"]))
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_ledger_sintetico(self):
+        from benchmark import generar_ledger, COLUMNAS_BENCH
+        df = generar_ledger(2000, semilla=1)
+        self.assertEqual(list(df.columns), COLUMNAS_BENCH)
+        self.assertTrue(df.equals(generar_ledger(2000, semilla=1)))
+        cuotas = df[df["cuota"] != ""]["cuota"].str.split("/", expand=True).astype(int)
+        self.assertTrue((cuotas[0] <= cuotas[1]).all() and cuotas[1].isin([3, 6, 12]).all())
+        self.assertEqual(set(df["moneda"]), {"ARS", "USD"})
+
+    def test_agregados_dashboard(self):
+        import pandas as pd
+        from tabs.dashboard import resultado_por_moneda, evolucion_patrimonial
+        df = pd.DataFrame({"mes": ["Febrero 2026", "Enero 2026", "Enero 2026", "Enero 2026"], "tipo": ["GASTO", "GANANCIA", "GASTO", "GASTO"],
+                           "moneda": ["ARS", "ARS", "USD", "ARS"], "monto": [5.0, 100.0, 2.0, 30.0]})
+        self.assertEqual(resultado_por_moneda(df), {"ARS": 65.0, "USD": -2.0})
+        evol = evolucion_patrimonial(df, 10.0)
+        self.assertEqual(evol["mes"].tolist(), ["Enero 2026", "Febrero 2026"])
+        self.assertEqual(evol["Patrimonio"].tolist(), [50.0, -5.0])
+
+    def test_regresiones(self):
+        from benchmark import regresiones
+        base = {"10000": {"excel": 1.0, "alertas": 0.01}}
+        actual = {"10000": {"excel": 1.3, "alertas": 0.03, "nuevo": 5.0}}
+        self.assertEqual(regresiones(actual, base, 0.25), [("10000", "excel", 1.0, 1.3)])
+
+
+class TestMemoria(unittest.TestCase):
+    def test_compactar_y_unir(self):
+        from benchmark import generar_ledger
+        from memoria import compactar, unir
+        crudo = generar_ledger(5000, semilla=2).reset_index(names="id")
+        df = compactar(crudo)
+        self.assertLess(df.memory_usage(deep=True).sum(), crudo.memory_usage(deep=True).sum() / 2)
+        self.assertEqual(str(df["fecha_pago"].dtype), "datetime64[us]")
+        self.assertTrue((df["fecha_pago"].dt.strftime("%Y-%m-%d") == crudo["fecha_pago"]).all())
+        nuevo = crudo.iloc[:1].assign(id=5000, grupo="GRUPO NUEVO", pagado=None)
+        todo = unir(df, nuevo)
+        self.assertEqual(len(todo), 5001)
+        self.assertEqual(todo["grupo"].dtype.name, "category")
+        self.assertEqual(todo["grupo"].iloc[-1], "GRUPO NUEVO")
+        self.assertTrue(todo["pagado"].isna().iloc[-1])
+
+
+class TestPresupuestos(unittest.TestCase):
+    def test_gastado_proyeccion_y_estado(self):
+        import pandas as pd
+        from presupuestos import calcular, del_mes, historial
+        df = pd.DataFrame({"mes": ["Enero 2026", "Enero 2026", "Enero 2026", "Febrero 2026", "Marzo 2026", "Marzo 2026"],
+                           "tipo": ["GASTO", "GASTO", "GASTO", "GASTO", "GASTO", "GANANCIA"],
+                           "grupo": ["CASA", "CASA", "OCIO", "CASA", "CASA", "CASA"], "monto": [600.0, 100.0, 10.0, 50.0, 20.0, 999.0],
+                           "moneda": ["ARS", "ARS", "USD", "ARS", "ARS", "ARS"], "pagado": [True, False, True, True, False, True],
+                           "fecha_pago": ["2026-01-05", "2026-01-28", "2026-01-03", "2026-02-01", "2026-03-10", "2026-03-01"]})
+        pres = pd.DataFrame({"grupo": ["CASA", "OCIO", "AUTO"], "limite": [1000.0, 100.0, 5.0], "moneda": ["ARS", "ARS", "USD"]})
+        t = calcular(df, pres, 10.0, hoy=datetime.date(2026, 1, 10)).set_index(["mes", "grupo"])
+        casa = t.loc[("Enero 2026", "CASA")]
+        self.assertEqual((casa["pagado"], casa["pendiente"], casa["gastado"]), (600.0, 100.0, 700.0))
+        self.assertAlmostEqual(casa["proyectado"], 600 + 60 * 21)  # 60 por dia durante 10 dias, faltan 21
+        self.assertEqual(casa["estado"], "EN RIESGO")
+        self.assertEqual(t.loc[("Enero 2026", "OCIO"), "estado"], "EXCEDIDO")  # 10 USD a 10
+        self.assertEqual(t.loc[("Febrero 2026", "CASA"), "proyectado"], 50.0)  # mes futuro: solo lo cargado
+        mes = del_mes(t.reset_index(), pres, "Febrero 2026", 10.0)
+        self.assertEqual(mes["grupo"].tolist(), ["CASA", "OCIO", "AUTO"])
+        self.assertEqual(mes["limite"].tolist(), [1000.0, 100.0, 50.0])
+        self.assertEqual(mes["estado"].tolist(), ["OK", "OK", "OK"])
+        self.assertEqual(list(historial(t.reset_index()).columns), ["Enero 2026", "Febrero 2026", "Marzo 2026"])
+
+
+class TestAnomalias(unittest.TestCase):
+    def test_factura_duplicada_y_variacion_normal(self):
+        import pandas as pd
+        from anomalias import totales, puntuar, del_mes
+        meses = ["Enero 2026", "Febrero 2026", "Marzo 2026", "Abril 2026", "Mayo 2026"]
+        df = pd.DataFrame({"mes": meses * 2, "tipo": "GASTO", "grupo": ["SERVICIOS"] * 5 + ["CASA"] * 5,
+                           "tipo_gasto": ["Luz"] * 4 + ["LUZ "] + ["Super"] * 5, "moneda": "ARS", "fecha_pago": "2026-01-01",
+                           "monto": [100.0, 100.0, 100.0, 100.0, 210.0, 500.0, 650.0, 420.0, 580.0, 700.0]})
+        res = puntuar(totales(df, 1.0))
+        mayo = del_mes(res, "Mayo 2026")
+        self.assertEqual(sorted(zip(mayo["nivel"], mayo["clave"])), [("concepto", "LUZ"), ("grupo", "SERVICIOS")])  # MAD 0: el piso la deja saltar
+        self.assertFalse(res[res["clave"] == "CASA"]["anomalia"].any())  # variacion habitual
+        self.assertFalse(res[res["mes"] != "Mayo 2026"]["anomalia"].any())  # sin historia suficiente no se marca
+
+
+class TestCacheDisco(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        import cache_disco
+        d = tempfile.TemporaryDirectory(); self.addCleanup(d.cleanup)
+        for k in ("CACHE_DIR", "MAX_MB", "VOLCAR_CADA"): self.addCleanup(setattr, cache_disco, k, getattr(cache_disco, k))
+        cache_disco.CACHE_DIR, cache_disco.VOLCAR_CADA = d.name, 3600
+        self.cd = cache_disco
+
+    def test_ttl_y_contadores(self):
+        self.cd.guardar("x", "a", {"v": 1}, ttl=60)
+        self.cd.guardar("x", "b", 2, ttl=-1)
+        self.assertEqual(self.cd.obtener("x", "a"), (True, {"v": 1}))
+        self.assertEqual(self.cd.obtener("x", "b"), (False, None))
+        self.assertEqual(self.cd._conn().execute("SELECT COUNT(*) FROM contadores").fetchone()[0], 0)  # leer no escribe
+        est = self.cd.estadisticas().set_index("espacio").loc["x"]
+        self.assertEqual((est["aciertos"], est["fallos"], est["entradas"]), (1, 1, 1))
+
+    def test_desalojo_lru(self):
+        import time
+        self.cd.MAX_MB = 3.5
+        for k in "abc":
+            self.cd.guardar("x", k, b"0" * 2**20, ttl=60); time.sleep(0.01)
+        self.cd.obtener("x", "a"); time.sleep(0.01)  # "a" pasa a ser la mas reciente
+        self.cd.guardar("x", "d", b"0" * 2**20, ttl=60)
+        self.assertEqual([k for k in "abcd" if self.cd.obtener("x", k)[0]], ["a", "c", "d"])
+
+    def test_decorador_por_contenido(self):
+        import pandas as pd
+        llamadas = []
+        @self.cd.cacheado("f", ttl=60)
+        def suma(df, k=1):
+            llamadas.append(1); return df["v"].sum() * k
+        df = pd.DataFrame({"v": [1.0, 2.0]})
+        self.assertEqual([suma(df), suma(df.copy()), suma(df, k=2), suma(df.assign(v=[1.0, 3.0]))], [3.0, 3.0, 6.0, 4.0])
+        self.assertEqual(len(llamadas), 3)
+
+    def test_compartida_entre_procesos(self):
+        import os
+        import subprocess
+        import sys
+        codigo = f"import cache_disco; cache_disco.CACHE_DIR = {self.cd.CACHE_DIR!r}; cache_disco.guardar('x', 'p', [1, 2], 60)"
+        subprocess.run([sys.executable, "-c", codigo], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(self.cd.obtener("x", "p"), (True, [1, 2]))
+
+
+class TestValuacion(unittest.TestCase):
+    def setUp(self):
+        import pandas as pd
+        self.df = pd.DataFrame({"tipo": ["Plazo Fijo", "FCI"], "monto_inicial": [1000.0, 100.0], "tna": [36.5, 36.5],
+                                "fecha_inicio": ["2026-01-01", "2026-01-11"], "plazo_dias": [30, 365], "moneda": ["ARS", "USD"]})
+
+    def test_simple_y_compuesto(self):
+        from valuacion import valuar
+        v = valuar(self.df, datetime.date(2026, 1, 21), dolar_val=10.0)
+        self.assertAlmostEqual(v["valor_actual"][0], 1020.0)
+        self.assertAlmostEqual(v["valor_final"][0], 1030.0)
+        self.assertAlmostEqual(v["valor_actual"][1], 100 * 1.001 ** 10)
+        self.assertAlmostEqual(v["valor_actual_ars"][1], 1000 * 1.001 ** 10)
+        self.assertEqual(v["dias_restantes"].tolist(), [10, 355])
+        self.assertFalse(v["vencida"].any())
+        self.assertAlmostEqual(valuar(self.df, datetime.date(2026, 6, 1))["valor_actual"][0], 1030.0)
+
+    def test_serie_diaria(self):
+        import pandas as pd
+        from valuacion import serie_diaria
+        s = serie_diaria(self.df, "2026-01-01", "2026-01-21", dolar_val=10.0)
+        self.assertEqual(len(s), 21)
+        self.assertAlmostEqual(s.iloc[0], 1000.0)
+        self.assertAlmostEqual(s.iloc[-1], 1020.0 + 1000 * 1.001 ** 10)
+        sin_fecha = self.df.assign(fecha_inicio=None)
+        self.assertTrue(serie_diaria(sin_fecha, hasta="2026-01-21").empty)
+        self.assertEqual(serie_diaria(self.df.assign(fecha_inicio=["2026-01-11", None]), hasta="2026-01-21").index[0], pd.Timestamp("2026-01-11"))
+
+
+class TestPerfil(unittest.TestCase):
+    def test_tramos_anidados(self):
+        import time
+        import perfil
+        with perfil.tramo("fuera"): pass  # sin corrida activa no registra nada
+        c = {"t0": time.perf_counter(), "tramos": [], "total": None}
+        perfil._local.corrida, perfil._local.nivel = c, 0
+        try:
+            externo = perfil.medido("api")(lambda: 7)
+            with perfil.tramo("fase"): self.assertEqual(externo(), 7)
+        finally:
+            perfil._local.corrida = None
+        self.assertEqual([(t["nombre"], t["tipo"], t["nivel"]) for t in c["tramos"]], [("api", "red", 1), ("fase", "fase", 0)])
+        self.assertGreaterEqual(c["tramos"][0]["inicio"], c["tramos"][1]["inicio"])
+
+
 class TestAuth(unittest.TestCase):
     def test_sha256_hash(self):
         import hashlib
@@ -1,16 +1,25 @@
 import os
 import datetime
+import functools
 import requests
+import numpy as np
 import pandas as pd
 import smtplib
 import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from perfil import medido
 
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=4)
+@medido("lottie")
+def _bajar_lottie(url):
+    # Si falla levanta: lru_cache no guarda excepciones y el proximo rerun reintenta
+    return requests.get(url, timeout=3).json()
+
 def load_lottieurl(url):
-    try: return requests.get(url, timeout=3).json()
+    try: return _bajar_lottie(url)
     except: return None
 
 def formato_moneda_visual(valor, moneda):
@@ -23,6 +32,32 @@ def procesar_monto_input(t):
     try: return float(str(t).strip().replace("$","").replace("US","").replace(" ","").replace(".","").replace(",", ".")) if not isinstance(t, (int, float)) else float(t)
     except: return 0.0
 
+def procesar_montos_serie(s):
+    """Version vectorizada de procesar_monto_input para columnas completas (importacion)."""
+    s = pd.Series(s)
+    if pd.api.types.is_numeric_dtype(s): return s.astype(float).fillna(0.0)
+    es_texto = s.map(lambda v: isinstance(v, str))
+    numeros = pd.to_numeric(s.where(~es_texto), errors='coerce')
+    txt = s.where(es_texto).astype("string").str.strip().str.replace(r"\$|US| |\.", "", regex=True).str.replace(",", ".", regex=False)
+    return numeros.fillna(pd.to_numeric(txt, errors='coerce')).astype(float).fillna(0.0)
+
+def tasas_asof(fechas, cot, defecto):
+    """Cotizacion vigente en cada fecha: as-of hacia atras sobre `cot` (fecha datetime64, valor ordenados).
+    Sin fecha o antes de la primera cotizacion se usa la primera; sin cotizaciones, `defecto`."""
+    f = pd.Series(fechas).reset_index(drop=True)
+    # El libro compacto (memoria.compactar) ya trae datetime64: solo se parsea texto
+    if not pd.api.types.is_datetime64_any_dtype(f): f = pd.to_datetime(f.astype("string").str[:10], format="%Y-%m-%d", errors="coerce")
+    f = f.astype("datetime64[ns]")
+    if cot is None or cot.empty: return np.full(len(f), float(defecto))
+    primera = float(cot["valor"].iloc[0])
+    out = np.full(len(f), primera)
+    ok = f.notna().to_numpy()
+    izq = pd.DataFrame({"fecha": f[ok].to_numpy(), "pos": np.flatnonzero(ok)}).sort_values("fecha")
+    m = pd.merge_asof(izq, cot[["fecha", "valor"]].astype({"fecha": "datetime64[ns]"}), on="fecha", direction="backward")
+    out[m["pos"].to_numpy()] = m["valor"].fillna(primera).to_numpy()
+    return out
+
+@medido("smtp")
 def enviar_notificacion(asunto, mensaje):
     try:
         sender_email = os.environ.get("EMAIL_SENDER")
@@ -46,7 +81,7 @@ def enviar_notificacion(asunto, mensaje):
     except Exception as e:
         logger.error(f"Fallo envío email: {e}")
 
-def generar_alertas(df, dolar_val):
+def generar_alertas(df, dolar_val, cot=None):
     hoy = datetime.date.today()
     limite = hoy + datetime.timedelta(days=5)
     mensajes = []
@@ -56,34 +91,35 @@ def generar_alertas(df, dolar_val):
 
     if df.empty: return mensajes, 0, 0, 0
 
-    pendientes = df[(df['tipo'] == 'GASTO') & (df['pagado'] == False)].copy()
-    for i, r in pendientes.iterrows():
-        try:
-            f_pago = pd.to_datetime(r['fecha_pago']).date()
-            monto_real = float(r['monto']) * dolar_val if r['moneda'] == 'USD' else float(r['monto'])
-            if f_pago < hoy:
-                mensajes.append(f"🚨 **VENCIDO:** {r['tipo_gasto']} ({formato_moneda_visual(r['monto'], r['moneda'])}) - {f_pago.strftime('%d/%m')}")
-                total_vencido += monto_real
-            elif hoy <= f_pago <= limite:
-                dias = (f_pago - hoy).days
-                txt = "HOY" if dias == 0 else f"en {dias} días"
-                mensajes.append(f"⚠️ **Vence {txt}:** {r['tipo_gasto']} ({formato_moneda_visual(r['monto'], r['moneda'])})")
-                total_por_vencer += monto_real
-        except: pass
-
-    ingresos = df[(df['tipo'] == 'GANANCIA') & (df['pagado'] == False) & (df['tipo_gasto'] != 'Ahorro Mes Anterior')].copy()
-    for i, r in ingresos.iterrows():
-        try:
-            f_cobro = pd.to_datetime(r['fecha_pago']).date()
-            monto_real = float(r['monto']) * dolar_val if r['moneda'] == 'USD' else float(r['monto'])
-            if f_cobro < hoy:
-                mensajes.append(f"⏳ **Cobro Atrasado:** {r['tipo_gasto']} ({formato_moneda_visual(r['monto'], r['moneda'])}) - Era el {f_cobro.strftime('%d/%m')}")
-                total_por_cobrar += monto_real
-            elif hoy <= f_cobro <= limite:
-                dias = (f_cobro - hoy).days
-                txt = "HOY" if dias == 0 else f"en {dias} días"
-                mensajes.append(f"💵 **Cobras {txt}:** {r['tipo_gasto']} ({formato_moneda_visual(r['monto'], r['moneda'])})")
-                total_por_cobrar += monto_real
-        except: pass
+    # USD a la cotizacion de su fecha de pago (as-of, vectorizado)
+    pend = df[df['pagado'] == False]
+    monto_ars = pd.Series(np.where(pend['moneda'] == 'USD', pend['monto'].astype(float) * tasas_asof(pend['fecha_pago'], cot, dolar_val), pend['monto'].astype(float)), index=pend.index)
+
+    # Fechas parseadas una vez para todo el frame; los mensajes se arman solo para las filas en ventana
+    f = pend['fecha_pago']
+    if not pd.api.types.is_datetime64_any_dtype(f): f = pd.to_datetime(f.astype("string").str[:10], format="%Y-%m-%d", errors="coerce")
+    f = f.dt.normalize()
+    vencido, en_ventana = f < pd.Timestamp(hoy), (f >= pd.Timestamp(hoy)) & (f <= pd.Timestamp(limite))
+
+    gastos = (pend['tipo'] == 'GASTO') & (vencido | en_ventana)
+    for i, fp, tg, m, mon in zip(pend.index[gastos], f[gastos].dt.date, pend['tipo_gasto'][gastos], pend['monto'][gastos], pend['moneda'][gastos]):
+        if fp < hoy:
+            mensajes.append(f"🚨 **VENCIDO:** {tg} ({formato_moneda_visual(m, mon)}) - {fp.strftime('%d/%m')}")
+            total_vencido += monto_ars[i]
+        else:
+            dias = (fp - hoy).days
+            txt = "HOY" if dias == 0 else f"en {dias} días"
+            mensajes.append(f"⚠️ **Vence {txt}:** {tg} ({formato_moneda_visual(m, mon)})")
+            total_por_vencer += monto_ars[i]
+
+    ingresos = (pend['tipo'] == 'GANANCIA') & (pend['tipo_gasto'] != 'Ahorro Mes Anterior') & (vencido | en_ventana)
+    for i, fp, tg, m, mon in zip(pend.index[ingresos], f[ingresos].dt.date, pend['tipo_gasto'][ingresos], pend['monto'][ingresos], pend['moneda'][ingresos]):
+        if fp < hoy:
+            mensajes.append(f"⏳ **Cobro Atrasado:** {tg} ({formato_moneda_visual(m, mon)}) - Era el {fp.strftime('%d/%m')}")
+        else:
+            dias = (fp - hoy).days
+            txt = "HOY" if dias == 0 else f"en {dias} días"
+            mensajes.append(f"💵 **Cobras {txt}:** {tg} ({formato_moneda_visual(m, mon)})")
+        total_por_cobrar += monto_ars[i]
 
     return mensajes, total_vencido, total_por_vencer, total_por_cobrar
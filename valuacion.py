@@ -0,0 +1,61 @@
+import datetime
+import numpy as np
+import pandas as pd
+
+# --- VALUACION DE INVERSIONES ---
+# Todo el portafolio de una vez con arrays de NumPy. Plazo fijo y bonos devengan interes simple
+# (TNA * dias / 365); el resto capitaliza diariamente ((1 + TNA/365) ** dias). Pasado el plazo el
+# valor queda fijo en el de vencimiento hasta que la inversion se archiva.
+TIPOS_INTERES_SIMPLE = {"Plazo Fijo", "Bono"}
+
+
+def _factor(tna, dias, simple):
+    tasa = np.asarray(tna, dtype=float) / 100
+    return np.where(simple, 1 + tasa * dias / 365, (1 + tasa / 365) ** dias)
+
+
+def _en_ars(df, dolar_val):
+    return np.where(df["moneda"].fillna("ARS").to_numpy() == "USD", dolar_val, 1.0)
+
+
+def valuar(df, hoy=None, dolar_val=1.0):
+    """Agrega a `df` (filas de inversiones) el devengado a hoy y al vencimiento, en moneda original y en ARS."""
+    hoy = pd.Timestamp(hoy or datetime.date.today())
+    out = df.copy()
+    inicio = pd.to_datetime(out["fecha_inicio"], errors="coerce")
+    plazo = out["plazo_dias"].fillna(0).to_numpy(dtype=float)
+    capital = out["monto_inicial"].fillna(0).to_numpy(dtype=float)
+    simple = out["tipo"].isin(TIPOS_INTERES_SIMPLE).to_numpy()
+    transcurridos = np.clip(((hoy - inicio).dt.days).fillna(0).to_numpy(dtype=float), 0, plazo)
+
+    fin = inicio + pd.to_timedelta(plazo, unit="D")
+    out["fecha_fin"] = fin.dt.date
+    out["dias_restantes"] = (fin - hoy).dt.days
+    out["vencida"] = out["dias_restantes"] < 0
+    out["valor_actual"] = capital * _factor(out["tna"].fillna(0), transcurridos, simple)
+    out["valor_final"] = capital * _factor(out["tna"].fillna(0), plazo, simple)
+    out["ganancia_actual"] = out["valor_actual"] - capital
+    out["ganancia_final"] = out["valor_final"] - capital
+    cambio = _en_ars(out, dolar_val)
+    for col in ["monto_inicial", "valor_actual", "valor_final", "ganancia_actual", "ganancia_final"]:
+        out[f"{col}_ars"] = out[col].fillna(0).to_numpy(dtype=float) * cambio
+    return out
+
+
+def serie_diaria(df, desde=None, hasta=None, dolar_val=1.0):
+    """Valor diario del portafolio en ARS (matriz dias x posiciones). Antes de su inicio una posicion vale 0."""
+    if df.empty: return pd.Series(dtype=float, name="valor")
+    inicio = pd.to_datetime(df["fecha_inicio"], errors="coerce")
+    desde = pd.Timestamp(desde) if desde is not None else inicio.min()
+    if pd.isna(desde): return pd.Series(dtype=float, name="valor")  # ninguna fecha_inicio valida
+    hasta = pd.Timestamp(hasta or datetime.date.today())
+    dias = pd.date_range(desde, max(hasta, desde), freq="D")
+    plazo = df["plazo_dias"].fillna(0).to_numpy(dtype=float)
+    simple = df["tipo"].isin(TIPOS_INTERES_SIMPLE).to_numpy()
+    capital = df["monto_inicial"].fillna(0).to_numpy(dtype=float) * _en_ars(df, dolar_val)
+
+    t = (dias.to_numpy()[:, None] - inicio.to_numpy()[None, :]) / np.timedelta64(1, "D")
+    activa = (t >= 0) & ~np.isnan(t)
+    t = np.clip(np.nan_to_num(t), 0, plazo)
+    valor = np.where(activa, capital * _factor(df["tna"].fillna(0).to_numpy(), t, simple), 0.0)
+    return pd.Series(valor.sum(axis=1), index=dias, name="valor")